@@ -21,9 +21,54 @@ def _get_float(name: str, default: float) -> float:
         return default
 
 
+def _get_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        logger.warning("Invalid %s value; using default %s", name, default)
+        return default
+
+
+def _get_float_map(name: str) -> dict[str, float]:
+    """Parse "key=value,key=value" into a dict, skipping malformed pairs."""
+    values: dict[str, float] = {}
+    for pair in os.getenv(name, "").split(","):
+        if not pair.strip():
+            continue
+        key, _, raw = pair.partition("=")
+        try:
+            values[key.strip()] = float(raw)
+        except ValueError:
+            logger.warning("Invalid %s entry %r; ignoring", name, pair.strip())
+    return values
+
+
+def _get_price_map(name: str) -> dict[str, tuple[float, float]]:
+    """Parse "model=input:output,..." into model -> (input, output) prices, skipping malformed pairs."""
+    values: dict[str, tuple[float, float]] = {}
+    for pair in os.getenv(name, "").split(","):
+        if not pair.strip():
+            continue
+        key, _, raw = pair.partition("=")
+        prompt_price, _, completion_price = raw.partition(":")
+        try:
+            values[key.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+        except ValueError:
+            logger.warning("Invalid %s entry %r; ignoring", name, pair.strip())
+    return values
+
+
+def _get_list(name: str) -> list[str]:
+    """Parse "a,b,c" into a list of non-empty, stripped names."""
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
 def _get_backend(name: str, default: str = "in_process") -> str:
     value = os.getenv(name, default).strip().lower()
-    if value not in {"in_process", "ollama"}:
+    if value not in {"in_process", "batched", "ollama"}:
         logger.warning("Invalid %s value %r; using default %r", name, value, default)
         return default
     return value
@@ -48,6 +93,57 @@ REDIS_URL = os.getenv("DEJAQ_REDIS_URL", "redis://localhost:6379/0")
 CHROMA_HOST = os.getenv("DEJAQ_CHROMA_HOST", "127.0.0.1")
 CHROMA_PORT = int(os.getenv("DEJAQ_CHROMA_PORT", "8001"))
 
+# Semantic cache store: chroma (HTTP server) | local (in-process index, single node)
+CACHE_STORE = _get_text("DEJAQ_CACHE_STORE", "chroma").lower()
+if CACHE_STORE not in {"chroma", "local"}:
+    logger.warning("Invalid DEJAQ_CACHE_STORE value %r; using default 'chroma'", CACHE_STORE)
+    CACHE_STORE = "chroma"
+LOCAL_STORE_DIR = _get_text("DEJAQ_LOCAL_STORE_DIR", "cache_store")
+
+# Semantic cache lookup: candidates per query and max cosine distance for a hit.
+# DEJAQ_CACHE_SIMILARITY_THRESHOLDS overrides the threshold per namespace: "ns_a=0.1,ns_b=0.2"
+CACHE_N_RESULTS = max(1, _get_int("DEJAQ_CACHE_N_RESULTS", 5))
+CACHE_SIMILARITY_THRESHOLD = _get_float("DEJAQ_CACHE_SIMILARITY_THRESHOLD", 0.15)
+CACHE_SIMILARITY_THRESHOLDS = _get_float_map("DEJAQ_CACHE_SIMILARITY_THRESHOLDS")
+
+# Embedding micro-batching (bge-small query embedder)
+EMBED_BATCHING = _get_bool("DEJAQ_EMBED_BATCHING", True)
+EMBED_BATCH_MAX_SIZE = max(1, _get_int("DEJAQ_EMBED_BATCH_MAX_SIZE", 32))
+EMBED_BATCH_MAX_WAIT_MS = max(0.0, _get_float("DEJAQ_EMBED_BATCH_MAX_WAIT_MS", 5.0))
+
+# Exact-match L1 in front of the semantic cache (per namespace, 0 disables)
+EXACT_CACHE_MAX_ENTRIES = max(0, _get_int("DEJAQ_EXACT_CACHE_MAX_ENTRIES", 1024))
+EXACT_CACHE_TTL_SECONDS = _get_float("DEJAQ_EXACT_CACHE_TTL_SECONDS", 60.0)
+EXACT_CACHE_REDIS = _get_bool("DEJAQ_EXACT_CACHE_REDIS", False)
+EXACT_CACHE_REDIS_CHECK_MS = max(0.0, _get_float("DEJAQ_EXACT_CACHE_REDIS_CHECK_MS", 100.0))
+
+# Query embedding memo (0 slots disables; set a path to share it across processes)
+EMBED_CACHE_SLOTS = max(0, _get_int("DEJAQ_EMBED_CACHE_SLOTS", 8192))
+EMBED_CACHE_PATH = os.getenv("DEJAQ_EMBED_CACHE_PATH", "").strip()
+
+# Complexity classifier runtime: torch | onnx (onnx exports on first load if the file is missing)
+CLASSIFIER_BACKEND = _get_text("DEJAQ_CLASSIFIER_BACKEND", "torch").lower()
+if CLASSIFIER_BACKEND not in {"torch", "onnx"}:
+    logger.warning("Invalid DEJAQ_CLASSIFIER_BACKEND value %r; using default 'torch'", CLASSIFIER_BACKEND)
+    CLASSIFIER_BACKEND = "torch"
+CLASSIFIER_ONNX_PATH = _get_text("DEJAQ_CLASSIFIER_ONNX_PATH", "models/complexity_classifier.onnx")
+CLASSIFIER_ONNX_QUANTIZE = _get_bool("DEJAQ_CLASSIFIER_ONNX_QUANTIZE", False)
+
+# Complexity classifier result cache (0 disables); Redis tier shares results across replicas
+CLASSIFIER_CACHE_MAX_ENTRIES = _get_int("DEJAQ_CLASSIFIER_CACHE_MAX_ENTRIES", 4096)
+CLASSIFIER_CACHE_REDIS = _get_bool("DEJAQ_CLASSIFIER_CACHE_REDIS", False)
+CLASSIFIER_CACHE_REDIS_TTL_SECONDS = _get_int("DEJAQ_CLASSIFIER_CACHE_REDIS_TTL_SECONDS", 86400)
+
+# Complexity classifier batched inference worker
+CLASSIFIER_BATCH_MAX_SIZE = max(1, _get_int("DEJAQ_CLASSIFIER_BATCH_MAX_SIZE", 16))
+CLASSIFIER_BATCH_MAX_WAIT_MS = max(0.0, _get_float("DEJAQ_CLASSIFIER_BATCH_MAX_WAIT_MS", 10.0))
+
+# Attach the lookup-time query embedding to store tasks: none | float16 | float32
+STORE_TASK_EMBEDDING = _get_text("DEJAQ_STORE_TASK_EMBEDDING", "float32").lower()
+if STORE_TASK_EMBEDDING not in {"none", "float16", "float32"}:
+    logger.warning("Invalid DEJAQ_STORE_TASK_EMBEDDING value %r; using default 'float32'", STORE_TASK_EMBEDDING)
+    STORE_TASK_EMBEDDING = "float32"
+
 # External LLM
 EXTERNAL_MODEL_NAME = os.getenv("DEJAQ_EXTERNAL_MODEL", "gemini-2.5-flash")
 ROUTING_THRESHOLD = _get_float("DEJAQ_ROUTING_THRESHOLD", 0.3)
@@ -58,9 +154,40 @@ KEY_CACHE_TTL = int(os.getenv("DEJAQ_KEY_CACHE_TTL", "60"))
 
 # Stats DB
 STATS_DB_PATH = os.getenv("DEJAQ_STATS_DB", "dejaq_stats.db")
+# Request/feedback log rows are buffered and written in batches: every
+# interval, or once this many rows are waiting. The buffer holds at most
+# STATS_BUFFER_SIZE rows; beyond that the oldest are dropped (and counted)
+STATS_FLUSH_ROWS = max(1, _get_int("DEJAQ_STATS_FLUSH_ROWS", 200))
+STATS_FLUSH_INTERVAL_MS = max(1.0, _get_float("DEJAQ_STATS_FLUSH_INTERVAL_MS", 250.0))
+STATS_BUFFER_SIZE = max(1, _get_int("DEJAQ_STATS_BUFFER_SIZE", 10000))
+# USD per million (prompt, completion) tokens by model name as logged in
+# model_used; prices the tokens cache hits saved. Unlisted models cost 0
+MODEL_PRICES = _get_price_map("DEJAQ_MODEL_PRICES")
 
 # Feature flags
 USE_CELERY = os.getenv("DEJAQ_USE_CELERY", "true").lower() == "true"
+# In-process generalize-and-store queue (used when Celery is off): bounded, with
+# a fixed number of consumers on the app's event loop. When full, either drop
+# the new job (drop_new), drop the oldest queued one (drop_oldest) or make the
+# request wait up to DEJAQ_BG_QUEUE_WAIT_SECONDS for room (wait)
+BG_QUEUE_SIZE = max(1, _get_int("DEJAQ_BG_QUEUE_SIZE", 256))
+BG_QUEUE_WORKERS = max(1, _get_int("DEJAQ_BG_QUEUE_WORKERS", 1))
+BG_QUEUE_POLICY = _get_text("DEJAQ_BG_QUEUE_POLICY", "drop_new").lower()
+if BG_QUEUE_POLICY not in {"drop_new", "drop_oldest", "wait"}:
+    logger.warning("Invalid DEJAQ_BG_QUEUE_POLICY value %r; using default 'drop_new'", BG_QUEUE_POLICY)
+    BG_QUEUE_POLICY = "drop_new"
+BG_QUEUE_WAIT_SECONDS = max(0.0, _get_float("DEJAQ_BG_QUEUE_WAIT_SECONDS", 1.0))
+# How long shutdown waits for queued and running jobs to finish
+BG_QUEUE_DRAIN_SECONDS = max(0.0, _get_float("DEJAQ_BG_QUEUE_DRAIN_SECONDS", 30.0))
+# Start classification (and optionally credential decryption) alongside the cache path
+SPECULATIVE_PIPELINE = _get_bool("DEJAQ_SPECULATIVE_PIPELINE", False)
+SPECULATIVE_CREDENTIALS = _get_bool("DEJAQ_SPECULATIVE_CREDENTIALS", False)
+# Concurrent misses on the same cacheable query share one generation; the rest
+# wait up to the limit for its answer. The Redis tier extends this across
+# gateway replicas.
+SINGLE_FLIGHT = _get_bool("DEJAQ_SINGLE_FLIGHT", True)
+SINGLE_FLIGHT_WAIT_SECONDS = max(1.0, _get_float("DEJAQ_SINGLE_FLIGHT_WAIT_SECONDS", 60.0))
+SINGLE_FLIGHT_REDIS = _get_bool("DEJAQ_SINGLE_FLIGHT_REDIS", False)
 
 # Logging
 LOG_LEVEL = _get_text("DEJAQ_LOG_LEVEL", "INFO").upper()
@@ -72,6 +199,64 @@ EVICTION_FLOOR = _get_float("DEJAQ_EVICTION_FLOOR", -5.0)
 # Model backend config
 OLLAMA_URL = _get_text("DEJAQ_OLLAMA_URL", "http://127.0.0.1:11434")
 OLLAMA_TIMEOUT_SECONDS = _get_float("DEJAQ_OLLAMA_TIMEOUT_SECONDS", 60.0)
+# Pooled Ollama client: one per backend, opened in the app lifespan
+OLLAMA_MAX_CONNECTIONS = max(1, _get_int("DEJAQ_OLLAMA_MAX_CONNECTIONS", 20))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = max(1, _get_int("DEJAQ_OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 10))
+OLLAMA_KEEPALIVE_SECONDS = _get_float("DEJAQ_OLLAMA_KEEPALIVE_SECONDS", 30.0)
+OLLAMA_HTTP2 = _get_bool("DEJAQ_OLLAMA_HTTP2", False)
+# Sent as keep_alive on every chat call so the runner (and its prompt cache)
+# stays resident between calls; empty = Ollama's own default (5m)
+OLLAMA_KEEP_ALIVE = _get_text("DEJAQ_OLLAMA_KEEP_ALIVE", "30m")
+# Concurrent calls per model the gateway sends to Ollama; set to the server's
+# OLLAMA_NUM_PARALLEL so extra calls wait in the priority scheduler instead
+OLLAMA_NUM_PARALLEL = max(1, _get_int("DEJAQ_OLLAMA_NUM_PARALLEL", 4))
+# In-process llama-cpp pool: independent Llama replicas per logical model
+LLAMA_REPLICAS = max(1, _get_int("DEJAQ_LLAMA_REPLICAS", 1))
+LLAMA_REPLICAS_BY_MODEL = {
+    name: max(1, int(count)) for name, count in _get_float_map("DEJAQ_LLAMA_REPLICAS_BY_MODEL").items()
+}
+# 0 = split the physical cores evenly across a model's replicas
+LLAMA_THREADS_PER_REPLICA = max(0, _get_int("DEJAQ_LLAMA_THREADS_PER_REPLICA", 0))
+# Per-model overrides ("gemma_local=8"); mmap/mlock maps take 1/0
+LLAMA_THREADS_BY_MODEL = {
+    name: max(1, int(count)) for name, count in _get_float_map("DEJAQ_LLAMA_THREADS_BY_MODEL").items()
+}
+LLAMA_USE_MMAP = _get_bool("DEJAQ_LLAMA_USE_MMAP", True)
+LLAMA_USE_MMAP_BY_MODEL = {name: bool(value) for name, value in _get_float_map("DEJAQ_LLAMA_USE_MMAP_BY_MODEL").items()}
+LLAMA_USE_MLOCK = _get_bool("DEJAQ_LLAMA_USE_MLOCK", False)
+LLAMA_USE_MLOCK_BY_MODEL = {
+    name: bool(value) for name, value in _get_float_map("DEJAQ_LLAMA_USE_MLOCK_BY_MODEL").items()
+}
+# Model lifecycle: logical models loaded in parallel at startup (never idle-
+# unloaded), and how long other local models may sit unused before their
+# memory is released (0 keeps them loaded)
+MODEL_PRELOAD = _get_list("DEJAQ_MODEL_PRELOAD")
+MODEL_IDLE_UNLOAD_SECONDS = max(0.0, _get_float("DEJAQ_MODEL_IDLE_UNLOAD_SECONDS", 0.0))
+# RAM budget for in-process models; loading past it unloads the least recently
+# used idle models first (0 = unlimited)
+MODEL_MEMORY_BUDGET_MB = max(0, _get_int("DEJAQ_MODEL_MEMORY_BUDGET_MB", 0))
+# Saved KV states of static few-shot prompt prefixes kept per replica (0 disables)
+LLAMA_PREFIX_CACHE_ENTRIES = max(0, _get_int("DEJAQ_LLAMA_PREFIX_CACHE_ENTRIES", 4))
+# Continuous batching backend: sequences decoded together in one shared context
+BATCHED_SLOTS = max(1, _get_int("DEJAQ_BATCHED_SLOTS", 4))
+BATCHED_N_CTX = max(512, _get_int("DEJAQ_BATCHED_N_CTX", 16384))
+BATCHED_N_BATCH = max(32, _get_int("DEJAQ_BATCHED_N_BATCH", 512))
+# Priority scheduler in front of every local model call. Lower priorities are
+# admitted first; roles at or above the background priority also wait until no
+# interactive call is running or queued, up to the max defer time, and the
+# max_tokens of background calls in flight stays within the token budget
+SCHEDULER_ENABLED = _get_bool("DEJAQ_SCHEDULER", True)
+SCHEDULER_PRIORITIES = {
+    "enrich": 0,
+    "normalize": 0,
+    "adjust": 0,
+    "generate": 1,
+    "generalize": 10,
+    **{role: int(priority) for role, priority in _get_float_map("DEJAQ_SCHEDULER_PRIORITIES").items()},
+}
+SCHEDULER_BACKGROUND_PRIORITY = _get_int("DEJAQ_SCHEDULER_BACKGROUND_PRIORITY", 10)
+SCHEDULER_BACKGROUND_TOKENS = max(1, _get_int("DEJAQ_SCHEDULER_BACKGROUND_TOKENS", 2048))
+SCHEDULER_MAX_DEFER_SECONDS = max(0.0, _get_float("DEJAQ_SCHEDULER_MAX_DEFER_SECONDS", 30.0))
 
 ENRICHER_BACKEND = _get_backend("DEJAQ_ENRICHER_BACKEND")
 NORMALIZER_BACKEND = _get_backend("DEJAQ_NORMALIZER_BACKEND")
@@ -21,15 +21,26 @@ from app.config import (
     OLLAMA_URL,
     USE_CELERY,
 )
+from app.services.background_queue import store_queue
+from app.services.classifier import get_classifier_batch_stats, get_classifier_cache_stats
+from app.services.memory_chromaDB import get_embedding_batch_stats, get_embedding_cache_stats
 from app.services.request_logger import request_logger
+from app.services.request_scheduler import request_scheduler
+from app.services.single_flight import single_flight
 from app.services.service_factory import (
+    close_backends,
+    get_backend_stats,
     get_context_adjuster_service,
     get_context_enricher_service,
     get_llm_router_service,
+    get_model_status,
     get_normalizer_service,
+    models_ready,
+    open_backends,
 )
 import logging
 from contextlib import asynccontextmanager
+from dataclasses import asdict
 
 # 1. Setup Global Logging
 setup_logging()
@@ -65,9 +76,15 @@ async def lifespan(app: FastAPI):
     get_llm_router_service()
     get_context_adjuster_service()
     get_context_enricher_service()
+    await open_backends()
     await request_logger.init()
+    if not USE_CELERY:
+        store_queue.start()
     yield
+    # Finish queued generalize-and-store jobs while the model backends are still open.
+    await store_queue.close()
     await request_logger.close()
+    await close_backends()
     logger.info("DejaQ Middleware shutting down...")
 
 # 2. Initialize App
@@ -107,7 +124,7 @@ app.include_router(admin_router)
 @app.get("/health")
 async def health_check():
     logger.debug("Health check requested")
-    result = {"status": "ok", "service": "DejaQ Middleware", "celery": "disabled"}
+    result = {"status": "ok", "service": "DejaQ Middleware", "celery": "disabled", "ready": models_ready()}
 
     if USE_CELERY:
         try:
@@ -116,5 +133,30 @@ async def health_check():
             result["celery"] = "ok" if ping else "no_workers"
         except Exception:
             result["celery"] = "redis_unreachable"
+    else:
+        result["store_queue"] = asdict(store_queue.stats())
+
+    embedding_stats = get_embedding_batch_stats()
+    if embedding_stats is not None:
+        result["embedding_batch"] = asdict(embedding_stats)
+    embedding_cache_stats = get_embedding_cache_stats()
+    if embedding_cache_stats is not None:
+        result["embedding_cache"] = asdict(embedding_cache_stats)
+    classifier_stats = get_classifier_batch_stats()
+    if classifier_stats is not None:
+        result["classifier_batch"] = asdict(classifier_stats)
+    classifier_cache_stats = get_classifier_cache_stats()
+    if classifier_cache_stats is not None:
+        result["classifier_cache"] = asdict(classifier_cache_stats)
+    for backend_name, backend_stats in get_backend_stats().items():
+        result[f"{backend_name}_pool"] = asdict(backend_stats)
+    model_status = get_model_status()
+    if model_status:
+        result["models"] = {name: asdict(status) for name, status in model_status.items()}
+    result["single_flight"] = asdict(single_flight.stats())
+    result["request_log"] = asdict(request_logger.stats())
+    scheduler_stats = request_scheduler.stats()
+    if scheduler_stats.roles:
+        result["scheduler"] = asdict(scheduler_stats)
 
     return result
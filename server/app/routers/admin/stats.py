@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app.dependencies.admin_auth import require_management_auth
 from app.dependencies.management_auth import ManagementAuthContext
-from app.schemas.admin.stats import DepartmentStatsReport, OrgStatsReport
+from app.schemas.admin.stats import DepartmentStatsReport, OrgStatsReport, StageStatsReport
 from app.services import admin_service, stats_service
 
 router = APIRouter()
@@ -39,3 +39,16 @@ def department_stats(
         return stats_service.department_stats(org_slug, from_date=from_date, to_date=to_date)
     except stats_service.InvalidDateRange as exc:
         raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+
+@router.get("/stats/stages", response_model=StageStatsReport)
+def stage_stats(
+    from_date: date | None = Query(default=None, alias="from"),
+    to_date: date | None = Query(default=None, alias="to"),
+    ctx: ManagementAuthContext = Depends(require_management_auth),
+):
+    accessible_slugs = None if ctx.is_system else {o.slug for o in ctx.accessible_orgs}
+    try:
+        return stats_service.stage_stats(from_date=from_date, to_date=to_date, accessible_org_slugs=accessible_slugs)
+    except stats_service.InvalidDateRange as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
@@ -4,11 +4,14 @@ import hashlib
 import logging
 import time
 import uuid
+from contextlib import aclosing
 from dataclasses import dataclass
+from functools import partial
 from typing import AsyncGenerator
 
-from fastapi import APIRouter, BackgroundTasks, Request
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from starlette.concurrency import run_in_threadpool
 
 from app.schemas.openai_compat import (
@@ -25,8 +28,11 @@ from app.services.llm_router import _LOCAL_MODEL_NAME
 from app.services.external_llm import ExternalLLMService
 from app.services.credential_service import CredentialService, SUPPORTED_PROVIDERS
 from app.services.llm_providers import LIVE_PROVIDERS
+from app.services.background_queue import store_queue
 from app.services.memory_chromaDB import CacheLookupResult, get_memory_service
 from app.services.provider_inference import provider_for_model
+from app.services.single_flight import FlightLead, SharedAnswer, single_flight
+from app.services.token_usage import TokenUsage, UsageMeter, bind_usage, clear_usage
 from app.services import cache_filter, llm_config_service
 from app.services.classifier import ClassifierService
 from app.services.service_factory import (
@@ -36,8 +42,17 @@ from app.services.service_factory import (
     get_normalizer_service,
 )
 from app.tasks.cache_tasks import generalize_and_store_task
-from app.config import USE_CELERY, EXTERNAL_MODEL_NAME, ROUTING_THRESHOLD
+from app.config import (
+    EXTERNAL_MODEL_NAME,
+    ROUTING_THRESHOLD,
+    SPECULATIVE_CREDENTIALS,
+    SINGLE_FLIGHT,
+    SPECULATIVE_PIPELINE,
+    STORE_TASK_EMBEDDING,
+    USE_CELERY,
+)
 from app.db.session import get_session
+from app.utils.embedding_codec import EMBEDDING_FORMATS, encode_embedding
 from app.utils.exceptions import ExternalLLMError
 from app.utils.logger import clear_request_id, content_snippet, set_request_id
 from app.utils.pipeline_trace import PipelineTrace
@@ -54,6 +69,7 @@ ROUTING_MODE_AUTO = "auto"
 ROUTING_MODE_EASY_LOCAL = "easy_local"
 ROUTING_MODE_HARD_EXTERNAL = "hard_external"
 WEAK_CPU_MODEL_NAME = "qwen_0_5b"
+GENERATION_ERROR_ANSWER = "I'm sorry, I couldn't process your request right now. Please try again later."
 
 
 @dataclass(frozen=True)
@@ -116,6 +132,73 @@ def _read_effective_llm_config(org_slug: str, org_id: int | None) -> EffectiveLl
     )
 
 
+def _decrypt_provider_key(org_id: int, provider: str) -> str | None:
+    with get_session() as session:
+        return CredentialService().get_decrypted_key(session, org_id, provider)
+
+
+def _discard_task(task: asyncio.Task | None) -> None:
+    """Drop a speculative task whose result is no longer needed without leaking its error."""
+    if task is None:
+        return
+    if task.done():
+        if not task.cancelled():
+            task.exception()
+        return
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def _classify(user_query: str) -> dict:
+    # The DeBERTa forward pass is blocking; never run it on the event loop.
+    classify = getattr(_classifier, "classify", None)
+    if callable(classify):
+        return await classify(user_query)
+    return await run_in_threadpool(_classifier.predict_complexity, user_query)
+
+
+async def _speculative_classify(user_query: str, trace: PipelineTrace) -> dict:
+    with trace.step("classify"):
+        return await _classify(user_query)
+
+
+async def _speculative_llm_config(org_slug: str, org_id: int | None, trace: PipelineTrace) -> EffectiveLlmConfig:
+    with trace.step("llm_config"):
+        return await run_in_threadpool(_read_effective_llm_config, org_slug, org_id)
+
+
+async def _speculative_provider_key(
+    config_task: asyncio.Task,
+    org_id: int,
+    trace: PipelineTrace,
+) -> tuple[str | None, str | None]:
+    """Return (provider, decrypted_key) for the org's configured external model.
+
+    Provider mapping problems are left for the main path to report; decryption
+    errors propagate so the main path surfaces them exactly as before.
+    """
+    llm_config = await config_task
+    try:
+        provider = provider_for_model(llm_config.external_model)
+    except ValueError:
+        return None, None
+    if provider not in LIVE_PROVIDERS:
+        return provider, None
+    with trace.step("credentials"):
+        return provider, await run_in_threadpool(_decrypt_provider_key, org_id, provider)
+
+
+async def _resolve_provider_key(
+    speculative: asyncio.Task | None,
+    org_id: int,
+    provider: str,
+) -> str | None:
+    if speculative is not None:
+        speculative_provider, key = await speculative
+        if speculative_provider == provider:
+            return key
+    return _decrypt_provider_key(org_id, provider)
+
+
 def _services_for_model_profile(model_profile: str) -> ModelServices:
     # Temporary developer-only weak CPU profile. Keep the default singleton path
     # unchanged so production behavior and existing tests remain stable.
@@ -223,20 +306,65 @@ def _cache_lookup(memory: object, clean_query: str) -> CacheLookupResult:
     return _legacy_cache_lookup(check_cache(clean_query))
 
 
-def _bg_generalize_and_store(
+def _store_task_kwargs(cache_lookup: CacheLookupResult) -> dict[str, str]:
+    """Extra Celery kwargs carrying the lookup-time embedding, when enabled."""
+    if cache_lookup.query_embedding is None or STORE_TASK_EMBEDDING not in EMBEDDING_FORMATS:
+        return {}
+    return {"query_embedding": encode_embedding(cache_lookup.query_embedding, STORE_TASK_EMBEDDING)}
+
+
+def _usage_task_kwargs(usage: TokenUsage | None, model_used: str) -> dict[str, object]:
+    """Extra Celery kwargs carrying the answer's generation usage, when recorded."""
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "model_used": model_used,
+    }
+
+
+def _oai_usage(usage: TokenUsage | None) -> OAIUsage:
+    usage = usage or TokenUsage()
+    return OAIUsage(
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        total_tokens=usage.total_tokens,
+    )
+
+
+def _shared_usage(shared: SharedAnswer) -> TokenUsage | None:
+    if shared.prompt_tokens is None:
+        return None
+    return TokenUsage(shared.prompt_tokens, shared.completion_tokens or 0)
+
+
+async def _generalize_and_store(
     clean_query: str,
     answer: str,
     original_query: str,
     tenant_id: str,
     cache_namespace: str = "dejaq_default",
     model_profile: str = MODEL_PROFILE_DEFAULT,
+    query_embedding: list[float] | None = None,
+    usage: TokenUsage | None = None,
+    model_used: str | None = None,
 ) -> None:
     start = time.perf_counter()
     doc_id = _doc_id(clean_query)
     try:
-        generalized = asyncio.run(_services_for_model_profile(model_profile).adjuster.generalize(answer))
+        generalized = await _services_for_model_profile(model_profile).adjuster.generalize(answer)
         memory = get_memory_service(cache_namespace)
-        doc_id = memory.store_interaction(clean_query, generalized, original_query, tenant_id)
+        doc_id = await asyncio.to_thread(
+            memory.store_interaction,
+            clean_query,
+            generalized,
+            original_query,
+            tenant_id,
+            embedding=query_embedding,
+            usage=usage,
+            model_used=model_used,
+        )
         latency_ms = int((time.perf_counter() - start) * 1000)
         query = content_snippet(clean_query)
         if query:
@@ -256,6 +384,81 @@ def _bg_generalize_and_store(
             )
     except Exception:
         logger.exception("background_store status=failed namespace=%s doc_id=%s", cache_namespace, doc_id)
+        raise
+
+
+async def _shared_answer_response(
+    shared: SharedAnswer,
+    services: ModelServices,
+    user_query: str,
+    oai_request: OAIChatRequest,
+    completion_id: str,
+    response_id: str,
+    cache_lookup: CacheLookupResult,
+    trace: PipelineTrace,
+    org_slug: str,
+    dept: str,
+    t0: float,
+    usage_meter: UsageMeter,
+):
+    """Answer a miss with the result of an identical miss generated concurrently.
+
+    Nothing is stored: the request that generated the answer stores it.
+    """
+    answer = shared.answer
+    if user_query != shared.query:
+        try:
+            with trace.step("adjust"):
+                answer = await services.adjuster.adjust(user_query, shared.answer)
+        except Exception:
+            logger.exception("Context adjuster failed")
+    model_used = "coalesced"
+
+    latency = int((time.monotonic() - t0) * 1000)
+    await request_logger.log(
+        org_slug,
+        dept,
+        latency,
+        False,
+        None,
+        model_used,
+        response_id,
+        route="coalesced",
+        stages=trace.steps,
+        saved=_shared_usage(shared),
+        saved_model=shared.model_used,
+    )
+    logger.info(
+        "done cache=miss route=coalesced model=%s leader_model=%s response_id=%s latency=%dms steps=%s",
+        model_used,
+        shared.model_used,
+        response_id,
+        latency,
+        trace.summary(),
+    )
+
+    headers = {
+        "x-dejaq-model-used": model_used,
+        "x-dejaq-conversation-id": completion_id,
+        "x-dejaq-response-id": response_id,
+    }
+    headers.update(_nearest_headers(cache_lookup))
+    if oai_request.stream:
+        return StreamingResponse(
+            _stream_generator(_single_piece(answer), completion_id, oai_request.model),
+            media_type="text/event-stream",
+            headers=headers,
+        )
+
+    # Usage is what serving this request consumed: the adjust call, if any.
+    response = OAIChatResponse(
+        id=completion_id,
+        created=_now_ts(),
+        model=oai_request.model,
+        choices=[OAIChoice(message=OAIMessageResponse(content=answer))],
+        usage=_oai_usage(usage_meter.get("adjust")),
+    )
+    return JSONResponse(content=response.model_dump(), headers=headers)
 
 
 async def _increment_hit_count_bg(namespace: str, doc_id: str) -> None:
@@ -297,39 +500,41 @@ def _extract_pipeline_inputs(
     return user_query, history, system_prompt
 
 
-async def _stream_generator(
-    chunks: list[str],
+def _sse_chunk(
     completion_id: str,
     model: str,
-    model_used: str,
-) -> AsyncGenerator[str, None]:
-    """Yield SSE chunks for a list of text pieces, then [DONE]."""
-    # First chunk carries role
-    first = OAIChatChunk(
+    delta: OAIStreamDelta,
+    finish_reason: str | None = None,
+) -> str:
+    chunk = OAIChatChunk(
         id=completion_id,
         created=_now_ts(),
         model=model,
-        choices=[OAIStreamChoice(delta=OAIStreamDelta(role="assistant", content=""))],
+        choices=[OAIStreamChoice(delta=delta, finish_reason=finish_reason)],
     )
-    yield f"data: {first.model_dump_json()}\n\n"
+    return f"data: {chunk.model_dump_json()}\n\n"
 
-    for piece in chunks:
-        chunk = OAIChatChunk(
-            id=completion_id,
-            created=_now_ts(),
-            model=model,
-            choices=[OAIStreamChoice(delta=OAIStreamDelta(content=piece))],
-        )
-        yield f"data: {chunk.model_dump_json()}\n\n"
+
+async def _single_piece(text: str) -> AsyncGenerator[str, None]:
+    yield text
+
+
+async def _stream_generator(
+    pieces: AsyncGenerator[str, None],
+    completion_id: str,
+    model: str,
+) -> AsyncGenerator[str, None]:
+    """Yield an SSE chunk per text piece as it arrives, then [DONE]."""
+    # First chunk carries role
+    yield _sse_chunk(completion_id, model, OAIStreamDelta(role="assistant", content=""))
+
+    # aclosing: a client disconnect must also stop upstream generation.
+    async with aclosing(pieces):
+        async for piece in pieces:
+            yield _sse_chunk(completion_id, model, OAIStreamDelta(content=piece))
 
     # Final chunk with finish_reason
-    final = OAIChatChunk(
-        id=completion_id,
-        created=_now_ts(),
-        model=model,
-        choices=[OAIStreamChoice(delta=OAIStreamDelta(), finish_reason="stop")],
-    )
-    yield f"data: {final.model_dump_json()}\n\n"
+    yield _sse_chunk(completion_id, model, OAIStreamDelta(), finish_reason="stop")
     yield "data: [DONE]\n\n"
 
 
@@ -337,7 +542,6 @@ async def _stream_generator(
 async def chat_completions(
     oai_request: OAIChatRequest,
     raw_request: Request,
-    background_tasks: BackgroundTasks,
 ):
     _t0 = time.monotonic()
     trace = PipelineTrace()
@@ -354,11 +558,31 @@ async def chat_completions(
 
     completion_id = _new_completion_id()
     request_token = set_request_id(_short_request_id(completion_id))
+    usage_meter = UsageMeter()
+    usage_token = bind_usage(usage_meter)
     max_tokens = oai_request.max_tokens or 1024
     model_profile = _request_model_profile(raw_request)
     routing_mode = _request_routing_mode(raw_request)
-    llm_config = await run_in_threadpool(_read_effective_llm_config, org_slug, org_id)
     services = _services_for_model_profile(model_profile)
+    # Speculative mode starts work that only a miss needs (classification,
+    # LLM config, provider key) alongside enrich -> normalize -> cache.
+    # A hit discards the results; a miss awaits them instead of running them.
+    # Their timings go to a separate trace that only a miss logs, so hits
+    # don't report stages they never used.
+    speculative = PipelineTrace()
+    config_task: asyncio.Task | None = None
+    classify_task: asyncio.Task | None = None
+    credential_task: asyncio.Task | None = None
+    flight: FlightLead | None = None
+    if SPECULATIVE_PIPELINE:
+        config_task = asyncio.create_task(_speculative_llm_config(org_slug, org_id, speculative))
+        if routing_mode == ROUTING_MODE_AUTO:
+            classify_task = asyncio.create_task(_speculative_classify(user_query, speculative))
+        if SPECULATIVE_CREDENTIALS and org_id is not None and routing_mode != ROUTING_MODE_EASY_LOCAL:
+            credential_task = asyncio.create_task(_speculative_provider_key(config_task, org_id, speculative))
+        llm_config = None
+    else:
+        llm_config = await run_in_threadpool(_read_effective_llm_config, org_slug, org_id)
     try:
         query = content_snippet(user_query)
         if query:
@@ -403,11 +627,17 @@ async def chat_completions(
         cache_lookup = CacheLookupResult(hit=False)
         try:
             with trace.step("cache"):
-                cache_lookup = _cache_lookup(get_memory_service(cache_namespace), clean_query)
+                # Embedding + Chroma query block; run them in a worker thread so
+                # concurrent lookups can share one embedder micro-batch.
+                memory = get_memory_service(cache_namespace)
+                cache_lookup = await run_in_threadpool(_cache_lookup, memory, clean_query)
         except Exception:
             logger.exception("Cache check failed")
 
         if cache_lookup.hit:
+            _discard_task(classify_task)
+            _discard_task(credential_task)
+            _discard_task(config_task)
             cached_answer = cache_lookup.generalized_answer or ""
             _entry_id = cache_lookup.entry_id or ""
             _cache_distance = float(cache_lookup.distance or 0.0)
@@ -422,7 +652,19 @@ async def chat_completions(
 
             response_id = f"{cache_namespace}:{_entry_id}"
             _latency = int((time.monotonic() - _t0) * 1000)
-            asyncio.create_task(request_logger.log(org_slug, dept, _latency, True, None, None, response_id))
+            await request_logger.log(
+                org_slug,
+                dept,
+                _latency,
+                True,
+                None,
+                None,
+                response_id,
+                route="cache",
+                stages=trace.steps,
+                saved=cache_lookup.usage,
+                saved_model=cache_lookup.model_used,
+            )
             asyncio.create_task(_increment_hit_count_bg(cache_namespace, _entry_id))
             logger.info(
                 "done cache=hit route=cache model=%s response_id=%s latency=%dms steps=%s%s%s",
@@ -444,38 +686,70 @@ async def chat_completions(
             _hit_headers.update(_nearest_headers(cache_lookup))
 
             if oai_request.stream:
-                words = answer.split(" ")
-                chunks = [w + " " for w in words[:-1]] + [words[-1]] if words else [answer]
                 return StreamingResponse(
-                    _stream_generator(chunks, completion_id, oai_request.model, model_used),
+                    _stream_generator(_single_piece(answer), completion_id, oai_request.model),
                     media_type="text/event-stream",
                     headers=_hit_headers,
                 )
 
-            # Non-streaming cache hit
-            prompt_tokens = int(len(clean_query.split()) * 1.3)
+            # Non-streaming cache hit: usage is the adjust call's, if any.
             response = OAIChatResponse(
                 id=completion_id,
                 created=_now_ts(),
                 model=oai_request.model,
                 choices=[OAIChoice(message=OAIMessageResponse(content=answer))],
-                usage=OAIUsage(
-                    prompt_tokens=prompt_tokens,
-                    completion_tokens=0,
-                    total_tokens=prompt_tokens,
-                ),
+                usage=_oai_usage(usage_meter.get("adjust")),
             )
             return JSONResponse(content=response.model_dump(), headers=_hit_headers)
 
-        # 4. Cache miss — classify then route
+        # 4. Cache miss — wait for an identical miss already generating, else classify then route
+        will_cache = False
+        try:
+            with trace.step("filter"):
+                will_cache, _ = cache_filter.should_cache(enriched, clean_query)
+        except Exception:
+            logger.exception("Cache filter failed")
+
+        # Compute response_id deterministically (same hash as store_interaction uses)
+        miss_response_id: str | None = None
+        if will_cache:
+            miss_doc_id = _doc_id(clean_query)
+            miss_response_id = f"{cache_namespace}:{miss_doc_id}"
+
+        if will_cache and SINGLE_FLIGHT:
+            with trace.step("single_flight"):
+                flight, shared = await single_flight.join(miss_response_id)
+            if shared is not None:
+                return await _shared_answer_response(
+                    shared,
+                    services,
+                    user_query,
+                    oai_request,
+                    completion_id,
+                    miss_response_id,
+                    cache_lookup,
+                    trace,
+                    org_slug,
+                    dept,
+                    _t0,
+                    usage_meter,
+                )
+
+        if config_task is not None:
+            with trace.step("llm_config_wait"):
+                llm_config = await config_task
         if routing_mode == ROUTING_MODE_EASY_LOCAL:
             classification = {"complexity": "easy", "score": 0.0, "task_type": "forced_local"}
         elif routing_mode == ROUTING_MODE_HARD_EXTERNAL:
             classification = {"complexity": "hard", "score": 1.0, "task_type": "forced_external"}
         else:
             try:
-                with trace.step("classify"):
-                    classification = _classifier.predict_complexity(user_query)
+                if classify_task is not None:
+                    with trace.step("classify_wait"):
+                        classification = await classify_task
+                else:
+                    with trace.step("classify"):
+                        classification = await _classify(user_query)
             except Exception:
                 logger.exception("Classifier failed")
                 classification = {"complexity": "easy", "score": 0.0, "task_type": "Unknown"}
@@ -490,6 +764,8 @@ async def chat_completions(
         answer: str = ""
         model_used: str = _local_model_used(services.llm_router, model_profile)
         route = "external" if complexity == "hard" else "local"
+        # Set instead of `answer` when the client asked for stream=true.
+        token_stream: AsyncGenerator[str, None] | None = None
 
         try:
             with trace.step("generate"):
@@ -521,8 +797,7 @@ async def chat_completions(
                     decrypted_key: str | None = None
                     if org_id is not None:
                         try:
-                            with get_session() as session:
-                                decrypted_key = CredentialService().get_decrypted_key(session, org_id, provider)
+                            decrypted_key = await _resolve_provider_key(credential_task, org_id, provider)
                         except ValueError as exc:
                             return JSONResponse(status_code=500, content={"detail": str(exc)})
                     if decrypted_key is None:
@@ -545,90 +820,129 @@ async def chat_completions(
                         or "You are a helpful assistant. Answer the user's query concisely and accurately.",
                         temperature=oai_request.temperature or 0.7,
                     )
-                    ext_response = await _external_llm.generate_response(
-                        ext_request,
-                        provider=provider,
-                        api_key=decrypted_key,
-                    )
-                    answer = ext_response.text
-                    model_used = ext_response.model_used
+                    if oai_request.stream:
+                        token_stream = _external_llm.stream_response(
+                            ext_request,
+                            provider=provider,
+                            api_key=decrypted_key,
+                        )
+                        model_used = ext_request.model
+                    else:
+                        ext_response = await _external_llm.generate_response(
+                            ext_request,
+                            provider=provider,
+                            api_key=decrypted_key,
+                        )
+                        answer = ext_response.text
+                        model_used = ext_response.model_used
                 else:
                     llm_system_prompt = (
                         system_prompt
                         or "You are a helpful assistant. Answer the user's query concisely and accurately."
                     )
-                    answer, _ = await services.llm_router.generate_local_response(
-                        user_query,
-                        history=history,
-                        max_tokens=max_tokens,
-                        system_prompt=llm_system_prompt,
-                    )
+                    if oai_request.stream:
+                        token_stream = services.llm_router.stream_local_response(
+                            user_query,
+                            history=history,
+                            max_tokens=max_tokens,
+                            system_prompt=llm_system_prompt,
+                        )
+                    else:
+                        answer, _ = await services.llm_router.generate_local_response(
+                            user_query,
+                            history=history,
+                            max_tokens=max_tokens,
+                            system_prompt=llm_system_prompt,
+                        )
                     model_used = _local_model_used(services.llm_router, model_profile)
         except ExternalLLMError as exc:
             if "not wired to a live client" in str(exc):
                 return JSONResponse(status_code=422, content={"detail": str(exc)})
             logger.exception("ExternalLLMService failed")
-            answer = "I'm sorry, I couldn't process your request right now. Please try again later."
+            answer = GENERATION_ERROR_ANSWER
             model_used = "error"
             route = "error"
         except Exception:
             logger.exception("LLM generation failed")
-            answer = "I'm sorry, I couldn't process your request right now. Please try again later."
+            answer = GENERATION_ERROR_ANSWER
             model_used = "error"
             route = "error"
 
-        # 5. Cache filter + background store
-        will_cache = False
-        try:
-            with trace.step("filter"):
-                will_cache, _ = cache_filter.should_cache(enriched, clean_query)
-        except Exception:
-            logger.exception("Cache filter failed")
+        # 5. Share the answer with waiting duplicates + background store
+        def _shared_answer(final_answer: str, final_model_used: str) -> SharedAnswer:
+            usage = usage_meter.get("generate")
+            return SharedAnswer(
+                final_answer,
+                user_query,
+                final_model_used,
+                prompt_tokens=usage.prompt_tokens if usage is not None else None,
+                completion_tokens=usage.completion_tokens if usage is not None else None,
+            )
 
-        store_status = "skipped"
-        # Compute response_id deterministically (same hash as store_interaction uses)
-        miss_response_id: str | None = None
-        if will_cache:
-            miss_doc_id = _doc_id(clean_query)
-            miss_response_id = f"{cache_namespace}:{miss_doc_id}"
+        if flight is not None and token_stream is None:
+            await flight.finish(None if route == "error" else _shared_answer(answer, model_used))
+
+        async def _store(final_answer: str, final_model_used: str) -> str:
+            if not will_cache:
+                return "skipped"
+            usage = usage_meter.get("generate")
             with trace.step("store"):
                 if USE_CELERY:
-                    generalize_and_store_task.apply_async(
-                        args=(clean_query, answer, user_query, org_slug, cache_namespace),
-                        headers={"dejaq_model_profile": model_profile},
-                    )
-                    store_status = "queued"
-                else:
-                    background_tasks.add_task(
-                        _bg_generalize_and_store,
+                    task_options: dict[str, object] = {
+                        "args": (clean_query, final_answer, user_query, org_slug, cache_namespace),
+                        "headers": {"dejaq_model_profile": model_profile},
+                    }
+                    task_kwargs = {**_store_task_kwargs(cache_lookup), **_usage_task_kwargs(usage, final_model_used)}
+                    if task_kwargs:
+                        task_options["kwargs"] = task_kwargs
+                    generalize_and_store_task.apply_async(**task_options)
+                    return "queued"
+                status = await store_queue.submit(
+                    miss_response_id,
+                    partial(
+                        _generalize_and_store,
                         clean_query,
-                        answer,
+                        final_answer,
                         user_query,
                         org_slug,
                         cache_namespace,
                         model_profile,
-                    )
-                    store_status = "background"
+                        cache_lookup.query_embedding,
+                        usage,
+                        final_model_used,
+                    ),
+                )
+                return "background" if status == "queued" else status
 
-        # 6. Return response
-        _latency = int((time.monotonic() - _t0) * 1000)
-        asyncio.create_task(request_logger.log(org_slug, dept, _latency, False, complexity, model_used, miss_response_id))
         diff_score = float(classification.get("score", 0.0))
-        logger.info(
-            "done cache=miss route=%s model=%s store=%s response_id=%s latency=%dms difficulty_score=%.4f steps=%s%s%s",
-            route,
-            model_used,
-            store_status,
-            miss_response_id or "none",
-            _latency,
-            diff_score,
-            trace.summary(),
-            _enriched_log_suffix(enriched, enrich_succeeded),
-            _nearest_log_suffix(cache_lookup),
-        )
 
-        prompt_tokens = int(len(clean_query.split()) * 1.3)
-        completion_tokens = int(len(answer.split()) * 1.3)
+        async def _log_done(final_model_used: str, final_route: str, store_status: str) -> None:
+            _latency = int((time.monotonic() - _t0) * 1000)
+            trace.steps.update(speculative.steps)
+            await request_logger.log(
+                org_slug,
+                dept,
+                _latency,
+                False,
+                complexity,
+                final_model_used,
+                miss_response_id,
+                route=final_route,
+                stages=trace.steps,
+                usage=usage_meter.get("generate"),
+            )
+            logger.info(
+                "done cache=miss route=%s model=%s store=%s response_id=%s latency=%dms difficulty_score=%.4f steps=%s%s%s",
+                final_route,
+                final_model_used,
+                store_status,
+                miss_response_id or "none",
+                _latency,
+                diff_score,
+                trace.summary(),
+                _enriched_log_suffix(enriched, enrich_succeeded),
+                _nearest_log_suffix(cache_lookup),
+            )
 
         miss_headers: dict[str, str] = {
             "x-dejaq-model-used": model_used,
@@ -640,29 +954,86 @@ async def chat_completions(
         if miss_response_id:
             miss_headers["x-dejaq-response-id"] = miss_response_id
 
-        if oai_request.stream:
-            words = answer.split(" ")
-            chunks = [w + " " for w in words[:-1]] + [words[-1]] if words else [answer]
+        if token_stream is not None:
+            stream_model_used = model_used
+            stream_route = route
+            # The relay finishes the flight once the full answer is known.
+            stream_flight, flight = flight, None
+
+            async def _relay(pieces: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+                # Runs after the handler has returned: forward each delta as it
+                # arrives and assemble the full answer for the background store.
+                stream_token = set_request_id(_short_request_id(completion_id))
+                # Streams record their usage when they end, in this context.
+                stream_usage_token = bind_usage(usage_meter)
+                parts: list[str] = []
+                final_model_used, final_route = stream_model_used, stream_route
+                try:
+                    started = time.perf_counter()
+                    with trace.step("generate"):
+                        async with aclosing(pieces):
+                            try:
+                                async for piece in pieces:
+                                    if not parts:
+                                        piece = piece.lstrip()
+                                        if not piece:
+                                            continue
+                                        trace.steps["first_token"] = int((time.perf_counter() - started) * 1000)
+                                    parts.append(piece)
+                                    yield piece
+                            except Exception:
+                                logger.exception("LLM streaming failed")
+                                final_model_used, final_route = "error", "error"
+                    if final_route == "error":
+                        if stream_flight is not None:
+                            await stream_flight.finish(None)
+                        if not parts:
+                            yield GENERATION_ERROR_ANSWER
+                        store_status = "skipped"
+                    else:
+                        final_answer = "".join(parts).strip()
+                        if stream_flight is not None:
+                            await stream_flight.finish(_shared_answer(final_answer, final_model_used))
+                        store_status = await _store(final_answer, final_model_used)
+                    await _log_done(final_model_used, final_route, store_status)
+                finally:
+                    # Client gone mid-stream: waiting duplicates generate on their own.
+                    if stream_flight is not None:
+                        await stream_flight.finish(None)
+                    clear_usage(stream_usage_token)
+                    clear_request_id(stream_token)
+
             return StreamingResponse(
-                _stream_generator(chunks, completion_id, oai_request.model, model_used),
+                _stream_generator(_relay(token_stream), completion_id, oai_request.model),
                 media_type="text/event-stream",
                 headers=miss_headers,
+                # The relay never runs if the client leaves before the body
+                # starts; release waiting duplicates then too (no-op otherwise).
+                background=BackgroundTask(stream_flight.finish, None) if stream_flight is not None else None,
             )
 
+        # 6. Return response
+        store_status = await _store(answer, model_used)
+        await _log_done(model_used, route, store_status)
+
         response = OAIChatResponse(
             id=completion_id,
             created=_now_ts(),
             model=oai_request.model,
             choices=[OAIChoice(message=OAIMessageResponse(content=answer))],
-            usage=OAIUsage(
-                prompt_tokens=prompt_tokens,
-                completion_tokens=completion_tokens,
-                total_tokens=prompt_tokens + completion_tokens,
-            ),
+            usage=_oai_usage(usage_meter.get("generate")),
         )
         return JSONResponse(
             content=response.model_dump(),
             headers=miss_headers,
         )
     finally:
+        # Early returns (validation errors) must not leave duplicates waiting
+        # or speculative work unobserved.
+        if flight is not None:
+            await flight.finish(None)
+        _discard_task(classify_task)
+        _discard_task(credential_task)
+        _discard_task(config_task)
+        clear_usage(usage_token)
         clear_request_id(request_token)
@@ -1,6 +1,21 @@
 from pydantic import BaseModel
 
 
+class LatencyPercentiles(BaseModel):
+    requests: int
+    p50_ms: float
+    p90_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+class ModelTokens(BaseModel):
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+
+
 class StatsMetrics(BaseModel):
     requests: int
     hits: int
@@ -11,6 +26,16 @@ class StatsMetrics(BaseModel):
     easy_count: int
     hard_count: int
     models_used: list[str]
+    # From the latency histograms (bins within ~2% of the true value).
+    hit_latency: LatencyPercentiles | None = None
+    miss_latency: LatencyPercentiles | None = None
+    latency_by_route: dict[str, LatencyPercentiles] = {}
+    # Recorded token counts (requests logged before token accounting have none).
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_saved: int = 0
+    cost_saved_usd: float = 0.0
+    savings_by_model: dict[str, ModelTokens] = {}
 
 
 class OrgStats(StatsMetrics):
@@ -33,3 +58,13 @@ class DepartmentStatsReport(BaseModel):
     org: str
     items: list[DepartmentStats]
     total: StatsMetrics
+
+
+class StageStats(LatencyPercentiles):
+    org: str
+    route: str
+    stage: str
+
+
+class StageStatsReport(BaseModel):
+    items: list[StageStats]
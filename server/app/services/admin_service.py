@@ -238,8 +238,19 @@ def _delete_chroma_namespace(namespace: str) -> None:
     logger = logging.getLogger("dejaq.admin_service")
     try:
         from app.services.memory_chromaDB import _pool
+        from app.config import CACHE_STORE, CHROMA_HOST, CHROMA_PORT, LOCAL_STORE_DIR
+
+        if CACHE_STORE == "local":
+            from app.services.cache_store import delete_local_namespace
+
+            memory = _pool.pop(namespace, None)
+            if memory is not None:
+                memory._collection.close()
+            if delete_local_namespace(LOCAL_STORE_DIR, namespace):
+                logger.info("Deleted local cache store '%s'", namespace)
+            return
+
         import chromadb
-        from app.config import CHROMA_HOST, CHROMA_PORT
 
         client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
         existing = [c.name for c in client.list_collections()]
@@ -0,0 +1,206 @@
+"""Bounded in-process queue for background jobs (generalize-and-store without Celery).
+
+A fixed number of consumer tasks run on the app's event loop, started from the
+lifespan and drained on shutdown. Jobs carry a key (the cache doc_id); a job
+whose key is already queued replaces the queued one instead of adding a
+second, so repeated misses on the same query generalize and store once. When
+the queue is full the policy decides: drop the new job, drop the oldest queued
+one, or let the submitter wait a bounded time for room.
+
+Submit and consume on one event loop. If the loop the consumers were started
+on goes away (test clients without a lifespan), the next submit restarts them
+on the current loop and keeps whatever was still queued.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from app import config
+
+logger = logging.getLogger("dejaq.services.background_queue")
+
+Job = Callable[[], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class BackgroundQueueStats:
+    capacity: int
+    workers: int
+    policy: str
+    depth: int
+    max_depth: int
+    in_flight: int
+    submitted: int
+    coalesced: int
+    dropped: int
+    completed: int
+    failed: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+@dataclass
+class _Queued:
+    job: Job
+    enqueued_at: float
+
+
+class BackgroundWorkQueue:
+    def __init__(
+        self,
+        capacity: int | None = None,
+        workers: int | None = None,
+        policy: str | None = None,
+        wait_seconds: float | None = None,
+        name: str = "background",
+    ) -> None:
+        self._capacity = capacity or config.BG_QUEUE_SIZE
+        self._workers = workers or config.BG_QUEUE_WORKERS
+        self._policy = policy or config.BG_QUEUE_POLICY
+        self._wait_seconds = config.BG_QUEUE_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self._name = name
+        self._pending: OrderedDict[str, _Queued] = OrderedDict()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._changed: asyncio.Condition | None = None
+        self._consumers: list[asyncio.Task] = []
+        self._closing = False
+        self._in_flight = 0
+        self._submitted = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_depth = 0
+        self._total_wait_s = 0.0
+        self._max_wait_s = 0.0
+
+    def start(self) -> None:
+        """Start the consumers on the running event loop (no-op if already running there)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._consumers:
+            return
+        self._loop = loop
+        self._changed = asyncio.Condition()
+        self._closing = False
+        self._in_flight = 0
+        self._consumers = [
+            loop.create_task(self._consume(), name=f"dejaq-{self._name}-{index}") for index in range(self._workers)
+        ]
+        logger.info(
+            "%s queue started workers=%d capacity=%d policy=%s",
+            self._name,
+            self._workers,
+            self._capacity,
+            self._policy,
+        )
+
+    async def submit(self, key: str, job: Job) -> str:
+        """Queue a job; returns "queued", "coalesced" or "dropped"."""
+        self.start()
+        if self._closing:
+            self._dropped += 1
+            return "dropped"
+        async with self._changed:
+            queued = self._pending.get(key)
+            if queued is not None:
+                # Keep the queue position, run the newest version of the job.
+                queued.job = job
+                self._coalesced += 1
+                return "coalesced"
+            if len(self._pending) >= self._capacity and not await self._make_room():
+                self._dropped += 1
+                logger.warning("%s queue full (%d); dropped key=%s", self._name, self._capacity, key)
+                return "dropped"
+            self._pending[key] = _Queued(job, time.perf_counter())
+            self._submitted += 1
+            self._max_depth = max(self._max_depth, len(self._pending))
+            self._changed.notify_all()
+        return "queued"
+
+    async def _make_room(self) -> bool:
+        if self._policy == "drop_oldest":
+            key, _ = self._pending.popitem(last=False)
+            self._dropped += 1
+            logger.warning("%s queue full (%d); dropped oldest key=%s", self._name, self._capacity, key)
+            return True
+        if self._policy == "wait" and self._wait_seconds > 0:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: len(self._pending) < self._capacity),
+                    self._wait_seconds,
+                )
+            except asyncio.TimeoutError:
+                return False
+            return True
+        return False
+
+    async def _consume(self) -> None:
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._pending or self._closing)
+                if not self._pending:
+                    return
+                key, queued = self._pending.popitem(last=False)
+                self._in_flight += 1
+                self._changed.notify_all()
+            wait = time.perf_counter() - queued.enqueued_at
+            self._total_wait_s += wait
+            self._max_wait_s = max(self._max_wait_s, wait)
+            try:
+                await queued.job()
+            except Exception:
+                # Jobs log their own failures with context.
+                self._failed += 1
+                logger.debug("%s job failed key=%s", self._name, key, exc_info=True)
+            else:
+                self._completed += 1
+            finally:
+                async with self._changed:
+                    self._in_flight -= 1
+                    self._changed.notify_all()
+
+    async def close(self, timeout: float | None = None) -> None:
+        """Stop accepting jobs, let queued and running ones finish for up to `timeout` seconds."""
+        if not self._consumers or self._loop is not asyncio.get_running_loop():
+            return
+        timeout = config.BG_QUEUE_DRAIN_SECONDS if timeout is None else timeout
+        async with self._changed:
+            self._closing = True
+            self._changed.notify_all()
+        done, pending = await asyncio.wait(self._consumers, timeout=timeout)
+        for consumer in pending:
+            consumer.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        abandoned = len(self._pending) + len(pending)
+        if abandoned:
+            logger.warning("%s queue closed with %d unfinished jobs", self._name, abandoned)
+            self._dropped += len(self._pending)
+            self._pending.clear()
+        self._consumers = []
+
+    def stats(self) -> BackgroundQueueStats:
+        started = self._completed + self._failed + self._in_flight
+        return BackgroundQueueStats(
+            capacity=self._capacity,
+            workers=self._workers,
+            policy=self._policy,
+            depth=len(self._pending),
+            max_depth=self._max_depth,
+            in_flight=self._in_flight,
+            submitted=self._submitted,
+            coalesced=self._coalesced,
+            dropped=self._dropped,
+            completed=self._completed,
+            failed=self._failed,
+            avg_wait_ms=(self._total_wait_s * 1000 / started if started else 0.0),
+            max_wait_ms=self._max_wait_s * 1000,
+        )
+
+
+store_queue = BackgroundWorkQueue(name="generalize-store")
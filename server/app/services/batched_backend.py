@@ -0,0 +1,487 @@
+"""Continuous-batching backend for in-process generation.
+
+``InProcessBackend`` gives every request a whole Llama instance, so one
+instance decodes one sequence at a time. ``BatchedBackend`` keeps one model per
+logical model and a single llama context holding ``DEJAQ_BATCHED_SLOTS``
+sequences in a unified KV cache. A worker thread runs the decode loop: every
+step packs the next token of each generating sequence plus prompt tokens of
+newly admitted ones into one ``llama_decode`` call. Requests join and leave at
+token boundaries instead of queueing behind a whole completion, which raises
+aggregate tokens/s on CPU where one sequence leaves most of a matmul idle.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import ctypes
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from app import config
+from app.services import token_usage
+from app.services.model_backends import (
+    MODEL_RUNTIME_SPECS,
+    CompletionRequest,
+    chat_formatter,
+    chat_prompt,
+    model_load_options,
+)
+from app.services.model_loader import ModelManager
+from app.services.request_scheduler import request_scheduler
+
+logger = logging.getLogger("dejaq.services.batched_backend")
+
+_END = object()
+# Llama.create_chat_completion defaults, so switching backends keeps sampling comparable.
+_TOP_K = 40
+_TOP_P = 0.95
+_MIN_P = 0.05
+
+
+@dataclass(frozen=True)
+class BatchEngineStats:
+    slots: int
+    active: int
+    queued: int
+    requests: int
+    steps: int
+    tokens_generated: int
+    avg_sequences_per_step: float
+
+
+@dataclass(frozen=True)
+class BatchedBackendStats:
+    models: dict[str, BatchEngineStats]
+
+
+class _LlamaRuntime:
+    """The llama-cpp calls the engine needs, on a multi-sequence context."""
+
+    def __init__(self, llama, slots: int, n_ctx: int, n_batch: int, n_threads: int | None) -> None:
+        import llama_cpp
+        from llama_cpp import _internals
+
+        self._lib = llama_cpp
+        self._llama = llama
+        self._vocab = llama_cpp.llama_model_get_vocab(llama._model.model)
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx
+        params.n_batch = n_batch
+        params.n_ubatch = n_batch
+        params.n_seq_max = slots
+        params.kv_unified = True
+        if n_threads:
+            params.n_threads = n_threads
+            params.n_threads_batch = n_threads
+        self._context = _internals.LlamaContext(model=llama._model, params=params, verbose=False)
+        self._ctx = self._context.ctx
+        self._memory = llama_cpp.llama_get_memory(self._ctx)
+        self._batch = llama_cpp.llama_batch_init(n_batch, 0, slots)
+        self._samplers: dict[int, object] = {}
+        self._piece_buffer = ctypes.create_string_buffer(64)
+        self.n_ctx = llama_cpp.llama_n_ctx(self._ctx)
+        self.n_batch = n_batch
+
+        self._formatter = chat_formatter(llama)
+
+    def prompt(self, messages: list) -> tuple[list[int], list[str]]:
+        return chat_prompt(self._llama, self._formatter, messages)
+
+    def start_sequence(self, seq: int, temperature: float) -> None:
+        lib = self._lib
+        chain = lib.llama_sampler_chain_init(lib.llama_sampler_chain_default_params())
+        if temperature <= 0:
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_greedy())
+        else:
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_top_k(_TOP_K))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_top_p(_TOP_P, 1))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_min_p(_MIN_P, 1))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_temp(temperature))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_dist(lib.LLAMA_DEFAULT_SEED))
+        self._samplers[seq] = chain
+
+    def decode(self, entries: list[tuple[int, int, int, bool]]) -> None:
+        """Evaluate (token, position, sequence, wants_logits) entries in one llama_decode."""
+        batch = self._batch
+        for i, (token, pos, seq, logits) in enumerate(entries):
+            batch.token[i] = token
+            batch.pos[i] = pos
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = seq
+            batch.logits[i] = logits
+        batch.n_tokens = len(entries)
+        status = self._lib.llama_decode(self._ctx, batch)
+        if status != 0:
+            raise RuntimeError(f"llama_decode failed with status {status}")
+
+    def sample(self, seq: int, batch_index: int) -> int:
+        return self._lib.llama_sampler_sample(self._samplers[seq], self._ctx, batch_index)
+
+    def is_eog(self, token: int) -> bool:
+        return bool(self._lib.llama_vocab_is_eog(self._vocab, token))
+
+    def piece(self, token: int) -> bytes:
+        size = self._lib.llama_token_to_piece(
+            self._vocab, token, self._piece_buffer, len(self._piece_buffer), 0, False
+        )
+        if size < 0:
+            buffer = ctypes.create_string_buffer(-size)
+            size = self._lib.llama_token_to_piece(self._vocab, token, buffer, -size, 0, False)
+            return buffer.raw[:size]
+        return self._piece_buffer.raw[:size]
+
+    def end_sequence(self, seq: int) -> None:
+        self._lib.llama_memory_seq_rm(self._memory, seq, -1, -1)
+        chain = self._samplers.pop(seq, None)
+        if chain is not None:
+            self._lib.llama_sampler_free(chain)
+
+    def close(self) -> None:
+        for seq in list(self._samplers):
+            self.end_sequence(seq)
+        self._lib.llama_batch_free(self._batch)
+        self._context.close()
+
+
+class _Job:
+    def __init__(self, request: CompletionRequest, loop: asyncio.AbstractEventLoop) -> None:
+        self.request = request
+        self.loop = loop
+        self.output: asyncio.Queue[object] = asyncio.Queue()
+        self.cancelled = threading.Event()
+        self.prompt: list[int] | None = None
+        self.stop: list[str] = []
+        self.max_tokens = request.max_tokens
+        self.seq = -1
+        self.prompt_pos = 0
+        self.n_past = 0
+        self.next_token: int | None = None
+        self.generated = 0
+        self.done = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._text = ""
+        self._sent = 0
+
+    @property
+    def budget(self) -> int:
+        return len(self.prompt or ()) + self.max_tokens
+
+    def send(self, item: object) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.output.put_nowait, item)
+        except RuntimeError:
+            # The request's event loop is gone; nobody is listening.
+            self.cancelled.set()
+
+    def feed(self, piece: bytes) -> None:
+        """Append a token's bytes; forward text that can no longer be part of a stop string."""
+        self._text += self._decoder.decode(piece)
+        window_start = max(0, self._sent - max((len(s) for s in self.stop), default=0))
+        hits = [i for i in (self._text.find(s, window_start) for s in self.stop) if i != -1]
+        if hits:
+            self._flush(min(hits))
+            self.done = True
+            return
+        holdback = 0
+        for stop in self.stop:
+            for size in range(min(len(stop) - 1, len(self._text)), holdback, -1):
+                if self._text.endswith(stop[:size]):
+                    holdback = size
+                    break
+        self._flush(len(self._text) - holdback)
+
+    def finish(self) -> None:
+        if not self.done:
+            self._text += self._decoder.decode(b"", final=True)
+            self._flush(len(self._text))
+        self.send(_END)
+
+    def _flush(self, end: int) -> None:
+        if end > self._sent:
+            self.send(self._text[self._sent:end])
+            self._sent = end
+
+
+class _BatchEngine:
+    def __init__(self, runtime, slots: int, name: str = "") -> None:
+        self._runtime = runtime
+        self._slots = slots
+        self._pending: deque[_Job] = deque()
+        self._active: dict[int, _Job] = {}
+        self._reserved = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._requests = 0
+        self._steps = 0
+        self._sequences_stepped = 0
+        self._tokens_generated = 0
+        self.last_used = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"dejaq-batch-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, job: _Job) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batched backend is closed")
+            self._pending.append(job)
+            self._requests += 1
+            self.last_used = time.monotonic()
+            self._cond.notify()
+
+    @property
+    def idle(self) -> bool:
+        with self._cond:
+            return not self._active and not self._pending
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._runtime.close()
+
+    def stats(self) -> BatchEngineStats:
+        return BatchEngineStats(
+            slots=self._slots,
+            active=len(self._active),
+            queued=len(self._pending),
+            requests=self._requests,
+            steps=self._steps,
+            tokens_generated=self._tokens_generated,
+            avg_sequences_per_step=(self._sequences_stepped / self._steps if self._steps else 0.0),
+        )
+
+    # -- worker thread -------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not self._active and not self._pending:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                admitted = self._admit()
+            for job in admitted:
+                self._runtime.start_sequence(job.seq, job.request.temperature)
+            for job in [job for job in self._active.values() if job.cancelled.is_set()]:
+                self._release(job)
+            if self._active:
+                self._step()
+
+        for job in list(self._active.values()):
+            self._fail(job, RuntimeError("Batched backend closed"))
+        for job in self._pending:
+            job.send(RuntimeError("Batched backend closed"))
+
+    def _admit(self) -> list[_Job]:
+        """Move queued jobs into free sequence slots (FIFO) while the shared KV cache has room."""
+        admitted: list[_Job] = []
+        while self._pending and len(self._active) < self._slots:
+            job = self._pending[0]
+            if job.cancelled.is_set():
+                self._pending.popleft()
+                continue
+            if job.prompt is None:
+                try:
+                    job.prompt, job.stop = self._runtime.prompt(job.request.messages)
+                except Exception as exc:
+                    self._pending.popleft()
+                    job.send(exc)
+                    continue
+                room = self._runtime.n_ctx - len(job.prompt)
+                if room <= 0:
+                    self._pending.popleft()
+                    job.send(
+                        ValueError(
+                            f"Requested tokens ({len(job.prompt)}) exceed context window of {self._runtime.n_ctx}"
+                        )
+                    )
+                    continue
+                job.max_tokens = min(job.max_tokens, room)
+            if self._reserved + job.budget > self._runtime.n_ctx:
+                break
+            self._pending.popleft()
+            job.seq = next(seq for seq in range(self._slots) if seq not in self._active)
+            self._active[job.seq] = job
+            self._reserved += job.budget
+            admitted.append(job)
+        return admitted
+
+    def _step(self) -> None:
+        entries: list[tuple[int, int, int, bool]] = []
+        sampling: list[tuple[_Job, int]] = []
+        # Generating sequences first: one token each keeps every stream moving.
+        for job in self._active.values():
+            if job.next_token is not None:
+                sampling.append((job, len(entries)))
+                entries.append((job.next_token, job.n_past, job.seq, True))
+                job.n_past += 1
+        # Remaining batch room goes to prompt evaluation of newly admitted jobs.
+        for job in self._active.values():
+            room = self._runtime.n_batch - len(entries)
+            if room <= 0:
+                break
+            if job.next_token is not None or job.prompt_pos >= len(job.prompt):
+                continue
+            chunk = job.prompt[job.prompt_pos:job.prompt_pos + room]
+            job.prompt_pos += len(chunk)
+            for offset, token in enumerate(chunk):
+                last = job.prompt_pos == len(job.prompt) and offset == len(chunk) - 1
+                if last:
+                    sampling.append((job, len(entries)))
+                entries.append((token, job.n_past, job.seq, last))
+                job.n_past += 1
+
+        try:
+            self._runtime.decode(entries)
+        except Exception as exc:
+            logger.exception("Batched decode failed; failing %d active requests", len(self._active))
+            for job in list(self._active.values()):
+                self._fail(job, exc)
+            return
+        self._steps += 1
+        self._sequences_stepped += len({seq for _, _, seq, _ in entries})
+
+        for job, index in sampling:
+            token = self._runtime.sample(job.seq, index)
+            if self._runtime.is_eog(token):
+                self._release(job, finished=True)
+                continue
+            job.generated += 1
+            self._tokens_generated += 1
+            job.feed(self._runtime.piece(token))
+            if job.done or job.generated >= job.max_tokens:
+                self._release(job, finished=True)
+            else:
+                job.next_token = token
+
+    def _release(self, job: _Job, finished: bool = False) -> None:
+        self._runtime.end_sequence(job.seq)
+        with self._cond:
+            self._active.pop(job.seq, None)
+            self._reserved -= job.budget
+            self.last_used = time.monotonic()
+        if finished:
+            job.finish()
+
+    def _fail(self, job: _Job, exc: Exception) -> None:
+        self._release(job)
+        job.send(exc)
+
+
+class BatchedBackend:
+    def __init__(
+        self,
+        slots: int | None = None,
+        n_ctx: int | None = None,
+        n_batch: int | None = None,
+    ) -> None:
+        self._slots = slots or config.BATCHED_SLOTS
+        self._n_ctx = n_ctx or config.BATCHED_N_CTX
+        self._n_batch = n_batch or config.BATCHED_N_BATCH
+        if self._slots > self._n_batch:
+            # Every generating sequence adds one token per step to the batch buffer.
+            logger.warning(
+                "DEJAQ_BATCHED_SLOTS=%d exceeds DEJAQ_BATCHED_N_BATCH=%d; using %d slots",
+                self._slots,
+                self._n_batch,
+                self._n_batch,
+            )
+            self._slots = self._n_batch
+        self._engines: dict[str, _BatchEngine] = {}
+        self._engine_locks: dict[str, asyncio.Lock] = {}
+
+    def _load_engine(self, logical_model_name: str) -> _BatchEngine:
+        try:
+            runtime_spec = MODEL_RUNTIME_SPECS[logical_model_name]
+        except KeyError as exc:
+            raise ValueError(f"Unknown logical model name: {logical_model_name}") from exc
+
+        options = model_load_options(logical_model_name)
+        n_threads = options.pop("n_threads", None)
+        llama = ModelManager.load_weights(runtime_spec.loader_name, **options)
+        runtime = _LlamaRuntime(
+            llama,
+            slots=self._slots,
+            n_ctx=self._n_ctx,
+            n_batch=self._n_batch,
+            n_threads=n_threads,
+        )
+        logger.info(
+            "Batched engine ready model=%s slots=%d n_ctx=%d n_batch=%d",
+            logical_model_name,
+            self._slots,
+            runtime.n_ctx,
+            self._n_batch,
+        )
+        return _BatchEngine(runtime, self._slots, name=logical_model_name)
+
+    async def _get_engine(self, logical_model_name: str) -> _BatchEngine:
+        engine = self._engines.get(logical_model_name)
+        if engine is not None:
+            return engine
+        async with self._engine_locks.setdefault(logical_model_name, asyncio.Lock()):
+            engine = self._engines.get(logical_model_name)
+            if engine is None:
+                engine = await asyncio.to_thread(self._load_engine, logical_model_name)
+                self._engines[logical_model_name] = engine
+        return engine
+
+    async def complete(self, request: CompletionRequest) -> str:
+        logger.debug("Model completion backend=batched model=%s", request.model_name)
+        return "".join([piece async for piece in self.stream(request)]).strip()
+
+    async def stream(self, request: CompletionRequest) -> AsyncIterator[str]:
+        engine = await self._get_engine(request.model_name)
+        # Admit at most `slots` sequences, so waiting requests are ordered by
+        # priority here instead of first-come in the engine queue.
+        async with request_scheduler.slot(
+            f"batched:{request.model_name}",
+            self._slots,
+            request.role,
+            request.max_tokens,
+            request.priority,
+        ):
+            job = _Job(request, asyncio.get_running_loop())
+            engine.submit(job)
+            try:
+                while (item := await job.output.get()) is not _END:
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                # Frees the sequence slot at the next step if we stopped early.
+                job.cancelled.set()
+            token_usage.record(request.role, len(job.prompt or ()), job.generated)
+
+    async def preload(self, logical_model_name: str) -> None:
+        await self._get_engine(logical_model_name)
+
+    async def unload_idle(self, max_idle_seconds: float, pinned: set[str]) -> list[str]:
+        """Close engines with no queued or running sequence for max_idle_seconds."""
+        unloaded = []
+        now = time.monotonic()
+        for name, engine in list(self._engines.items()):
+            if name in pinned or not engine.idle or now - engine.last_used < max_idle_seconds:
+                continue
+            async with self._engine_locks[name]:
+                if self._engines.get(name) is not engine or not engine.idle:
+                    continue
+                del self._engines[name]
+                await asyncio.to_thread(engine.close)
+                await asyncio.to_thread(ModelManager.unload, MODEL_RUNTIME_SPECS[name].loader_name, True)
+            unloaded.append(name)
+        return unloaded
+
+    def stats(self) -> BatchedBackendStats:
+        return BatchedBackendStats(models={name: engine.stats() for name, engine in self._engines.items()})
+
+    def close(self) -> None:
+        for engine in self._engines.values():
+            engine.close()
+        self._engines.clear()
@@ -0,0 +1,322 @@
+"""Storage backends for the semantic cache.
+
+MemoryService talks to its store through the subset of the Chroma collection
+API it actually uses (``CacheStore``). The default store is a collection on the
+Chroma HTTP server; ``LocalVectorStore`` keeps each namespace in-process instead:
+
+- metadata and documents in ``{namespace}.sqlite3`` (WAL, shared by the API
+  process and Celery workers on the same node)
+- unit-normalized float32 vectors in a memory-mapped ``{namespace}.f32`` matrix,
+  one row per slot, so a restart maps the index back in without re-embedding
+
+Every upsert/delete bumps a generation counter in SQLite; a process notices the
+change on its next call and reloads the slot map, so writes made by workers
+become visible to the gateway without a server in between.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Protocol, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("dejaq.services.cache_store")
+
+_MIN_CAPACITY = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL UNIQUE,
+    document TEXT,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('generation', 0);
+"""
+
+# Lowest slot not in use: 0 if free, else the first slot whose successor is free.
+_FREE_SLOT_SQL = """
+SELECT CASE
+    WHEN NOT EXISTS (SELECT 1 FROM entries WHERE slot = 0) THEN 0
+    ELSE (SELECT MIN(e.slot + 1) FROM entries e
+          WHERE NOT EXISTS (SELECT 1 FROM entries f WHERE f.slot = e.slot + 1))
+END
+"""
+
+_WHERE_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+}
+
+
+class CacheStore(Protocol):
+    def count(self) -> int:
+        ...
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int, include: list[str]) -> dict:
+        ...
+
+    def upsert(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]) -> None:
+        ...
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        include: list[str] | None = None,
+        where: dict | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> dict:
+        ...
+
+    def update(self, ids: list[str], metadatas: list[dict]) -> None:
+        ...
+
+    def delete(self, ids: list[str]) -> None:
+        ...
+
+
+def _matches(meta: dict, where: dict) -> bool:
+    """Evaluate the Chroma where-filter subset used by MemoryService: {field: {op: value}}."""
+    for field, condition in where.items():
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            try:
+                compare = _WHERE_OPS[op]
+            except KeyError as exc:
+                raise ValueError(f"Unsupported where operator: {op}") from exc
+            if field not in meta or not compare(meta[field], expected):
+                return False
+    return True
+
+
+class LocalVectorStore:
+    def __init__(self, namespace: str, directory: str, dim: int) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._namespace = namespace
+        self._dim = dim
+        self._row_bytes = dim * np.dtype("<f4").itemsize
+        self._vectors_path = os.path.join(directory, f"{namespace}.f32")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, f"{namespace}.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        self._vectors: np.memmap | None = None
+        self._generation = -1
+        self._ids: list[str] = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._refresh()
+        logger.info("Local cache store ready namespace=%s entries=%d", namespace, len(self._ids))
+
+    # -- vector file ---------------------------------------------------------
+
+    def _open_vectors(self) -> np.memmap:
+        if not os.path.exists(self._vectors_path):
+            self._grow_vectors(_MIN_CAPACITY)
+        rows = os.path.getsize(self._vectors_path) // self._row_bytes
+        return np.memmap(self._vectors_path, dtype="<f4", mode="r+", shape=(rows, self._dim))
+
+    def _grow_vectors(self, rows: int) -> None:
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(rows * self._row_bytes)
+
+    def _capacity(self) -> int:
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def _ensure_capacity(self, slot: int) -> None:
+        rows_on_disk = os.path.getsize(self._vectors_path) // self._row_bytes
+        if slot >= rows_on_disk:
+            self._grow_vectors(max(rows_on_disk * 2, slot + 1))
+        if slot >= self._capacity():
+            self._vectors = self._open_vectors()
+
+    # -- index state ---------------------------------------------------------
+
+    def _refresh(self) -> None:
+        """Reload the slot map and search matrix if any process wrote since the last call."""
+        generation = self._conn.execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()[0]
+        if generation == self._generation:
+            return
+        rows = self._conn.execute("SELECT id, slot FROM entries ORDER BY slot").fetchall()
+        if self._vectors is None or (rows and rows[-1][1] >= self._capacity()):
+            self._vectors = self._open_vectors()
+        slots = np.fromiter((slot for _, slot in rows), dtype=np.int64, count=len(rows))
+        self._ids = [entry_id for entry_id, _ in rows]
+        self._matrix = np.ascontiguousarray(self._vectors[slots])
+        self._generation = generation
+
+    def _bump_generation(self) -> None:
+        self._conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'generation'")
+
+    def _rows(self, ids: Sequence[str]) -> dict[str, tuple[str | None, dict]]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        found = self._conn.execute(
+            f"SELECT id, document, metadata FROM entries WHERE id IN ({placeholders})",
+            list(ids),
+        ).fetchall()
+        return {entry_id: (document, json.loads(metadata)) for entry_id, document, metadata in found}
+
+    # -- CacheStore ----------------------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int, include: list[str]) -> dict:
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self._dim)
+        empty: dict[str, Any] = {"ids": [[] for _ in queries], "distances": [[] for _ in queries]}
+        empty.update({key: [[] for _ in queries] for key in ("documents", "metadatas") if key in include})
+        with self._lock:
+            # One read snapshot for the slot map and the rows, so an entry another
+            # process deletes mid-query cannot be in one and missing from the other.
+            self._conn.execute("BEGIN")
+            try:
+                self._refresh()
+                if not self._ids:
+                    return empty
+
+                norms = np.linalg.norm(queries, axis=1, keepdims=True)
+                similarities = (queries / np.maximum(norms, 1e-12)) @ self._matrix.T
+                k = min(n_results, len(self._ids))
+                top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+                top_sims = np.take_along_axis(similarities, top, axis=1)
+                order = np.argsort(-top_sims, axis=1, kind="stable")
+                top = np.take_along_axis(top, order, axis=1)
+                distances = 1.0 - np.take_along_axis(top_sims, order, axis=1)
+
+                id_rows = [[self._ids[j] for j in row] for row in top.tolist()]
+                rows = self._rows(sorted({entry_id for row in id_rows for entry_id in row}))
+            finally:
+                self._conn.execute("COMMIT")
+
+        result: dict[str, Any] = {"ids": id_rows, "distances": distances.tolist()}
+        if "documents" in include:
+            result["documents"] = [[rows[entry_id][0] for entry_id in row] for row in id_rows]
+        if "metadatas" in include:
+            result["metadatas"] = [[dict(rows[entry_id][1]) for entry_id in row] for row in id_rows]
+        return result
+
+    def upsert(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self._dim)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry_id, vector, document, meta in zip(ids, vectors, documents, metadatas):
+                    existing = self._conn.execute("SELECT slot FROM entries WHERE id = ?", (entry_id,)).fetchone()
+                    slot = existing[0] if existing else self._conn.execute(_FREE_SLOT_SQL).fetchone()[0]
+                    self._ensure_capacity(slot)
+                    self._vectors[slot] = vector
+                    self._conn.execute(
+                        "INSERT INTO entries (id, slot, document, metadata) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET document = excluded.document, metadata = excluded.metadata",
+                        (entry_id, slot, document, json.dumps(meta)),
+                    )
+                self._vectors.flush()
+                self._bump_generation()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        include: list[str] | None = None,
+        where: dict | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> dict:
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            if ids is not None:
+                found = self._rows(ids)
+                items = [(entry_id, *found[entry_id]) for entry_id in ids if entry_id in found]
+            else:
+                items = [
+                    (entry_id, document, json.loads(metadata))
+                    for entry_id, document, metadata in self._conn.execute(
+                        "SELECT id, document, metadata FROM entries ORDER BY rowid"
+                    )
+                ]
+        if where:
+            items = [item for item in items if _matches(item[2], where)]
+        start = offset or 0
+        items = items[start:start + limit] if limit is not None else items[start:]
+
+        result: dict[str, Any] = {"ids": [entry_id for entry_id, _, _ in items]}
+        result["documents"] = [document for _, document, _ in items] if "documents" in include else None
+        result["metadatas"] = [meta for _, _, meta in items] if "metadatas" in include else None
+        return result
+
+    def update(self, ids: list[str], metadatas: list[dict]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry_id, meta in zip(ids, metadatas):
+                    self._conn.execute(
+                        "UPDATE entries SET metadata = ? WHERE id = ?",
+                        (json.dumps(meta), entry_id),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in ids])
+                self._bump_generation()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._vectors = None
+
+
+def list_local_namespaces(directory: str) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[: -len(".sqlite3")] for name in os.listdir(directory) if name.endswith(".sqlite3"))
+
+
+def delete_local_namespace(directory: str, namespace: str) -> bool:
+    """Remove a namespace's files. Returns True if anything was deleted."""
+    removed = False
+    for suffix in (".sqlite3", ".sqlite3-wal", ".sqlite3-shm", ".f32"):
+        path = os.path.join(directory, f"{namespace}{suffix}")
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import numpy as np
@@ -6,6 +7,20 @@ import torch.nn as nn
 from huggingface_hub import PyTorchModelHubMixin, hf_hub_download
 from transformers import AutoModel, AutoTokenizer
 
+from app.config import (
+    CLASSIFIER_BACKEND,
+    CLASSIFIER_BATCH_MAX_SIZE,
+    CLASSIFIER_BATCH_MAX_WAIT_MS,
+    CLASSIFIER_CACHE_MAX_ENTRIES,
+    CLASSIFIER_CACHE_REDIS,
+    CLASSIFIER_CACHE_REDIS_TTL_SECONDS,
+    CLASSIFIER_ONNX_PATH,
+    CLASSIFIER_ONNX_QUANTIZE,
+    REDIS_URL,
+)
+from app.services.classifier_cache import ClassifierCacheStats, ClassifierResultCache
+from app.services.micro_batcher import MicroBatcher, MicroBatchStats
+
 logger = logging.getLogger("dejaq.services.classifier")
 
 MODEL_ID = "nvidia/prompt-task-and-complexity-classifier"
@@ -130,29 +145,69 @@ class CustomModel(nn.Module, PyTorchModelHubMixin):
 
         return result
 
-    def forward(self, batch):
-        input_ids = batch["input_ids"]
-        attention_mask = batch["attention_mask"]
+    def head_logits(self, input_ids, attention_mask):
         outputs = self.backbone(input_ids=input_ids, attention_mask=attention_mask)
 
         last_hidden_state = outputs.last_hidden_state
         mean_pooled = self.pool(last_hidden_state, attention_mask)
 
-        logits = [head(mean_pooled) for head in self.heads]
+        return [head(mean_pooled) for head in self.heads]
+
+    def forward(self, batch):
+        logits = self.head_logits(batch["input_ids"], batch["attention_mask"])
         return self.process_logits(logits)
 
 
+class ClassifierLabelMaps:
+    """Carries only what CustomModel's post-processing reads.
+
+    Lets non-torch backends reuse the exact logits -> scores code without
+    loading the DeBERTa backbone.
+    """
+
+    compute_results = CustomModel.compute_results
+    process_logits = CustomModel.process_logits
+
+    def __init__(self, task_type_map, weights_map, divisor_map):
+        self.task_type_map = task_type_map
+        self.weights_map = weights_map
+        self.divisor_map = divisor_map
+
+    @classmethod
+    def from_hub(cls) -> "ClassifierLabelMaps":
+        with open(hf_hub_download(MODEL_ID, "config.json")) as f:
+            config = json.load(f)
+        return cls(config["task_type_map"], config["weights_map"], config["divisor_map"])
+
+
 # --- Service class ---
 
 class ClassifierService:
     _model = None
     _tokenizer = None
     _device = None
-
-    def __init__(self):
-        if ClassifierService._model is None:
+    _onnx_runtime = None
+    _batchers: dict[str, MicroBatcher[str, dict]] = {}
+    _result_caches: dict[str, ClassifierResultCache] = {}
+
+    def __init__(self, backend: str | None = None):
+        self._backend = backend or CLASSIFIER_BACKEND
+        if self._backend == "onnx":
+            if ClassifierService._onnx_runtime is None:
+                self._load_onnx_runtime()
+        elif ClassifierService._model is None:
             self._load_model()
 
+    @classmethod
+    def _load_onnx_runtime(cls):
+        # Imported lazily so onnxruntime is only required when selected.
+        from app.services.classifier_onnx import OnnxClassifierRuntime
+
+        cls._onnx_runtime = OnnxClassifierRuntime.load(
+            model_path=CLASSIFIER_ONNX_PATH,
+            quantize=CLASSIFIER_ONNX_QUANTIZE,
+        )
+
     @classmethod
     def _load_model(cls):
         logger.info("Loading NVIDIA prompt-task-and-complexity-classifier...")
@@ -178,26 +233,106 @@ class ClassifierService:
         Classify a query's complexity using NVIDIA's DeBERTa-based classifier.
         Returns dict with keys: complexity, score, task_type
         """
-        encoded = self._tokenizer(
-            [f"Prompt: {query}"],
-            return_tensors="pt",
-            add_special_tokens=True,
-            max_length=512,
-            padding=True,
-            truncation=True,
-        ).to(self._device)
-
-        with torch.no_grad():
-            result = self._model(encoded)
-
-        score = result["prompt_complexity_score"][0]
-        task_type = result["task_type_1"][0]
-        complexity = "hard" if score >= COMPLEXITY_THRESHOLD else "easy"
-
-        logger.debug("Query classified as %s (score=%.4f, task=%s)", complexity, score, task_type)
-
-        return {
-            "complexity": complexity,
-            "score": score,
-            "task_type": task_type,
-        }
+        return self.predict_batch([query])[0]
+
+    def predict_batch(self, queries: list[str]) -> list[dict]:
+        """Classify several queries with one padded forward pass, in input order.
+
+        Prompts already in the result cache skip the forward pass.
+        """
+        prompts = [f"Prompt: {query}" for query in queries]
+        cache = self._get_result_cache()
+        if cache is None:
+            return self._predict_prompts(prompts)
+
+        predictions = cache.get_many(prompts)
+        missing = [i for i, prediction in enumerate(predictions) if prediction is None]
+        if missing:
+            computed = self._predict_prompts([prompts[i] for i in missing])
+            cache.put_many([prompts[i] for i in missing], computed)
+            for i, prediction in zip(missing, computed):
+                predictions[i] = prediction
+        return [dict(prediction) for prediction in predictions]
+
+    def _predict_prompts(self, prompts: list[str]) -> list[dict]:
+        if self._backend == "onnx":
+            result = self._onnx_runtime.run(prompts)
+        else:
+            encoded = self._tokenizer(
+                prompts,
+                return_tensors="pt",
+                add_special_tokens=True,
+                max_length=512,
+                padding=True,
+                truncation=True,
+            ).to(self._device)
+
+            with torch.no_grad():
+                result = self._model(encoded)
+
+        predictions = []
+        for score, task_type in zip(result["prompt_complexity_score"], result["task_type_1"]):
+            complexity = "hard" if score >= COMPLEXITY_THRESHOLD else "easy"
+            logger.debug("Query classified as %s (score=%.4f, task=%s)", complexity, score, task_type)
+            predictions.append({
+                "complexity": complexity,
+                "score": score,
+                "task_type": task_type,
+            })
+        return predictions
+
+    def _get_result_cache(self) -> ClassifierResultCache | None:
+        if CLASSIFIER_CACHE_MAX_ENTRIES <= 0:
+            return None
+        cache = ClassifierService._result_caches.get(self._backend)
+        if cache is None:
+            # Backends differ slightly in scores (int8 especially), so each keeps its own keys.
+            namespace = self._backend
+            if self._backend == "onnx" and CLASSIFIER_ONNX_QUANTIZE:
+                namespace = "onnx-int8"
+            cache = ClassifierResultCache(
+                CLASSIFIER_CACHE_MAX_ENTRIES,
+                namespace=namespace,
+                redis_url=REDIS_URL if CLASSIFIER_CACHE_REDIS else None,
+                redis_ttl_seconds=CLASSIFIER_CACHE_REDIS_TTL_SECONDS,
+            )
+            cache = ClassifierService._result_caches.setdefault(self._backend, cache)
+        return cache
+
+    def _get_batcher(self) -> MicroBatcher[str, dict]:
+        batcher = ClassifierService._batchers.get(self._backend)
+        if batcher is None:
+            # One batcher per backend, so a batch runs on the backend its callers asked for.
+            batcher = MicroBatcher(
+                self.predict_batch,
+                max_batch_size=CLASSIFIER_BATCH_MAX_SIZE,
+                max_wait_ms=CLASSIFIER_BATCH_MAX_WAIT_MS,
+                name=f"classifier-batcher-{self._backend}",
+            )
+            batcher = ClassifierService._batchers.setdefault(self._backend, batcher)
+        return batcher
+
+    async def classify(self, query: str) -> dict:
+        """Classify off the event loop; concurrent callers share one batched forward pass."""
+        cache = self._get_result_cache()
+        if cache is not None:
+            cached = cache.get_local(f"Prompt: {query}")
+            if cached is not None:
+                return dict(cached)
+        return await asyncio.wrap_future(self._get_batcher().submit(query))
+
+
+def get_classifier_batch_stats() -> MicroBatchStats | None:
+    """Return batch counters for the configured backend, or None before the first batched call."""
+    batcher = ClassifierService._batchers.get(CLASSIFIER_BACKEND)
+    if batcher is None:
+        return None
+    return batcher.stats()
+
+
+def get_classifier_cache_stats() -> ClassifierCacheStats | None:
+    """Return result-cache counters for the configured backend, or None before first use."""
+    cache = ClassifierService._result_caches.get(CLASSIFIER_BACKEND)
+    if cache is None:
+        return None
+    return cache.stats()
@@ -0,0 +1,135 @@
+"""Result cache for the complexity classifier.
+
+Classification is deterministic for a given prompt and model, so results are
+memoized under a sha256 of the exact ``Prompt: {query}`` string fed to the
+tokenizer. The in-process tier is a bounded LRU; an optional Redis tier lets
+gateway replicas share results. Redis failures degrade to the local tier.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+
+import redis as redis_lib
+
+from app.services.exact_match_cache import ExactMatchCache
+
+logger = logging.getLogger("dejaq.services.classifier_cache")
+
+_REDIS_TIMEOUT_S = 0.05
+
+
+@dataclass(frozen=True)
+class ClassifierCacheStats:
+    size: int
+    hits: int
+    redis_hits: int
+    misses: int
+    redis_errors: int
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class ClassifierResultCache:
+    def __init__(
+        self,
+        max_entries: int,
+        namespace: str,
+        redis_url: str | None = None,
+        redis_ttl_seconds: int = 86400,
+        redis_client: redis_lib.Redis | None = None,
+    ) -> None:
+        self._local: ExactMatchCache[dict] = ExactMatchCache(max_entries, ttl_seconds=float("inf"))
+        self._namespace = namespace
+        self._redis_url = redis_url
+        self._redis_ttl_seconds = redis_ttl_seconds
+        self._redis: redis_lib.Redis | None = redis_client
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._redis_errors = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"classify:{self._namespace}:{key}"
+
+    def _get_redis(self) -> redis_lib.Redis | None:
+        if self._redis is None and self._redis_url is not None:
+            self._redis = redis_lib.Redis.from_url(
+                self._redis_url,
+                decode_responses=True,
+                socket_timeout=_REDIS_TIMEOUT_S,
+                socket_connect_timeout=_REDIS_TIMEOUT_S,
+            )
+        return self._redis
+
+    def get_local(self, prompt: str) -> dict | None:
+        """In-process tier only; never blocks on the network.
+
+        A miss here is not counted: the caller falls through to get_many().
+        """
+        result = self._local.get(prompt_key(prompt))
+        if result is not None:
+            self._hits += 1
+        return result
+
+    def get_many(self, prompts: list[str]) -> list[dict | None]:
+        """Look up each prompt in the local tier, then the rest in one Redis MGET."""
+        keys = [prompt_key(prompt) for prompt in prompts]
+        results = [self._local.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        self._hits += len(prompts) - len(missing)
+        client = self._get_redis()
+        if not missing or client is None:
+            self._misses += len(missing)
+            return results
+
+        try:
+            payloads = client.mget([self._redis_key(keys[i]) for i in missing])
+        except redis_lib.exceptions.RedisError as exc:
+            self._redis_errors += 1
+            logger.warning("Classifier cache Redis read failed: %s", exc)
+            self._misses += len(missing)
+            return results
+
+        for i, payload in zip(missing, payloads):
+            if payload is None:
+                self._misses += 1
+                continue
+            results[i] = json.loads(payload)
+            self._local.put(keys[i], results[i])
+            self._redis_hits += 1
+        return results
+
+    def put_many(self, prompts: list[str], results: list[dict]) -> None:
+        keys = [prompt_key(prompt) for prompt in prompts]
+        for key, result in zip(keys, results):
+            self._local.put(key, result)
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, result in zip(keys, results):
+                pipe.set(self._redis_key(key), json.dumps(result), ex=self._redis_ttl_seconds)
+            pipe.execute()
+        except redis_lib.exceptions.RedisError as exc:
+            self._redis_errors += 1
+            logger.warning("Classifier cache Redis write failed: %s", exc)
+
+    def clear(self) -> None:
+        self._local.clear()
+
+    def stats(self) -> ClassifierCacheStats:
+        return ClassifierCacheStats(
+            size=self._local.stats().size,
+            hits=self._hits,
+            redis_hits=self._redis_hits,
+            misses=self._misses,
+            redis_errors=self._redis_errors,
+        )
@@ -0,0 +1,142 @@
+"""ONNX Runtime backend for the complexity classifier.
+
+The DeBERTa backbone, mean pooling and the eight linear heads are exported as
+one graph that returns raw head logits; the label maps and weighted scoring
+stay in Python (``ClassifierLabelMaps``), so both backends share one scoring
+path. Optional dynamic int8 quantization of the exported graph trades a small
+score drift for a much cheaper CPU forward pass.
+
+Only imported when ``DEJAQ_CLASSIFIER_BACKEND=onnx``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.export import Dim
+
+logger = logging.getLogger("dejaq.services.classifier_onnx")
+
+HEAD_NAMES = [
+    "task_type",
+    "creativity_scope",
+    "reasoning",
+    "contextual_knowledge",
+    "number_of_few_shots",
+    "domain_knowledge",
+    "no_label_reason",
+    "constraint_ct",
+]
+ONNX_OPSET = 18
+
+
+class _HeadLogits(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return tuple(self.model.head_logits(input_ids, attention_mask))
+
+
+def quantized_path(model_path: str) -> str:
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.int8{ext or '.onnx'}"
+
+
+def export_classifier(model_path: str, quantize: bool = False) -> str:
+    """Export the torch classifier to ``model_path``; returns the path to load."""
+    from app.services.classifier import ClassifierService
+
+    service = ClassifierService(backend="torch")
+    model = ClassifierService._model.to("cpu")
+    encoded = ClassifierService._tokenizer(
+        ["Prompt: export sample", "Prompt: a second, longer export sample"],
+        return_tensors="pt",
+        padding=True,
+    )
+
+    parent = os.path.dirname(model_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    batch = Dim("batch")
+    sequence = Dim("sequence", max=512)
+    logger.info("Exporting complexity classifier to ONNX: %s", model_path)
+    with torch.no_grad():
+        torch.onnx.export(
+            _HeadLogits(model),
+            (encoded["input_ids"], encoded["attention_mask"]),
+            model_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=HEAD_NAMES,
+            dynamic_shapes=({0: batch, 1: sequence}, {0: batch, 1: sequence}),
+            opset_version=ONNX_OPSET,
+            # The TorchScript exporter mistraces DeBERTa's relative-position
+            # attention; the torch.export path (needs onnxscript) is exact.
+            dynamo=True,
+            external_data=False,
+        )
+    model.to(service._device)
+
+    if not quantize:
+        return model_path
+
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = quantized_path(model_path)
+    logger.info("Quantizing complexity classifier to int8: %s", int8_path)
+    graph = onnx.load(model_path)
+    # Exporter value_info can disagree with the quantizer's own shape
+    # inference; drop it and let onnx re-infer.
+    del graph.graph.value_info[:]
+    quantize_dynamic(graph, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxClassifierRuntime:
+    def __init__(self, session, tokenizer, label_maps) -> None:
+        self._session = session
+        self._tokenizer = tokenizer
+        self._label_maps = label_maps
+
+    @classmethod
+    def load(cls, model_path: str, quantize: bool = False) -> "OnnxClassifierRuntime":
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        from app.services.classifier import MODEL_ID, ClassifierLabelMaps
+
+        path = quantized_path(model_path) if quantize else model_path
+        if not os.path.exists(path):
+            path = export_classifier(model_path, quantize=quantize)
+
+        logger.info("Loading ONNX complexity classifier: %s", path)
+        session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return cls(
+            session=session,
+            tokenizer=AutoTokenizer.from_pretrained(MODEL_ID),
+            label_maps=ClassifierLabelMaps.from_hub(),
+        )
+
+    def run(self, prompts: list[str]) -> dict:
+        encoded = self._tokenizer(
+            prompts,
+            return_tensors="np",
+            add_special_tokens=True,
+            max_length=512,
+            padding=True,
+            truncation=True,
+        )
+        outputs = self._session.run(
+            None,
+            {
+                "input_ids": encoded["input_ids"].astype(np.int64),
+                "attention_mask": encoded["attention_mask"].astype(np.int64),
+            },
+        )
+        return self._label_maps.process_logits([torch.from_numpy(logits) for logits in outputs])
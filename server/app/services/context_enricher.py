@@ -1,10 +1,28 @@
 import logging
 import time
 
-from app.services.model_backends import CompletionRequest, ModelBackend
+from app.services.model_backends import CompletionRequest, ModelBackend, PromptMessage
 
 logger = logging.getLogger("dejaq.services.context_enricher")
 
+# System prompt and few-shot turns; identical on every call, so local backends
+# keep their evaluated state and only process the final turn.
+_PROMPT_PREFIX: list[PromptMessage] = [
+    {"role": "system", "content": "You are a query rewriter. Given a conversation history and a follow-up message, rewrite the follow-up into a standalone question that includes all necessary context. Output ONLY the rewritten question. If the message is already standalone, return it unchanged."},
+    # Example 1: pronoun resolution
+    {"role": "user", "content": "HISTORY:\nUser: What is Python?\nAssistant: Python is a high-level programming language.\n\nFOLLOW-UP: Tell me more about its features"},
+    {"role": "assistant", "content": "What are the main features of the Python programming language?"},
+    # Example 2: topic continuation
+    {"role": "user", "content": "HISTORY:\nUser: How does photosynthesis work?\nAssistant: Photosynthesis converts light energy into chemical energy in plants.\n\nFOLLOW-UP: What about the dark reactions?"},
+    {"role": "assistant", "content": "What are the dark reactions in photosynthesis?"},
+    # Example 3: resolve reference from assistant's answer
+    {"role": "user", "content": "HISTORY:\nUser: What is the capital of Italy?\nAssistant: The capital of Italy is Rome.\n\nFOLLOW-UP: I am traveling there recommend me restaurants"},
+    {"role": "assistant", "content": "What restaurants should I visit in Rome?"},
+    # Example 4: already standalone
+    {"role": "user", "content": "HISTORY:\nUser: What is gravity?\nAssistant: Gravity is a fundamental force of attraction.\n\nFOLLOW-UP: What is the capital of France?"},
+    {"role": "assistant", "content": "What is the capital of France?"},
+]
+
 
 class ContextEnricherService:
     """Rewrites context-dependent queries into standalone questions using conversation history."""
@@ -40,24 +58,14 @@ class ContextEnricherService:
             CompletionRequest(
                 model_name=self.model_name,
                 messages=[
-                {"role": "system", "content": "You are a query rewriter. Given a conversation history and a follow-up message, rewrite the follow-up into a standalone question that includes all necessary context. Output ONLY the rewritten question. If the message is already standalone, return it unchanged."},
-                # Example 1: pronoun resolution
-                {"role": "user", "content": "HISTORY:\nUser: What is Python?\nAssistant: Python is a high-level programming language.\n\nFOLLOW-UP: Tell me more about its features"},
-                {"role": "assistant", "content": "What are the main features of the Python programming language?"},
-                # Example 2: topic continuation
-                {"role": "user", "content": "HISTORY:\nUser: How does photosynthesis work?\nAssistant: Photosynthesis converts light energy into chemical energy in plants.\n\nFOLLOW-UP: What about the dark reactions?"},
-                {"role": "assistant", "content": "What are the dark reactions in photosynthesis?"},
-                # Example 3: resolve reference from assistant's answer
-                {"role": "user", "content": "HISTORY:\nUser: What is the capital of Italy?\nAssistant: The capital of Italy is Rome.\n\nFOLLOW-UP: I am traveling there recommend me restaurants"},
-                {"role": "assistant", "content": "What restaurants should I visit in Rome?"},
-                # Example 4: already standalone
-                {"role": "user", "content": "HISTORY:\nUser: What is gravity?\nAssistant: Gravity is a fundamental force of attraction.\n\nFOLLOW-UP: What is the capital of France?"},
-                {"role": "assistant", "content": "What is the capital of France?"},
+                *_PROMPT_PREFIX,
                 # Actual query
                 {"role": "user", "content": f"HISTORY:\n{context_block}\n\nFOLLOW-UP: {message}"},
                 ],
                 max_tokens=256,
                 temperature=0.0,
+                prefix_messages=len(_PROMPT_PREFIX),
+                role="enrich",
             )
         )
 
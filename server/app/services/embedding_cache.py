@@ -0,0 +1,150 @@
+"""Bounded memo of query embeddings keyed by normalized query text.
+
+Vectors live in one fixed-size float32 record array, optionally backed by a
+memory-mapped file so the API process and Celery workers share the same store
+and warm restarts skip re-embedding hot queries. The file starts with a header
+naming its slot count, dimension and embedding model; a file written for
+another layout or model is replaced by a fresh one (never truncated in place,
+since other processes may still have it mapped).
+
+The table is direct-mapped: a text's 64-bit sha256 key picks its slot, and
+a newer text landing on an occupied slot replaces it. That keeps lookups and
+writes lock-free across processes: each slot stores a CRC32 of its key and
+vector, and a reader only trusts a slot whose key matches and whose vector
+checks out, so a slot torn by two processes writing it at once reads as a miss.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+logger = logging.getLogger("dejaq.services.embedding_cache")
+
+_EMPTY_KEY = 0
+_MAGIC = b"DEJAQEM1"
+_HEADER = np.dtype([("magic", "S8"), ("slots", "<u8"), ("dim", "<u8"), ("model", "S64")])
+
+
+@dataclass(frozen=True)
+class EmbeddingCacheStats:
+    slots: int
+    hits: int
+    misses: int
+    writes: int
+    persistent: bool
+
+
+def _key(text: str) -> int:
+    # 64 bits of sha256; 0 is reserved to mark an empty slot.
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little") or 1
+
+
+def _checksum(key: int, vector: np.ndarray) -> int:
+    return zlib.crc32(vector.tobytes(), zlib.crc32(key.to_bytes(8, "little")))
+
+
+class EmbeddingCache:
+    def __init__(self, slots: int, dim: int, path: str | None = None, model: str = "") -> None:
+        if slots <= 0:
+            raise ValueError("EmbeddingCache needs at least one slot")
+        self._slots = slots
+        self._dim = dim
+        self._model = model
+        self._dtype = np.dtype([("key", "<u8"), ("crc", "<u4"), ("vec", "<f4", (dim,))])
+        self._path = path or None
+        self._table = self._open_table()
+        self._write_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+
+    def _open_table(self) -> np.ndarray:
+        if self._path is None:
+            return np.zeros(self._slots, dtype=self._dtype)
+
+        header = np.array([(_MAGIC, self._slots, self._dim, self._model.encode())], dtype=_HEADER).tobytes()
+        size = len(header) + self._slots * self._dtype.itemsize
+        try:
+            with open(self._path, "rb") as f:
+                reusable = f.read(len(header)) == header and os.path.getsize(self._path) == size
+            if not reusable:
+                logger.warning(
+                    "Embedding cache file %s was written for another layout or model; replacing it "
+                    "(slots=%d dim=%d model=%s)",
+                    self._path,
+                    self._slots,
+                    self._dim,
+                    self._model,
+                )
+        except FileNotFoundError:
+            reusable = False
+        if not reusable:
+            self._replace_file(header, size)
+        logger.info("Embedding cache mmap path=%s slots=%d model=%s", self._path, self._slots, self._model)
+        return np.memmap(self._path, dtype=self._dtype, mode="r+", offset=len(header), shape=(self._slots,))
+
+    def _replace_file(self, header: bytes, size: int) -> None:
+        parent = os.path.dirname(self._path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Build the new file aside and swap it in: processes that still map the
+        # old one keep a valid (now unshared) mapping instead of a SIGBUS.
+        staging = f"{self._path}.{os.getpid()}.tmp"
+        with open(staging, "wb") as f:
+            f.write(header)
+            f.truncate(size)
+        os.replace(staging, self._path)
+
+    def _slot(self, key: int) -> int:
+        return key % self._slots
+
+    def get(self, text: str) -> np.ndarray | None:
+        key = _key(text)
+        slot = self._slot(key)
+        if self._table["key"][slot] != key:
+            self._misses += 1
+            return None
+        crc = int(self._table["crc"][slot])
+        vector = np.array(self._table["vec"][slot], dtype=np.float32)
+        # Writers in other processes may have replaced or torn the slot while
+        # we copied; only trust a vector that still matches key and checksum.
+        if self._table["key"][slot] != key or _checksum(key, vector) != crc:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return vector
+
+    def put(self, text: str, vector: Sequence[float]) -> None:
+        values = np.asarray(vector, dtype=np.float32)
+        if values.shape != (self._dim,):
+            raise ValueError(f"Expected embedding of shape ({self._dim},), got {values.shape}")
+        key = _key(text)
+        slot = self._slot(key)
+        crc = _checksum(key, values)
+        with self._write_lock:
+            self._table["key"][slot] = _EMPTY_KEY
+            self._table["vec"][slot] = values
+            self._table["crc"][slot] = crc
+            self._table["key"][slot] = key
+            self._writes += 1
+
+    def flush(self) -> None:
+        if isinstance(self._table, np.memmap):
+            self._table.flush()
+
+    def stats(self) -> EmbeddingCacheStats:
+        return EmbeddingCacheStats(
+            slots=self._slots,
+            hits=self._hits,
+            misses=self._misses,
+            writes=self._writes,
+            persistent=self._path is not None,
+        )
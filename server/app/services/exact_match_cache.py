@@ -0,0 +1,200 @@
+"""In-process exact-match (L1) layer in front of the semantic cache.
+
+Keys are the same 16-char sha256 prefix of the normalized query that Chroma uses
+as a document id, so byte-identical normalized queries skip embedding and the
+Chroma round trip entirely. Only hits are remembered: a miss can turn into a hit
+as soon as any nearby entry is stored, which this layer cannot see.
+
+Entries expire after ``ttl_seconds`` so writes made by other processes (Celery
+workers, eviction beat) become visible within a bounded time. With the optional
+Redis tier, clear() also bumps a shared per-namespace generation counter that
+every process reads at most once per ``check_interval_ms`` when serving a hit,
+so evictions and score changes made elsewhere drop remembered answers within
+that interval. Redis errors back off and degrade to the TTL bound.
+
+A lookup takes epoch() before it queries the store and hands it to put(), so
+an answer computed before an invalidation is not remembered after it.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, Hashable, TypeVar
+
+import redis as redis_lib
+
+logger = logging.getLogger("dejaq.services.exact_match_cache")
+
+_REDIS_TIMEOUT_S = 0.05
+_REDIS_RETRY_S = 5.0
+
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class ExactMatchCacheStats:
+    size: int
+    hits: int
+    misses: int
+    expirations: int
+    invalidations: int
+    redis_errors: int
+
+
+class ExactMatchCache(Generic[V]):
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 60.0,
+        namespace: str = "",
+        redis_url: str | None = None,
+        check_interval_ms: float = 100.0,
+        redis_client: redis_lib.Redis | None = None,
+    ) -> None:
+        self._max_entries = max(0, max_entries)
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation_key = f"exactcache:{namespace}:generation"
+        self._redis_url = redis_url
+        self._redis: redis_lib.Redis | None = redis_client
+        self._check_interval_s = max(0.0, check_interval_ms / 1000)
+        self._next_check = 0.0
+        # Shared generation every remembered entry was stored under.
+        self._generation: str | None = None
+        # Bumped by every local invalidation; see epoch().
+        self._epoch = 0
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._redis_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def _get_redis(self) -> redis_lib.Redis | None:
+        if self._redis is None and self._redis_url is not None:
+            self._redis = redis_lib.Redis.from_url(
+                self._redis_url,
+                decode_responses=True,
+                socket_timeout=_REDIS_TIMEOUT_S,
+                socket_connect_timeout=_REDIS_TIMEOUT_S,
+            )
+        return self._redis
+
+    def _sync_generation(self) -> None:
+        """Drop every entry if another process cleared this namespace since they were stored."""
+        client = self._get_redis()
+        now = time.monotonic()
+        if client is None or now < self._next_check:
+            return
+        try:
+            generation = client.get(self._generation_key)
+        except redis_lib.exceptions.RedisError as exc:
+            self._next_check = now + _REDIS_RETRY_S
+            self._redis_errors += 1
+            logger.warning("Exact-match cache Redis read failed: %s", exc)
+            return
+        self._next_check = now + self._check_interval_s
+        with self._lock:
+            if generation != self._generation:
+                self._drop_all()
+                self._generation = generation
+
+    def _drop_all(self) -> None:
+        self._invalidations += len(self._entries)
+        self._entries.clear()
+        self._epoch += 1
+
+    def epoch(self) -> int:
+        """Token for put(): take it before computing the value to remember."""
+        self._sync_generation()
+        with self._lock:
+            return self._epoch
+
+    def get(self, key: Hashable) -> V | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            remembered = key in self._entries
+        if remembered:
+            self._sync_generation()
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V, epoch: int | None = None) -> None:
+        """Remember value, unless an invalidation happened since epoch was taken."""
+        if not self.enabled:
+            return
+        self._sync_generation()
+        expires_at = time.monotonic() + self._ttl_seconds
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def invalidate_where(self, predicate) -> int:
+        """Drop every entry whose value matches predicate. Returns the number dropped."""
+        with self._lock:
+            self._epoch += 1
+            stale = [key for key, (_, value) in self._entries.items() if predicate(value)]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        """Drop every entry here and, with the Redis tier, in every other process."""
+        with self._lock:
+            self._drop_all()
+        self.publish_invalidation()
+
+    def publish_invalidation(self) -> None:
+        """Make other processes drop their entries for this namespace on their next hit."""
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            client.incr(self._generation_key)
+        except redis_lib.exceptions.RedisError as exc:
+            self._redis_errors += 1
+            logger.warning("Exact-match cache Redis invalidation failed: %s", exc)
+
+    def stats(self) -> ExactMatchCacheStats:
+        with self._lock:
+            return ExactMatchCacheStats(
+                size=len(self._entries),
+                hits=self._hits,
+                misses=self._misses,
+                expirations=self._expirations,
+                invalidations=self._invalidations,
+                redis_errors=self._redis_errors,
+            )
@@ -1,4 +1,5 @@
 import logging
+from typing import AsyncIterator
 
 from app.schemas.chat import ExternalLLMRequest, ExternalLLMResponse
 from app.services.llm_providers import LLMProviderClient, redact_api_key
@@ -17,16 +18,20 @@ _PROVIDER_CLIENTS: dict[str, LLMProviderClient] = {
 
 
 class ExternalLLMService:
+    def _client(self, provider: str) -> LLMProviderClient:
+        client = _PROVIDER_CLIENTS.get(provider)
+        if client is None:
+            logger.error("External LLM provider is not wired: %s", provider)
+            raise ExternalLLMError(f"Provider '{provider}' is not wired to a live client.")
+        return client
+
     async def generate_response(
         self,
         request: ExternalLLMRequest,
         provider: str,
         api_key: str,
     ) -> ExternalLLMResponse:
-        client = _PROVIDER_CLIENTS.get(provider)
-        if client is None:
-            logger.error("External LLM provider is not wired: %s", provider)
-            raise ExternalLLMError(f"Provider '{provider}' is not wired to a live client.")
+        client = self._client(provider)
 
         logger.debug("Dispatching external LLM request provider=%s model=%s", provider, request.model)
         try:
@@ -38,3 +43,23 @@ class ExternalLLMService:
                 redact_api_key(exc, api_key),
             )
             raise
+
+    async def stream_response(
+        self,
+        request: ExternalLLMRequest,
+        provider: str,
+        api_key: str,
+    ) -> AsyncIterator[str]:
+        client = self._client(provider)
+
+        logger.debug("Dispatching external LLM stream provider=%s model=%s", provider, request.model)
+        try:
+            async for piece in client.stream_response(request, api_key):
+                yield piece
+        except Exception as exc:
+            logger.debug(
+                "External LLM provider stream failed provider=%s error=%s",
+                provider,
+                redact_api_key(exc, api_key),
+            )
+            raise
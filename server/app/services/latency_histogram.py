@@ -0,0 +1,54 @@
+"""Log-linear latency histogram bins (HDR-histogram style).
+
+Latencies below 64 ms get a bin each; above that every power of two is split
+into 32 equal bins, so a bin's midpoint is within ~1.6% of any latency in it.
+Bins are plain integers, so histograms are just {bin: count} maps: they merge
+by adding counts, which lets the stats rollups sum them per bucket in SQL.
+"""
+
+from __future__ import annotations
+
+import math
+
+_SUB_BITS = 5
+_SUB_BINS = 1 << _SUB_BITS
+_LINEAR_LIMIT = _SUB_BINS * 2
+
+PERCENTILES: tuple[tuple[str, float], ...] = (("p50_ms", 0.50), ("p90_ms", 0.90), ("p95_ms", 0.95), ("p99_ms", 0.99))
+
+
+def bin_for(latency_ms: int | float | None) -> int:
+    """Histogram bin of a latency in milliseconds."""
+    value = max(0, int(latency_ms or 0))
+    if value < _LINEAR_LIMIT:
+        return value
+    exponent = value.bit_length() - 1
+    sub = (value >> (exponent - _SUB_BITS)) - _SUB_BINS
+    return _LINEAR_LIMIT + (exponent - _SUB_BITS - 1) * _SUB_BINS + sub
+
+
+def bin_value(bin_index: int) -> float:
+    """Midpoint latency of a bin (the exact latency below 64 ms)."""
+    if bin_index < _LINEAR_LIMIT:
+        return float(bin_index)
+    exponent, sub = divmod(bin_index - _LINEAR_LIMIT, _SUB_BINS)
+    width = 1 << (exponent + 1)
+    lower = (_SUB_BINS + sub) * width
+    return lower + (width - 1) / 2
+
+
+def percentiles(counts: dict[int, int]) -> dict[str, float] | None:
+    """Nearest-rank PERCENTILES of a {bin: count} histogram; None when it is empty."""
+    total = sum(counts.values())
+    if total <= 0:
+        return None
+    ranks = [(name, max(1, math.ceil(q * total))) for name, q in PERCENTILES]
+    result: dict[str, float] = {}
+    seen = 0
+    for bin_index in sorted(counts):
+        seen += counts[bin_index]
+        while ranks and ranks[0][1] <= seen:
+            result[ranks.pop(0)[0]] = bin_value(bin_index)
+        if not ranks:
+            break
+    return result
@@ -1,4 +1,4 @@
-from typing import Protocol
+from typing import AsyncIterator, Protocol
 
 from app.schemas.chat import ExternalLLMRequest, ExternalLLMResponse
 from app.services.llm_providers.common import redact_api_key
@@ -13,3 +13,10 @@ class LLMProviderClient(Protocol):
         api_key: str,
     ) -> ExternalLLMResponse:
         ...
+
+    def stream_response(
+        self,
+        request: ExternalLLMRequest,
+        api_key: str,
+    ) -> AsyncIterator[str]:
+        ...
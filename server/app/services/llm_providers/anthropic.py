@@ -1,10 +1,13 @@
 import logging
 import time
+from contextlib import contextmanager
 from functools import lru_cache
+from typing import AsyncIterator, Iterator
 
 import anthropic
 
 from app.schemas.chat import ExternalLLMRequest, ExternalLLMResponse
+from app.services import token_usage
 from app.services.llm_providers.common import elapsed_ms, ensure_query, redact_api_key
 from app.utils.exceptions import ExternalLLMAuthError, ExternalLLMError, ExternalLLMTimeoutError
 
@@ -26,37 +29,47 @@ def _clear_client_cache_if_factory_changed() -> None:
         _client_factory = anthropic.AsyncAnthropic
 
 
+@contextmanager
+def _provider_errors(api_key: str) -> Iterator[None]:
+    try:
+        yield
+    except anthropic.AuthenticationError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("Anthropic authentication failed: %s", msg)
+        raise ExternalLLMAuthError(f"Authentication failed: {msg}") from exc
+    except anthropic.APITimeoutError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("Anthropic timeout: %s", msg)
+        raise ExternalLLMTimeoutError(f"Provider timeout: {msg}") from exc
+    except anthropic.APIError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("Anthropic API error: %s", msg)
+        raise ExternalLLMError(f"Provider error: {msg}") from exc
+
+
+def _messages(request: ExternalLLMRequest) -> list[dict]:
+    messages = [msg for msg in request.history if msg["role"] in {"user", "assistant"}]
+    messages.append({"role": "user", "content": request.query})
+    return messages
+
+
 class AnthropicProviderClient:
     async def generate_response(self, request: ExternalLLMRequest, api_key: str) -> ExternalLLMResponse:
         ensure_query(request)
 
         _clear_client_cache_if_factory_changed()
         client = _get_client(api_key)
-        messages = [msg for msg in request.history if msg["role"] in {"user", "assistant"}]
-        messages.append({"role": "user", "content": request.query})
 
         logger.debug("Sending hard query to Anthropic model=%s history_turns=%d", request.model, len(request.history))
         start = time.perf_counter()
-        try:
+        with _provider_errors(api_key):
             response = await client.messages.create(
                 model=request.model,
                 system=request.system_prompt,
-                messages=messages,
+                messages=_messages(request),
                 max_tokens=request.max_tokens,
                 temperature=request.temperature,
             )
-        except anthropic.AuthenticationError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("Anthropic authentication failed: %s", msg)
-            raise ExternalLLMAuthError(f"Authentication failed: {msg}") from exc
-        except anthropic.APITimeoutError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("Anthropic timeout: %s", msg)
-            raise ExternalLLMTimeoutError(f"Provider timeout: {msg}") from exc
-        except anthropic.APIError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("Anthropic API error: %s", msg)
-            raise ExternalLLMError(f"Provider error: {msg}") from exc
 
         latency_ms = elapsed_ms(start)
         text = response.content[0].text if response.content else ""
@@ -67,6 +80,7 @@ class AnthropicProviderClient:
             response.usage.input_tokens,
             response.usage.output_tokens,
         )
+        token_usage.record("generate", response.usage.input_tokens, response.usage.output_tokens)
         return ExternalLLMResponse(
             text=text,
             model_used=request.model,
@@ -74,3 +88,26 @@ class AnthropicProviderClient:
             completion_tokens=response.usage.output_tokens,
             latency_ms=latency_ms,
         )
+
+    async def stream_response(self, request: ExternalLLMRequest, api_key: str) -> AsyncIterator[str]:
+        ensure_query(request)
+
+        _clear_client_cache_if_factory_changed()
+        client = _get_client(api_key)
+
+        logger.debug("Streaming hard query from Anthropic model=%s history_turns=%d", request.model, len(request.history))
+        start = time.perf_counter()
+        with _provider_errors(api_key):
+            async with client.messages.stream(
+                model=request.model,
+                system=request.system_prompt,
+                messages=_messages(request),
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+            ) as stream:
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
+                message = await stream.get_final_message()
+        token_usage.record("generate", message.usage.input_tokens, message.usage.output_tokens)
+        logger.debug("Anthropic stream finished (model=%s, latency=%.2f ms)", request.model, elapsed_ms(start))
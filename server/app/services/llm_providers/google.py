@@ -1,6 +1,8 @@
 import logging
 import time
+from contextlib import contextmanager
 from functools import lru_cache
+from typing import AsyncIterator, Iterator
 
 import httpx
 from google import genai
@@ -8,6 +10,7 @@ from google.genai import errors as genai_errors
 from google.genai import types
 
 from app.schemas.chat import ExternalLLMRequest, ExternalLLMResponse
+from app.services import token_usage
 from app.services.llm_providers.common import elapsed_ms, ensure_query, redact_api_key
 from app.utils.exceptions import ExternalLLMAuthError, ExternalLLMError, ExternalLLMTimeoutError
 
@@ -29,47 +32,59 @@ def _clear_client_cache_if_factory_changed() -> None:
         _client_factory = genai.Client
 
 
+@contextmanager
+def _provider_errors(api_key: str) -> Iterator[None]:
+    try:
+        yield
+    except genai_errors.ClientError as exc:
+        msg = redact_api_key(exc, api_key)
+        if exc.code == 401:
+            logger.error("Google authentication failed: %s", msg)
+            raise ExternalLLMAuthError(f"Authentication failed: {msg}") from exc
+        logger.error("Google client error (code=%d): %s", exc.code, msg)
+        raise ExternalLLMError(f"Provider error: {msg}") from exc
+    except (TimeoutError, httpx.TimeoutException) as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("Google timeout: %s", msg)
+        raise ExternalLLMTimeoutError(f"Provider timeout: {msg}") from exc
+    except genai_errors.APIError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("Google API error: %s", msg)
+        raise ExternalLLMError(f"Provider error: {msg}") from exc
+
+
+def _contents(request: ExternalLLMRequest) -> list[types.Content]:
+    contents: list[types.Content] = []
+    for msg in request.history:
+        role = "model" if msg["role"] == "assistant" else msg["role"]
+        contents.append(types.Content(role=role, parts=[types.Part(text=msg["content"])]))
+    contents.append(types.Content(role="user", parts=[types.Part(text=request.query)]))
+    return contents
+
+
+def _generation_config(request: ExternalLLMRequest) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        system_instruction=request.system_prompt,
+        max_output_tokens=request.max_tokens,
+        temperature=request.temperature,
+    )
+
+
 class GoogleProviderClient:
     async def generate_response(self, request: ExternalLLMRequest, api_key: str) -> ExternalLLMResponse:
         ensure_query(request)
 
         _clear_client_cache_if_factory_changed()
         client = _get_client(api_key)
-        contents: list[types.Content] = []
-        for msg in request.history:
-            role = "model" if msg["role"] == "assistant" else msg["role"]
-            contents.append(types.Content(role=role, parts=[types.Part(text=msg["content"])]))
-        contents.append(types.Content(role="user", parts=[types.Part(text=request.query)]))
-
-        config = types.GenerateContentConfig(
-            system_instruction=request.system_prompt,
-            max_output_tokens=request.max_tokens,
-            temperature=request.temperature,
-        )
 
         logger.debug("Sending hard query to Google model=%s history_turns=%d", request.model, len(request.history))
         start = time.perf_counter()
-        try:
+        with _provider_errors(api_key):
             response = await client.aio.models.generate_content(
                 model=request.model,
-                contents=contents,
-                config=config,
+                contents=_contents(request),
+                config=_generation_config(request),
             )
-        except genai_errors.ClientError as exc:
-            msg = redact_api_key(exc, api_key)
-            if exc.code == 401:
-                logger.error("Google authentication failed: %s", msg)
-                raise ExternalLLMAuthError(f"Authentication failed: {msg}") from exc
-            logger.error("Google client error (code=%d): %s", exc.code, msg)
-            raise ExternalLLMError(f"Provider error: {msg}") from exc
-        except (TimeoutError, httpx.TimeoutException) as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("Google timeout: %s", msg)
-            raise ExternalLLMTimeoutError(f"Provider timeout: {msg}") from exc
-        except genai_errors.APIError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("Google API error: %s", msg)
-            raise ExternalLLMError(f"Provider error: {msg}") from exc
 
         latency_ms = elapsed_ms(start)
         usage = response.usage_metadata
@@ -80,6 +95,8 @@ class GoogleProviderClient:
             usage.prompt_token_count if usage else 0,
             usage.candidates_token_count if usage else 0,
         )
+        if usage:
+            token_usage.record("generate", usage.prompt_token_count, usage.candidates_token_count)
         return ExternalLLMResponse(
             text=response.text or "",
             model_used=request.model,
@@ -87,3 +104,27 @@ class GoogleProviderClient:
             completion_tokens=usage.candidates_token_count if usage else 0,
             latency_ms=latency_ms,
         )
+
+    async def stream_response(self, request: ExternalLLMRequest, api_key: str) -> AsyncIterator[str]:
+        ensure_query(request)
+
+        _clear_client_cache_if_factory_changed()
+        client = _get_client(api_key)
+
+        logger.debug("Streaming hard query from Google model=%s history_turns=%d", request.model, len(request.history))
+        start = time.perf_counter()
+        with _provider_errors(api_key):
+            stream = await client.aio.models.generate_content_stream(
+                model=request.model,
+                contents=_contents(request),
+                config=_generation_config(request),
+            )
+            # Each chunk's usage_metadata holds the running totals; the last one is final.
+            usage = None
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+                usage = chunk.usage_metadata or usage
+        if usage:
+            token_usage.record("generate", usage.prompt_token_count, usage.candidates_token_count)
+        logger.debug("Google stream finished (model=%s, latency=%.2f ms)", request.model, elapsed_ms(start))
@@ -1,10 +1,13 @@
 import logging
 import time
+from contextlib import contextmanager
 from functools import lru_cache
+from typing import AsyncIterator, Iterator
 
 import openai
 
 from app.schemas.chat import ExternalLLMRequest, ExternalLLMResponse
+from app.services import token_usage
 from app.services.llm_providers.common import elapsed_ms, ensure_query, redact_api_key
 from app.utils.exceptions import ExternalLLMAuthError, ExternalLLMError, ExternalLLMTimeoutError
 
@@ -26,37 +29,47 @@ def _clear_client_cache_if_factory_changed() -> None:
         _client_factory = openai.AsyncOpenAI
 
 
+@contextmanager
+def _provider_errors(api_key: str) -> Iterator[None]:
+    try:
+        yield
+    except openai.AuthenticationError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("OpenAI authentication failed: %s", msg)
+        raise ExternalLLMAuthError(f"Authentication failed: {msg}") from exc
+    except openai.APITimeoutError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("OpenAI timeout: %s", msg)
+        raise ExternalLLMTimeoutError(f"Provider timeout: {msg}") from exc
+    except openai.OpenAIError as exc:
+        msg = redact_api_key(exc, api_key)
+        logger.error("OpenAI API error: %s", msg)
+        raise ExternalLLMError(f"Provider error: {msg}") from exc
+
+
+def _messages(request: ExternalLLMRequest) -> list[dict]:
+    messages = [{"role": "system", "content": request.system_prompt}]
+    messages.extend(request.history)
+    messages.append({"role": "user", "content": request.query})
+    return messages
+
+
 class OpenAIProviderClient:
     async def generate_response(self, request: ExternalLLMRequest, api_key: str) -> ExternalLLMResponse:
         ensure_query(request)
 
         _clear_client_cache_if_factory_changed()
         client = _get_client(api_key)
-        messages = [{"role": "system", "content": request.system_prompt}]
-        messages.extend(request.history)
-        messages.append({"role": "user", "content": request.query})
 
         logger.debug("Sending hard query to OpenAI model=%s history_turns=%d", request.model, len(request.history))
         start = time.perf_counter()
-        try:
+        with _provider_errors(api_key):
             response = await client.chat.completions.create(
                 model=request.model,
-                messages=messages,
+                messages=_messages(request),
                 max_tokens=request.max_tokens,
                 temperature=request.temperature,
             )
-        except openai.AuthenticationError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("OpenAI authentication failed: %s", msg)
-            raise ExternalLLMAuthError(f"Authentication failed: {msg}") from exc
-        except openai.APITimeoutError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("OpenAI timeout: %s", msg)
-            raise ExternalLLMTimeoutError(f"Provider timeout: {msg}") from exc
-        except openai.OpenAIError as exc:
-            msg = redact_api_key(exc, api_key)
-            logger.error("OpenAI API error: %s", msg)
-            raise ExternalLLMError(f"Provider error: {msg}") from exc
 
         latency_ms = elapsed_ms(start)
         usage = response.usage
@@ -68,6 +81,8 @@ class OpenAIProviderClient:
             usage.prompt_tokens if usage else 0,
             usage.completion_tokens if usage else 0,
         )
+        if usage:
+            token_usage.record("generate", usage.prompt_tokens, usage.completion_tokens)
         return ExternalLLMResponse(
             text=content,
             model_used=request.model,
@@ -75,3 +90,30 @@ class OpenAIProviderClient:
             completion_tokens=usage.completion_tokens if usage else 0,
             latency_ms=latency_ms,
         )
+
+    async def stream_response(self, request: ExternalLLMRequest, api_key: str) -> AsyncIterator[str]:
+        ensure_query(request)
+
+        _clear_client_cache_if_factory_changed()
+        client = _get_client(api_key)
+
+        logger.debug("Streaming hard query from OpenAI model=%s history_turns=%d", request.model, len(request.history))
+        start = time.perf_counter()
+        with _provider_errors(api_key):
+            stream = await client.chat.completions.create(
+                model=request.model,
+                messages=_messages(request),
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                stream=True,
+                # The last chunk (with no choices) then reports the request's usage.
+                stream_options={"include_usage": True},
+            )
+            # Closing the stream releases the HTTP response when the consumer stops early.
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if chunk.usage:
+                        token_usage.record("generate", chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+        logger.debug("OpenAI stream finished (model=%s, latency=%.2f ms)", request.model, elapsed_ms(start))
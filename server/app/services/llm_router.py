@@ -1,10 +1,13 @@
 import time
 import logging
+from typing import AsyncIterator
+
 from app.services.model_backends import CompletionRequest, ModelBackend
 
 logger = logging.getLogger("dejaq.services.llm_router")
 
 _LOCAL_MODEL_NAME = "gemma-4-e4b"
+_DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant. Answer the user's query concisely and accurately."
 
 
 class LLMRouterService:
@@ -15,6 +18,27 @@ class LLMRouterService:
     def is_hard(self, complexity: str) -> bool:
         return complexity == "hard"
 
+    def _local_request(
+        self,
+        query: str,
+        history: list[dict] | None,
+        max_tokens: int,
+        system_prompt: str | None,
+    ) -> CompletionRequest:
+        if system_prompt is None:
+            system_prompt = _DEFAULT_SYSTEM_PROMPT
+        messages = [{"role": "system", "content": system_prompt}]
+        if history:
+            messages.extend(history)
+        messages.append({"role": "user", "content": query})
+        return CompletionRequest(
+            model_name=self.model_name,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.7,
+            role="generate",
+        )
+
     async def generate_local_response(
         self,
         query: str,
@@ -23,25 +47,25 @@ class LLMRouterService:
         system_prompt: str | None = None,
     ) -> tuple[str, float]:
         """Generate a response using the local model. Returns (text, latency_ms)."""
-        if system_prompt is None:
-            system_prompt = "You are a helpful assistant. Answer the user's query concisely and accurately."
-        messages = [{"role": "system", "content": system_prompt}]
-        if history:
-            messages.extend(history)
-        messages.append({"role": "user", "content": query})
         start = time.time()
-        response = await self.backend.complete(
-            CompletionRequest(
-                model_name=self.model_name,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.7,
-            )
-        )
+        response = await self.backend.complete(self._local_request(query, history, max_tokens, system_prompt))
         latency_ms = (time.time() - start) * 1000
         logger.debug("Local LLM response generated in %.2f ms", latency_ms)
         return response, latency_ms
 
+    async def stream_local_response(
+        self,
+        query: str,
+        history: list[dict] | None = None,
+        max_tokens: int = 1024,
+        system_prompt: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream a local-model response as text deltas."""
+        start = time.time()
+        async for piece in self.backend.stream(self._local_request(query, history, max_tokens, system_prompt)):
+            yield piece
+        logger.debug("Local LLM stream finished in %.2f ms", (time.time() - start) * 1000)
+
     # Kept for backwards compatibility — used by tests and callers that don't need metadata.
     async def generate_response(self, query: str, complexity: str, history: list[dict] | None = None) -> str:
         logger.debug("Routing query complexity=%s", complexity)
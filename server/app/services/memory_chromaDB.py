@@ -1,31 +1,148 @@
 import hashlib
 import time
 import logging
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
 
 import chromadb
-from sentence_transformers import SentenceTransformer
-
-from app.config import CHROMA_HOST, CHROMA_PORT
+import numpy as np
+import redis as redis_lib
+
+from app.config import (
+    CACHE_N_RESULTS,
+    CACHE_SIMILARITY_THRESHOLD,
+    CACHE_SIMILARITY_THRESHOLDS,
+    CACHE_STORE,
+    CHROMA_HOST,
+    CHROMA_PORT,
+    EMBED_BATCH_MAX_SIZE,
+    EMBED_BATCH_MAX_WAIT_MS,
+    EMBED_BATCHING,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_SLOTS,
+    EXACT_CACHE_MAX_ENTRIES,
+    EXACT_CACHE_REDIS,
+    EXACT_CACHE_REDIS_CHECK_MS,
+    EXACT_CACHE_TTL_SECONDS,
+    LOCAL_STORE_DIR,
+    REDIS_URL,
+)
+from app.services.cache_store import CacheStore, LocalVectorStore
+from app.services.micro_batcher import MicroBatcher, MicroBatchStats
+from app.services.embedding_cache import EmbeddingCache, EmbeddingCacheStats
+from app.services.exact_match_cache import ExactMatchCache, ExactMatchCacheStats
+from app.services.token_usage import TokenUsage
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 logger = logging.getLogger("dejaq.services.memory_chromaDB")
 
-SIMILARITY_THRESHOLD = 0.15
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+EMBEDDING_DIM = 384
 
-_embedder: SentenceTransformer | None = None
+_embedder: "SentenceTransformer | None" = None
+_batcher: MicroBatcher[str, list[float]] | None = None
+_embedding_cache: EmbeddingCache | None = None
 
 
-def _get_embedder() -> SentenceTransformer:
+def _get_embedder() -> "SentenceTransformer":
     global _embedder
     if _embedder is None:
-        logger.info("Loading BAAI/bge-small-en-v1.5 embedder...")
-        _embedder = SentenceTransformer("BAAI/bge-small-en-v1.5")
+        # Imported lazily: workers whose tasks all carry a precomputed vector
+        # never pay for torch + the bge-small model.
+        from sentence_transformers import SentenceTransformer
+
+        logger.info("Loading %s embedder...", EMBEDDING_MODEL)
+        _embedder = SentenceTransformer(EMBEDDING_MODEL)
     return _embedder
 
 
+def _encode_batch(texts: list[str]) -> list[list[float]]:
+    return _get_embedder().encode(texts, batch_size=len(texts), normalize_embeddings=True).tolist()
+
+
+def _get_batcher() -> MicroBatcher[str, list[float]]:
+    global _batcher
+    if _batcher is None:
+        _batcher = MicroBatcher(
+            _encode_batch,
+            max_batch_size=EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=EMBED_BATCH_MAX_WAIT_MS,
+            name="embedding-batcher",
+        )
+    return _batcher
+
+
+def _get_embedding_cache() -> EmbeddingCache | None:
+    global _embedding_cache
+    if _embedding_cache is None and EMBED_CACHE_SLOTS > 0:
+        _embedding_cache = EmbeddingCache(
+            slots=EMBED_CACHE_SLOTS,
+            dim=EMBEDDING_DIM,
+            path=EMBED_CACHE_PATH or None,
+            model=EMBEDDING_MODEL,
+        )
+    return _embedding_cache
+
+
 def _embed(text: str) -> list[float]:
-    return _get_embedder().encode(text, normalize_embeddings=True).tolist()
+    cache = _get_embedding_cache()
+    if cache is not None:
+        cached = cache.get(text)
+        if cached is not None:
+            return cached.tolist()
+
+    if EMBED_BATCHING:
+        embedding = _get_batcher().run(text)
+    else:
+        embedding = _get_embedder().encode(text, normalize_embeddings=True).tolist()
+
+    if cache is not None:
+        cache.put(text, embedding)
+    return embedding
+
+
+def _embed_many(texts: list[str]) -> list[list[float]]:
+    """Embed several texts with one encode call for those not already memoized."""
+    cache = _get_embedding_cache()
+    embeddings: list[list[float] | None] = [None] * len(texts)
+    if cache is not None:
+        for i, text in enumerate(texts):
+            cached = cache.get(text)
+            if cached is not None:
+                embeddings[i] = cached.tolist()
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        for i, embedding in zip(missing, _encode_batch([texts[i] for i in missing])):
+            embeddings[i] = embedding
+            if cache is not None:
+                cache.put(texts[i], embedding)
+    return embeddings
+
+
+def _result_row(query_results: dict, field: str, row: int) -> list | None:
+    rows = query_results.get(field) or []
+    return rows[row] if row < len(rows) and rows[row] else None
+
+
+def _doc_id(normalized_query: str) -> str:
+    return hashlib.sha256(normalized_query.encode()).hexdigest()[:16]
+
+
+def get_embedding_cache_stats() -> EmbeddingCacheStats | None:
+    """Return embedding memo counters, or None when disabled or not yet used."""
+    if _embedding_cache is None:
+        return None
+    return _embedding_cache.stats()
+
+
+def get_embedding_batch_stats() -> MicroBatchStats | None:
+    """Return embedding micro-batch counters, or None before the first batched embed."""
+    if _batcher is None:
+        return None
+    return _batcher.stats()
 
 
 @dataclass(frozen=True)
@@ -37,88 +154,167 @@ class CacheLookupResult:
     matched_query: str | None = None
     nearest_distance: float | None = None
     nearest_prompt: str | None = None
+    query_embedding: list[float] | None = field(default=None, repr=False, compare=False)
+    # Tokens and model of the generation that produced the hit's entry (None
+    # for entries stored before token accounting): what serving it saved.
+    usage: TokenUsage | None = None
+    model_used: str | None = None
+
+
+def _entry_usage(meta: dict) -> TokenUsage | None:
+    if "prompt_tokens" not in meta:
+        return None
+    return TokenUsage(int(meta["prompt_tokens"]), int(meta.get("completion_tokens", 0)))
 
 
 class MemoryService:
     def __init__(
         self,
         collection_name: str = "dejaq_default",
+        similarity_threshold: float | None = None,
+        n_results: int | None = None,
+        redis_client: redis_lib.Redis | None = None,
     ):
-        logger.info("Initializing ChromaDB (collection=%s, host=%s, port=%d)", collection_name, CHROMA_HOST, CHROMA_PORT)
-        self._client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        # No embedding_function — we embed manually and pass query_embeddings / embeddings directly.
-        # This avoids any conflict with a previously persisted embedding function config.
-        self._collection = self._client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"},
+        self._collection: CacheStore
+        if CACHE_STORE == "local":
+            logger.info("Initializing local cache store (collection=%s, dir=%s)", collection_name, LOCAL_STORE_DIR)
+            self._collection = LocalVectorStore(collection_name, LOCAL_STORE_DIR, EMBEDDING_DIM)
+        else:
+            logger.info(
+                "Initializing ChromaDB (collection=%s, host=%s, port=%d)", collection_name, CHROMA_HOST, CHROMA_PORT
+            )
+            self._client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            # No embedding_function — we embed manually and pass query_embeddings / embeddings directly.
+            # This avoids any conflict with a previously persisted embedding function config.
+            self._collection = self._client.get_or_create_collection(
+                name=collection_name,
+                metadata={"hnsw:space": "cosine"},
+            )
+        if similarity_threshold is None:
+            similarity_threshold = CACHE_SIMILARITY_THRESHOLDS.get(collection_name, CACHE_SIMILARITY_THRESHOLD)
+        self._similarity_threshold = similarity_threshold
+        self._n_results = max(1, n_results or CACHE_N_RESULTS)
+        self._exact_cache: ExactMatchCache[CacheLookupResult] = ExactMatchCache(
+            max_entries=EXACT_CACHE_MAX_ENTRIES,
+            ttl_seconds=EXACT_CACHE_TTL_SECONDS,
+            namespace=collection_name,
+            redis_url=REDIS_URL if EXACT_CACHE_REDIS else None,
+            check_interval_ms=EXACT_CACHE_REDIS_CHECK_MS,
+            redis_client=redis_client,
         )
-        logger.info("ChromaDB ready — %d documents in collection '%s'", self._collection.count(), collection_name)
+        logger.info("Cache store ready — %d documents in collection '%s'", self._collection.count(), collection_name)
+
+    def _invalidate_entry(self, entry_id: str) -> None:
+        self._exact_cache.invalidate(entry_id)
+        self._exact_cache.invalidate_where(lambda result: result.entry_id == entry_id)
 
     def lookup_cache(self, normalized_query: str) -> CacheLookupResult:
         """Return cache hit details plus nearest Chroma prompt/distance.
 
-        Fetches top-5 candidates, filters to those within SIMILARITY_THRESHOLD,
-        then returns the one with the highest score (absent score treated as 0.0).
+        Fetches the top n_results candidates, filters to those within the
+        namespace's similarity threshold, then returns the one with the highest
+        score (absent score treated as 0.0). Byte-identical repeats of a previous
+        hit are served from the in-process exact-match layer without embedding or
+        querying Chroma.
+        """
+        return self.lookup_cache_batch([normalized_query])[0]
+
+    def lookup_cache_batch(self, normalized_queries: list[str]) -> list[CacheLookupResult]:
+        """lookup_cache for many queries with one embed pass and one collection.query call.
+
+        Results are returned in input order. Used for bulk warm-ups and offline replay.
         """
+        results: list[CacheLookupResult | None] = [None] * len(normalized_queries)
+        pending: list[int] = []
+        epoch = self._exact_cache.epoch()
+        for i, normalized_query in enumerate(normalized_queries):
+            exact_hit = self._exact_cache.get(_doc_id(normalized_query))
+            if exact_hit is not None:
+                logger.debug("Cache HIT exact_match entry_id=%s", exact_hit.entry_id)
+                results[i] = exact_hit
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
         start = time.time()
-        query_embedding = _embed(normalized_query)
-        n = min(5, self._collection.count() or 1)
-        results = self._collection.query(
-            query_embeddings=[query_embedding],
+        texts = [normalized_queries[i] for i in pending]
+        embeddings = [_embed(texts[0])] if len(texts) == 1 else _embed_many(texts)
+        n = min(self._n_results, self._collection.count() or 1)
+        query_results = self._collection.query(
+            query_embeddings=embeddings,
             n_results=n,
             include=["documents", "metadatas", "distances"],
         )
-
         latency_ms = (time.time() - start) * 1000
 
-        if not (results["distances"] and results["distances"][0] and results["ids"] and results["ids"][0]):
-            logger.debug("Cache MISS empty_collection latency=%.1fms", latency_ms)
-            return CacheLookupResult(hit=False)
-
-        nearest_dist = float(results["distances"][0][0])
-        nearest_prompt = None
-        if results["documents"] and results["documents"][0]:
-            nearest_prompt = results["documents"][0][0] or None
-
-        candidates = []
-        for i, (dist, entry_id) in enumerate(zip(results["distances"][0], results["ids"][0])):
-            if dist <= SIMILARITY_THRESHOLD:
-                meta = results["metadatas"][0][i] if results["metadatas"] and results["metadatas"][0] else {}
-                score = float(meta.get("score", 0.0))
-                matched_query = ""
-                if results["documents"] and results["documents"][0]:
-                    matched_query = results["documents"][0][i] or ""
-                candidates.append((score, float(dist), entry_id, meta, matched_query))
-
-        if not candidates:
-            logger.debug("Cache MISS distance=%.4f latency=%.1fms", nearest_dist, latency_ms)
-            return CacheLookupResult(
-                hit=False,
+        # Rows padded to a (queries, n) matrix; padding sits at +inf distance so it
+        # never passes the threshold.
+        rows = len(pending)
+        ids = [_result_row(query_results, "ids", row) or [] for row in range(rows)]
+        documents = [
+            _result_row(query_results, "documents", row) or [None] * len(ids[row]) for row in range(rows)
+        ]
+        metadatas = [
+            _result_row(query_results, "metadatas", row) or [{}] * len(ids[row]) for row in range(rows)
+        ]
+        width = max(len(row_ids) for row_ids in ids)
+        dists = np.full((rows, max(width, 1)), np.inf)
+        scores = np.zeros((rows, max(width, 1)))
+        for row in range(rows):
+            row_dists = _result_row(query_results, "distances", row) or []
+            dists[row, : len(row_dists)] = row_dists
+            scores[row, : len(metadatas[row])] = [float((meta or {}).get("score", 0.0)) for meta in metadatas[row]]
+
+        within = dists <= self._similarity_threshold
+        # Highest score among candidates within the threshold; argmax keeps the
+        # nearest one on ties because Chroma returns each row in distance order.
+        best = np.argmax(np.where(within, scores, -np.inf), axis=1)
+        has_hit = within.any(axis=1)
+
+        for row, i in enumerate(pending):
+            embedding = embeddings[row]
+            if not ids[row]:
+                logger.debug("Cache MISS empty_collection latency=%.1fms", latency_ms)
+                results[i] = CacheLookupResult(hit=False, query_embedding=embedding)
+                continue
+
+            nearest_dist = float(dists[row, 0])
+            nearest_prompt = documents[row][0] or None
+            if not has_hit[row]:
+                logger.debug("Cache MISS distance=%.4f latency=%.1fms", nearest_dist, latency_ms)
+                results[i] = CacheLookupResult(
+                    hit=False,
+                    nearest_distance=nearest_dist,
+                    nearest_prompt=nearest_prompt,
+                    query_embedding=embedding,
+                )
+                continue
+
+            col = int(best[row])
+            logger.debug(
+                "Cache HIT distance=%.4f score=%.1f threshold=%.2f latency=%.1fms entry_id=%s",
+                dists[row, col],
+                scores[row, col],
+                self._similarity_threshold,
+                latency_ms,
+                ids[row][col],
+            )
+            meta = metadatas[row][col]
+            result = CacheLookupResult(
+                hit=True,
+                generalized_answer=meta["generalized_answer"],
+                entry_id=ids[row][col],
+                distance=float(dists[row, col]),
+                matched_query=documents[row][col] or "",
                 nearest_distance=nearest_dist,
                 nearest_prompt=nearest_prompt,
+                usage=_entry_usage(meta),
+                model_used=meta.get("model_used"),
             )
-
-        # Sort by score descending, pick best
-        candidates.sort(key=lambda c: c[0], reverse=True)
-        best_score, best_dist, best_id, best_meta, matched_query = candidates[0]
-        answer = best_meta["generalized_answer"]
-        logger.debug(
-            "Cache HIT distance=%.4f score=%.1f threshold=%.2f latency=%.1fms entry_id=%s",
-            best_dist,
-            best_score,
-            SIMILARITY_THRESHOLD,
-            latency_ms,
-            best_id,
-        )
-        return CacheLookupResult(
-            hit=True,
-            generalized_answer=answer,
-            entry_id=best_id,
-            distance=best_dist,
-            matched_query=matched_query,
-            nearest_distance=nearest_dist,
-            nearest_prompt=nearest_prompt,
-        )
+            self._exact_cache.put(_doc_id(normalized_queries[i]), result, epoch)
+            results[i] = result
+        return results
 
     def check_cache(self, normalized_query: str) -> Optional[tuple[str, str, float, str]]:
         """Return (generalized_answer, entry_id, distance, matched_query) on cache hit, None on miss."""
@@ -138,23 +334,39 @@ class MemoryService:
         generalized_answer: str,
         original_query: str,
         user_id: str,
+        embedding: list[float] | None = None,
+        usage: TokenUsage | None = None,
+        model_used: str | None = None,
     ) -> str:
-        doc_id = hashlib.sha256(normalized_query.encode()).hexdigest()[:16]
-        embedding = _embed(normalized_query)
+        """Upsert a generalized answer. Pass the lookup-time embedding to skip re-embedding.
+
+        usage/model_used describe the generation of the answer; hits on the
+        entry report them as the tokens they saved.
+        """
+        doc_id = _doc_id(normalized_query)
+        if embedding is None:
+            embedding = _embed(normalized_query)
+        metadata = {
+            "generalized_answer": generalized_answer,
+            "original_query": original_query,
+            "user_id": user_id,
+            "stored_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "score": 0.0,
+            "hit_count": 0,
+            "negative_count": 0,
+        }
+        if usage is not None:
+            metadata["prompt_tokens"] = usage.prompt_tokens
+            metadata["completion_tokens"] = usage.completion_tokens
+        if model_used:
+            metadata["model_used"] = model_used
         self._collection.upsert(
             ids=[doc_id],
             embeddings=[embedding],
             documents=[normalized_query],
-            metadatas=[{
-                "generalized_answer": generalized_answer,
-                "original_query": original_query,
-                "user_id": user_id,
-                "stored_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                "score": 0.0,
-                "hit_count": 0,
-                "negative_count": 0,
-            }],
+            metadatas=[metadata],
         )
+        self._invalidate_entry(doc_id)
         logger.info("Stored in cache (id=%s, total=%d)", doc_id, self._collection.count())
         return doc_id
 
@@ -212,6 +424,8 @@ class MemoryService:
         if delta < 0:
             meta["negative_count"] = int(meta.get("negative_count", 0)) + 1
         self._collection.update(ids=[doc_id], metadatas=[meta])
+        # A score change can reorder candidates for any query in this namespace.
+        self._exact_cache.clear()
         logger.info("Updated score for %s: delta=%.1f new_score=%.1f", doc_id, delta, new_score)
         return new_score
 
@@ -222,6 +436,8 @@ class MemoryService:
             if not existing["ids"]:
                 return False
             self._collection.delete(ids=[entry_id])
+            self._invalidate_entry(entry_id)
+            self._exact_cache.publish_invalidation()
             logger.info("Deleted cache entry %s (total=%d)", entry_id, self._collection.count())
             return True
         except Exception:
@@ -239,6 +455,7 @@ class MemoryService:
             if not ids_to_delete:
                 return 0
             self._collection.delete(ids=ids_to_delete)
+            self._exact_cache.clear()
             logger.info("Evicted %d entries below score floor %.1f", len(ids_to_delete), floor)
             return len(ids_to_delete)
         except Exception:
@@ -256,12 +473,16 @@ class MemoryService:
         """Replace the full metadata for a cache entry. ChromaDB requires the complete dict."""
         try:
             self._collection.update(ids=[entry_id], metadatas=[metadata])
+            self._exact_cache.clear()
             logger.info("Updated metadata for cache entry %s", entry_id)
             return True
         except Exception:
             logger.error("Failed to update metadata for entry %s", entry_id, exc_info=True)
             return False
 
+    def exact_cache_stats(self) -> ExactMatchCacheStats:
+        return self._exact_cache.stats()
+
     @property
     def count(self) -> int:
         return self._collection.count()
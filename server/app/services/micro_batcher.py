@@ -0,0 +1,175 @@
+"""Micro-batching front-end for blocking model calls.
+
+Concurrent callers each submit one item; a single worker thread collects
+whatever arrives within ``max_wait_ms`` (up to ``max_batch_size`` items), runs
+one ``run_batch()`` call for the whole batch and resolves every caller's future
+with its own result. Sync callers block on the future (FastAPI threadpool
+threads, Celery tasks); async callers await it via ``asyncio.wrap_future``.
+
+Used for the bge-small query embedder and the DeBERTa complexity classifier.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Generic, Sequence, TypeVar
+
+logger = logging.getLogger("dejaq.services.micro_batcher")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class MicroBatchStats:
+    batches: int
+    items: int
+    max_batch_size: int
+    avg_batch_size: float
+    total_queue_wait_ms: float
+    max_queue_wait_ms: float
+    avg_queue_wait_ms: float
+    queue_depth: int
+    max_queue_depth: int
+
+
+@dataclass
+class _PendingItem(Generic[T]):
+    item: T
+    future: Future
+    enqueued_at: float
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        run_batch: Callable[[list[T]], Sequence[R]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "micro-batcher",
+    ) -> None:
+        self._run_batch_fn = run_batch
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait_s = max(0.0, max_wait_ms) / 1000
+        self._name = name
+        self._queue: queue.Queue[_PendingItem[T] | None] = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_seen_batch = 0
+        self._total_wait_s = 0.0
+        self._max_wait_seen_s = 0.0
+        self._max_queue_depth = 0
+
+    def run(self, item: T) -> R:
+        """Queue one item for the next batch and block until its result is ready."""
+        return self.submit(item).result()
+
+    def submit(self, item: T) -> Future:
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put(_PendingItem(item=item, future=future, enqueued_at=time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            with self._stats_lock:
+                self._max_queue_depth = max(self._max_queue_depth, depth)
+        return future
+
+    def stats(self) -> MicroBatchStats:
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            return MicroBatchStats(
+                batches=batches,
+                items=items,
+                max_batch_size=self._max_seen_batch,
+                avg_batch_size=(items / batches if batches else 0.0),
+                total_queue_wait_ms=self._total_wait_s * 1000,
+                max_queue_wait_ms=self._max_wait_seen_s * 1000,
+                avg_queue_wait_ms=(self._total_wait_s * 1000 / items if items else 0.0),
+                queue_depth=self._queue.qsize(),
+                max_queue_depth=self._max_queue_depth,
+            )
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """Stop the worker after it drains already-queued items."""
+        with self._start_lock:
+            worker = self._worker
+            if worker is None:
+                return
+            self._queue.put(None)
+            self._worker = None
+        worker.join(timeout)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name=f"dejaq-{self._name}",
+                    daemon=True,
+                )
+                self._worker.start()
+
+    def _collect(self, first: _PendingItem[T]) -> tuple[list[_PendingItem[T]], bool]:
+        batch = [first]
+        deadline = time.perf_counter() + self._max_wait_s
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[_PendingItem[T]]) -> None:
+        started = time.perf_counter()
+        waits = [started - pending.enqueued_at for pending in batch]
+        try:
+            results = self._run_batch_fn([pending.item for pending in batch])
+            if len(results) != len(batch):
+                # zip() would silently leave the unmatched callers waiting forever.
+                raise RuntimeError(f"{self._name} returned {len(results)} results for {len(batch)} items")
+        except Exception as exc:
+            logger.exception("%s batch failed size=%d", self._name, len(batch))
+            for pending in batch:
+                pending.future.set_exception(exc)
+            return
+
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_seen_batch = max(self._max_seen_batch, len(batch))
+            self._total_wait_s += sum(waits)
+            self._max_wait_seen_s = max(self._max_wait_seen_s, max(waits))
+        logger.debug(
+            "%s batch size=%d max_wait=%.1fms run=%.1fms",
+            self._name,
+            len(batch),
+            max(waits) * 1000,
+            (time.perf_counter() - started) * 1000,
+        )
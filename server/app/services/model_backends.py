@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass
-from typing import Protocol, TypedDict
+from typing import AsyncIterator, Protocol, TypedDict
 
 import httpx
 
+from app import config
 from app.services.model_loader import ModelManager
+from app.services import token_usage
+from app.services.request_scheduler import request_scheduler
 
 logger = logging.getLogger("dejaq.services.model_backends")
 
@@ -23,6 +32,14 @@ class CompletionRequest:
     messages: list[PromptMessage]
     max_tokens: int
     temperature: float
+    # Leading messages (system prompt + few-shot turns) that are identical on
+    # every call; local backends keep their evaluated KV state and only
+    # evaluate what follows.
+    prefix_messages: int = 0
+    # Pipeline role (enrich, normalize, generate, adjust, generalize); sets the
+    # call's scheduling priority unless `priority` overrides it (lower first).
+    role: str = "generate"
+    priority: int | None = None
 
 
 @dataclass(frozen=True)
@@ -59,12 +76,262 @@ class ModelBackend(Protocol):
     async def complete(self, request: CompletionRequest) -> str:
         ...
 
+    def stream(self, request: CompletionRequest) -> AsyncIterator[str]:
+        """Yield the completion as text deltas while it is generated."""
+        ...
+
+
+_STREAM_END = object()
+
+
+@dataclass(frozen=True)
+class ReplicaPoolStats:
+    replicas: int
+    n_threads: int | None
+    busy: int
+    queued: int
+    requests: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    prefix_reused: int
+    prefix_restored: int
+    prefix_evaluated: int
+
+
+@dataclass(frozen=True)
+class InProcessPoolStats:
+    models: dict[str, ReplicaPoolStats]
+    budget_bytes: int
+    resident_bytes: int
+    evictions: int
+
+
+def replica_threads(replicas: int) -> int | None:
+    """Thread budget per replica; None keeps llama-cpp's own default (single replica)."""
+    if config.LLAMA_THREADS_PER_REPLICA:
+        return config.LLAMA_THREADS_PER_REPLICA
+    if replicas == 1:
+        return None
+    # llama-cpp defaults to one thread per physical core; split that across replicas.
+    physical_cores = max(1, (os.cpu_count() or 2) // 2)
+    return max(1, physical_cores // replicas)
+
+
+def model_load_options(logical_model_name: str, replicas: int = 1) -> dict:
+    """Loader kwargs for one model: per-model overrides first, then the global settings.
+
+    Defaults are left out so loaders keep llama-cpp's own (n_threads=auto,
+    mmap on, mlock off).
+    """
+    options: dict = {}
+    n_threads = config.LLAMA_THREADS_BY_MODEL.get(logical_model_name) or replica_threads(replicas)
+    if n_threads:
+        options["n_threads"] = n_threads
+    if not config.LLAMA_USE_MMAP_BY_MODEL.get(logical_model_name, config.LLAMA_USE_MMAP):
+        options["use_mmap"] = False
+    if config.LLAMA_USE_MLOCK_BY_MODEL.get(logical_model_name, config.LLAMA_USE_MLOCK):
+        options["use_mlock"] = True
+    return options
+
+
+def chat_formatter(llama):
+    """Prompt formatter matching create_chat_completion for a GGUF with a chat template."""
+    from llama_cpp import llama_chat_format
+
+    template = llama.metadata.get("tokenizer.chat_template")
+    if not template:
+        return llama_chat_format.format_chatml
+    eos_id, bos_id = llama.token_eos(), llama.token_bos()
+    return llama_chat_format.Jinja2ChatFormatter(
+        template=template,
+        eos_token=llama._model.token_get_text(eos_id) if eos_id != -1 else "",
+        bos_token=llama._model.token_get_text(bos_id) if bos_id != -1 else "",
+        stop_token_ids=[eos_id],
+    )
+
+
+def chat_prompt(llama, formatter, messages: list) -> tuple[list[int], list[str]]:
+    """Render and tokenize messages the way the chat handler does; returns (tokens, stop strings)."""
+    formatted = formatter(messages=messages)
+    tokens = llama.tokenize(
+        formatted.prompt.encode("utf-8"),
+        add_bos=not formatted.added_special,
+        special=True,
+    )
+    stop = formatted.stop or []
+    return tokens, [stop] if isinstance(stop, str) else list(stop)
+
+
+class _PrefixStates:
+    """Saved KV states of static prompt prefixes for one Llama replica.
+
+    Llama.generate already skips the part of a prompt that matches the tokens
+    currently in its context, so a replica answering the same few-shot prompt
+    twice in a row only evaluates the new turn. Replicas are shared between
+    services, though (qwen_1_5b serves both the enricher and the adjuster), so
+    before each call the prefix's state is restored if something else has
+    been evaluated since. Only the thread holding the replica's lease calls in.
+    """
+
+    def __init__(self, llama, max_entries: int) -> None:
+        self._llama = llama
+        self._max_entries = max_entries
+        self._formatter = None
+        # prefix messages -> (prefix tokens, LlamaState after evaluating them)
+        self._states: OrderedDict[tuple, tuple[list[int], object]] = OrderedDict()
+        self.reused = 0
+        self.restored = 0
+        self.evaluated = 0
+
+    def _prefix_tokens(self, messages: list, prefix_messages: int) -> list[int]:
+        if self._formatter is None:
+            self._formatter = chat_formatter(self._llama)
+        full, _ = chat_prompt(self._llama, self._formatter, messages)
+        # The prefix ends where the full prompt and one with an empty final
+        # turn diverge, which keeps the static header of that turn as well.
+        probe, _ = chat_prompt(
+            self._llama, self._formatter, [*messages[:prefix_messages], {"role": "user", "content": ""}]
+        )
+        common = 0
+        for a, b in zip(full, probe):
+            if a != b:
+                break
+            common += 1
+        # Leave at least one token for generate() to evaluate.
+        return full[: min(common, len(full) - 1)]
+
+    def prompt_tokens(self, messages: list) -> int:
+        """Length of the tokenized chat prompt, as create_chat_completion evaluates it."""
+        if self._formatter is None:
+            self._formatter = chat_formatter(self._llama)
+        tokens, _ = chat_prompt(self._llama, self._formatter, messages)
+        return len(tokens)
+
+    def prime(self, messages: list, prefix_messages: int) -> None:
+        """Leave the replica's context holding the evaluated prefix of these messages."""
+        if self._max_entries <= 0 or prefix_messages <= 0:
+            return
+        llama = self._llama
+        key = tuple((message["role"], message["content"]) for message in messages[:prefix_messages])
+        entry = self._states.get(key)
+        if entry is None:
+            tokens = self._prefix_tokens(messages, prefix_messages)
+            if not tokens or len(tokens) >= llama.n_ctx():
+                return
+            llama.reset()
+            llama.eval(tokens)
+            self._states[key] = (tokens, llama.save_state())
+            while len(self._states) > self._max_entries:
+                self._states.popitem(last=False)
+            self.evaluated += 1
+            return
+        self._states.move_to_end(key)
+        tokens, state = entry
+        if llama.n_tokens >= len(tokens) and llama._input_ids[: len(tokens)].tolist() == tokens:
+            self.reused += 1
+            return
+        llama.load_state(state)
+        self.restored += 1
+
+
+class _ReplicaPool:
+    """Free list of model instances for one logical model.
+
+    A request leases whichever replica is free and waits in FIFO order when all
+    are busy, so N replicas serve N requests at once. Each instance is still
+    used by one thread at a time, since concurrent calls into the same GGUF
+    runtime can crash.
+    """
+
+    def __init__(self, replicas: list, n_threads: int | None) -> None:
+        self._free: asyncio.Queue = asyncio.Queue()
+        for replica in replicas:
+            self._free.put_nowait(replica)
+        self._prefixes = {
+            id(replica): _PrefixStates(replica, config.LLAMA_PREFIX_CACHE_ENTRIES) for replica in replicas
+        }
+        self._size = len(replicas)
+        self._n_threads = n_threads
+        self.last_used = time.monotonic()
+        self._pins = 0
+        self._queued = 0
+        self._requests = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+
+    @asynccontextmanager
+    async def lease(self):
+        started = time.perf_counter()
+        self._queued += 1
+        try:
+            replica = await self._free.get()
+        finally:
+            self._queued -= 1
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._requests += 1
+        self._wait_total_ms += wait_ms
+        self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+        try:
+            yield replica
+        finally:
+            self.last_used = time.monotonic()
+            self._free.put_nowait(replica)
+
+    @contextmanager
+    def pinned(self):
+        """Keep the pool loaded while a request waits for its scheduler slot."""
+        self._pins += 1
+        try:
+            yield self
+        finally:
+            self._pins -= 1
+
+    @property
+    def idle(self) -> bool:
+        return self._pins == 0 and self._queued == 0 and self._free.qsize() == self._size
+
+    def prefix_states(self, replica) -> _PrefixStates:
+        return self._prefixes[id(replica)]
+
+    def stats(self) -> ReplicaPoolStats:
+        prefixes = self._prefixes.values()
+        return ReplicaPoolStats(
+            replicas=self._size,
+            n_threads=self._n_threads,
+            busy=self._size - self._free.qsize(),
+            queued=self._queued,
+            requests=self._requests,
+            avg_wait_ms=(self._wait_total_ms / self._requests if self._requests else 0.0),
+            max_wait_ms=self._wait_max_ms,
+            prefix_reused=sum(p.reused for p in prefixes),
+            prefix_restored=sum(p.restored for p in prefixes),
+            prefix_evaluated=sum(p.evaluated for p in prefixes),
+        )
+
+
+def _prompt_token_count(prefix_states: _PrefixStates, messages: list) -> int | None:
+    try:
+        return prefix_states.prompt_tokens(messages)
+    except Exception:
+        # Token accounting must never fail a completion that already streamed.
+        logger.debug("Prompt token count unavailable", exc_info=True)
+        return None
+
+
+def _close_all(instances: list) -> None:
+    for instance in instances:
+        instance.close()
+
 
 class InProcessBackend:
     def __init__(self) -> None:
-        self._model_locks: dict[str, asyncio.Lock] = {}
+        self._pools: dict[str, _ReplicaPool] = {}
+        self._pool_locks: dict[str, asyncio.Lock] = {}
+        # Bytes promised to loads in flight, so parallel loads budget together.
+        self._reserved: dict[str, int] = {}
+        self._evictions = 0
 
-    def _get_model(self, logical_model_name: str):
+    def _get_loader(self, logical_model_name: str):
         try:
             runtime_spec = MODEL_RUNTIME_SPECS[logical_model_name]
         except KeyError as exc:
@@ -75,26 +342,229 @@ class InProcessBackend:
             raise ValueError(
                 f"Model loader '{runtime_spec.loader_name}' missing for logical model '{logical_model_name}'"
             )
-        return loader()
+        return loader
+
+    @staticmethod
+    def _replica_count(logical_model_name: str) -> int:
+        return config.LLAMA_REPLICAS_BY_MODEL.get(logical_model_name, config.LLAMA_REPLICAS)
+
+    def _load_replicas(self, logical_model_name: str) -> _ReplicaPool:
+        loader = self._get_loader(logical_model_name)
+        replicas = self._replica_count(logical_model_name)
+        kwargs = model_load_options(logical_model_name, replicas)
+        n_threads = kwargs.get("n_threads")
+        instances = [loader(**kwargs)]
+        instances.extend(loader(replica=index, **kwargs) for index in range(1, replicas))
+        logger.info(
+            "In-process model pool ready model=%s replicas=%d n_threads=%s",
+            logical_model_name,
+            replicas,
+            n_threads or "auto",
+        )
+        return _ReplicaPool(instances, n_threads)
+
+    def _evict(self, logical_model_name: str) -> list | None:
+        """Drop an idle pool and detach its instances; None while any replica is in use."""
+        pool = self._pools.get(logical_model_name)
+        if pool is None or not pool.idle:
+            return None
+        del self._pools[logical_model_name]
+        return ModelManager.detach(MODEL_RUNTIME_SPECS[logical_model_name].loader_name)
+
+    async def _make_room(self, logical_model_name: str) -> None:
+        """Unload least-recently-used idle models until this one fits DEJAQ_MODEL_MEMORY_BUDGET_MB."""
+        budget = config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+        if not budget:
+            return
+        loader_name = MODEL_RUNTIME_SPECS[logical_model_name].loader_name
+        needed = ModelManager.estimate_bytes(loader_name, self._replica_count(logical_model_name))
+        resident = ModelManager.resident_bytes() + sum(self._reserved.values())
+        evicted: list = []
+        for name, pool in sorted(self._pools.items(), key=lambda item: item[1].last_used):
+            if resident + needed <= budget:
+                break
+            freed = ModelManager.resident_bytes(MODEL_RUNTIME_SPECS[name].loader_name)
+            instances = self._evict(name)
+            if instances is None:
+                continue
+            evicted.extend(instances)
+            resident -= freed
+            self._evictions += 1
+            logger.info(
+                "Evicted model=%s (%.0f MB) to load model=%s within budget=%.0f MB",
+                name,
+                freed / 1024 / 1024,
+                logical_model_name,
+                budget / 1024 / 1024,
+            )
+        if resident + needed > budget:
+            logger.warning(
+                "Loading model=%s (~%.0f MB) exceeds budget=%.0f MB; other models are busy",
+                logical_model_name,
+                needed / 1024 / 1024,
+                budget / 1024 / 1024,
+            )
+        self._reserved[logical_model_name] = needed
+        if evicted:
+            await asyncio.to_thread(_close_all, evicted)
+
+    async def _get_pool(self, logical_model_name: str) -> _ReplicaPool:
+        pool = self._pools.get(logical_model_name)
+        if pool is not None:
+            return pool
+        async with self._pool_locks.setdefault(logical_model_name, asyncio.Lock()):
+            pool = self._pools.get(logical_model_name)
+            if pool is None:
+                try:
+                    await self._make_room(logical_model_name)
+                    pool = await asyncio.to_thread(self._load_replicas, logical_model_name)
+                finally:
+                    self._reserved.pop(logical_model_name, None)
+                self._pools[logical_model_name] = pool
+        return pool
+
+    async def preload(self, logical_model_name: str) -> None:
+        await self._get_pool(logical_model_name)
+
+    async def unload_idle(self, max_idle_seconds: float, pinned: set[str]) -> list[str]:
+        """Release models whose replicas have all been free for max_idle_seconds."""
+        unloaded = []
+        now = time.monotonic()
+        for name, pool in list(self._pools.items()):
+            if name in pinned or now - pool.last_used < max_idle_seconds:
+                continue
+            instances = self._evict(name)
+            if instances is None:
+                continue
+            # Requests arriving from here on load fresh replicas.
+            await asyncio.to_thread(_close_all, instances)
+            unloaded.append(name)
+        return unloaded
+
+    def stats(self) -> InProcessPoolStats:
+        return InProcessPoolStats(
+            models={name: pool.stats() for name, pool in self._pools.items()},
+            budget_bytes=config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+            resident_bytes=ModelManager.resident_bytes(),
+            evictions=self._evictions,
+        )
+
+    def _slot(self, request: CompletionRequest):
+        # One scheduler slot per replica, so the pool itself never queues.
+        return request_scheduler.slot(
+            f"in_process:{request.model_name}",
+            self._replica_count(request.model_name),
+            request.role,
+            request.max_tokens,
+            request.priority,
+        )
 
     async def complete(self, request: CompletionRequest) -> str:
         logger.debug("Model completion backend=in_process model=%s", request.model_name)
-        model = self._get_model(request.model_name)
-        model_lock = self._model_locks.setdefault(request.model_name, asyncio.Lock())
+        pool = await self._get_pool(request.model_name)
 
-        def _run_completion() -> str:
+        def _run_completion(model) -> tuple[str, dict]:
+            pool.prefix_states(model).prime(request.messages, request.prefix_messages)
             output = model.create_chat_completion(
                 messages=request.messages,
                 max_tokens=request.max_tokens,
                 temperature=request.temperature,
             )
-            return output["choices"][0]["message"]["content"].strip()
+            return output["choices"][0]["message"]["content"].strip(), output.get("usage") or {}
 
         # `llama-cpp-python` completion is blocking, so run it in a worker
-        # thread. Access to a shared model instance is serialized per logical
-        # model because concurrent calls into the same GGUF runtime can crash.
-        async with model_lock:
-            return await asyncio.to_thread(_run_completion)
+        # thread on whichever replica is free.
+        with pool.pinned():
+            async with self._slot(request), pool.lease() as model:
+                text, usage = await asyncio.to_thread(_run_completion, model)
+        token_usage.record(request.role, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return text
+
+    async def stream(self, request: CompletionRequest) -> AsyncIterator[str]:
+        logger.debug("Model stream backend=in_process model=%s", request.model_name)
+        pool = await self._get_pool(request.model_name)
+        loop = asyncio.get_running_loop()
+        pieces: asyncio.Queue[object] = asyncio.Queue()
+        stop = threading.Event()
+        # Stream chunks carry no usage: llama-cpp emits one chunk per sampled
+        # token, and the prompt is tokenized the way the chat handler does it.
+        usage = {"prompt_tokens": None, "completion_tokens": 0}
+
+        def _run_stream(model) -> None:
+            try:
+                prefix_states = pool.prefix_states(model)
+                prefix_states.prime(request.messages, request.prefix_messages)
+                for chunk in model.create_chat_completion(
+                    messages=request.messages,
+                    max_tokens=request.max_tokens,
+                    temperature=request.temperature,
+                    stream=True,
+                ):
+                    if stop.is_set():
+                        break
+                    piece = chunk["choices"][0]["delta"].get("content")
+                    if piece:
+                        usage["completion_tokens"] += 1
+                        loop.call_soon_threadsafe(pieces.put_nowait, piece)
+                usage["prompt_tokens"] = _prompt_token_count(prefix_states, request.messages)
+            except Exception as exc:
+                loop.call_soon_threadsafe(pieces.put_nowait, exc)
+            else:
+                loop.call_soon_threadsafe(pieces.put_nowait, _STREAM_END)
+
+        # The replica stays leased until the worker thread has left it, even if
+        # the consumer stops early.
+        with pool.pinned():
+            async with self._slot(request), pool.lease() as model:
+                worker = asyncio.create_task(asyncio.to_thread(_run_stream, model))
+                try:
+                    while (item := await pieces.get()) is not _STREAM_END:
+                        if isinstance(item, Exception):
+                            raise item
+                        yield item
+                finally:
+                    stop.set()
+                    await worker
+        if usage["prompt_tokens"] is not None:
+            token_usage.record(request.role, usage["prompt_tokens"], usage["completion_tokens"])
+
+
+@dataclass(frozen=True)
+class OllamaPoolStats:
+    requests: int
+    connections_opened: int
+    reused_requests: int
+    reuse_ratio: float
+
+
+class _TrackedTransport(httpx.AsyncHTTPTransport):
+    """Pooled transport that counts new TCP connections via the httpcore trace hook."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.connections_opened = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions = {**request.extensions, "trace": self._trace}
+        return await super().handle_async_request(request)
+
+    async def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _record_ollama_usage(request: CompletionRequest, data: dict) -> None:
+    # The final chat message reports the runner's own token counts.
+    if "prompt_eval_count" in data or "eval_count" in data:
+        token_usage.record(request.role, data.get("prompt_eval_count"), data.get("eval_count"))
 
 
 class OllamaBackend:
@@ -103,10 +573,64 @@ class OllamaBackend:
         base_url: str,
         timeout_seconds: float,
         client: httpx.AsyncClient | None = None,
+        max_connections: int | None = None,
+        max_keepalive_connections: int | None = None,
+        keepalive_expiry_seconds: float | None = None,
+        http2: bool | None = None,
     ) -> None:
         self._base_url = base_url.rstrip("/")
         self._timeout_seconds = timeout_seconds
         self._client = client
+        self._owns_client = client is None
+        self._transport: _TrackedTransport | None = None
+        self._limits = httpx.Limits(
+            max_connections=max_connections or config.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or config.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=keepalive_expiry_seconds or config.OLLAMA_KEEPALIVE_SECONDS,
+        )
+        self._http2 = config.OLLAMA_HTTP2 if http2 is None else http2
+        if self._http2 and not _http2_available():
+            logger.warning("DEJAQ_OLLAMA_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+            self._http2 = False
+        self._requests = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._transport = _TrackedTransport(limits=self._limits, http2=self._http2)
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                timeout=self._timeout_seconds,
+                transport=self._transport,
+            )
+            logger.info(
+                "Ollama client pool opened url=%s max_connections=%s keepalive=%s http2=%s",
+                self._base_url,
+                self._limits.max_connections,
+                self._limits.max_keepalive_connections,
+                self._http2,
+            )
+        return self._client
+
+    async def open(self) -> None:
+        """Create the pooled client up front (called from the app lifespan)."""
+        self._get_client()
+
+    async def aclose(self) -> None:
+        """Close the pooled client if this backend created it."""
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._transport = None
+
+    def stats(self) -> OllamaPoolStats:
+        opened = self._transport.connections_opened if self._transport is not None else 0
+        reused = max(0, self._requests - opened)
+        return OllamaPoolStats(
+            requests=self._requests,
+            connections_opened=opened,
+            reused_requests=reused,
+            reuse_ratio=(reused / self._requests if self._requests else 0.0),
+        )
 
     def _resolve_model(self, logical_model_name: str) -> str:
         try:
@@ -114,10 +638,11 @@ class OllamaBackend:
         except KeyError as exc:
             raise ValueError(f"Unknown logical model name: {logical_model_name}") from exc
 
-    async def complete(self, request: CompletionRequest) -> str:
+    def _chat_payload(self, request: CompletionRequest, stream: bool) -> dict:
         ollama_model = self._resolve_model(request.model_name)
         logger.debug(
-            "Model completion backend=ollama model=%s ollama_model=%s url=%s",
+            "Model %s backend=ollama model=%s ollama_model=%s url=%s",
+            "stream" if stream else "completion",
             request.model_name,
             ollama_model,
             self._base_url,
@@ -125,21 +650,36 @@ class OllamaBackend:
         payload = {
             "model": ollama_model,
             "messages": request.messages,
-            "stream": False,
+            "stream": stream,
             "options": {
                 "temperature": request.temperature,
                 "num_predict": request.max_tokens,
             },
         }
+        # Ollama reuses the KV cache of the longest matching prompt prefix held
+        # by the runner, so the fixed few-shot prompts are only evaluated once
+        # per runner as long as it is not unloaded between calls.
+        if config.OLLAMA_KEEP_ALIVE:
+            payload["keep_alive"] = config.OLLAMA_KEEP_ALIVE
+        return payload
 
-        if self._client is not None:
-            response = await self._client.post("/api/chat", json=payload)
-        else:
-            async with httpx.AsyncClient(
-                base_url=self._base_url,
-                timeout=self._timeout_seconds,
-            ) as client:
-                response = await client.post("/api/chat", json=payload)
+    def _slot(self, request: CompletionRequest):
+        # Match the server's OLLAMA_NUM_PARALLEL so queueing (and priority
+        # ordering) happens here rather than inside Ollama.
+        return request_scheduler.slot(
+            f"ollama:{self._base_url}:{self._resolve_model(request.model_name)}",
+            config.OLLAMA_NUM_PARALLEL,
+            request.role,
+            request.max_tokens,
+            request.priority,
+        )
+
+    async def complete(self, request: CompletionRequest) -> str:
+        payload = self._chat_payload(request, stream=False)
+
+        async with self._slot(request):
+            self._requests += 1
+            response = await self._get_client().post("/api/chat", json=payload)
 
         response.raise_for_status()
         data = response.json()
@@ -147,4 +687,25 @@ class OllamaBackend:
         content = message.get("content")
         if not isinstance(content, str):
             raise ValueError("Ollama response missing assistant message content")
+        _record_ollama_usage(request, data)
         return content.strip()
+
+    async def stream(self, request: CompletionRequest) -> AsyncIterator[str]:
+        """Relay Ollama's NDJSON chat stream, one message delta per line."""
+        payload = self._chat_payload(request, stream=True)
+
+        async with self._slot(request), self._get_client().stream("POST", "/api/chat", json=payload) as response:
+            self._requests += 1
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise ValueError(f"Ollama stream error: {data['error']}")
+                piece = data.get("message", {}).get("content")
+                if piece:
+                    yield piece
+                if data.get("done"):
+                    _record_ollama_usage(request, data)
+                    break
@@ -1,76 +1,258 @@
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+
 from llama_cpp import Llama
 import logging
 
 logger = logging.getLogger("dejaq.services.model_loader")
 
+# Smallest context llama-cpp will build; used when a caller only needs the
+# weights, tokenizer and chat template and brings its own context.
+_WEIGHTS_ONLY_N_CTX = 256
+
+
+@dataclass(frozen=True)
+class GGUFSource:
+    label: str
+    repo_id: str
+    filename: str
+    n_ctx: int
+    # Rough resident size of one instance, used to budget a model's first
+    # load; later loads use the footprint measured last time.
+    approx_mb: int
+
+
+GGUF_SOURCES: dict[str, GGUFSource] = {
+    "load_qwen": GGUFSource("Qwen 2.5 0.5B", "Qwen/Qwen2.5-0.5B-Instruct-GGUF", "*q4_k_m.gguf", 4096, 550),
+    "load_qwen_1_5b": GGUFSource("Qwen 2.5 1.5B", "Qwen/Qwen2.5-1.5B-Instruct-GGUF", "*q4_k_m.gguf", 4096, 1250),
+    "load_phi": GGUFSource("Phi-3.5 Mini", "bartowski/Phi-3.5-mini-instruct-GGUF", "*Q4_K_M.gguf", 4096, 3900),
+    "load_gemma": GGUFSource("Gemma 4 E4B", "unsloth/gemma-4-E4B-it-GGUF", "*Q4_K_M.gguf", 8192, 5500),
+    "load_gemma_e2b": GGUFSource("Gemma 4 E2B", "unsloth/gemma-4-E2B-it-GGUF", "*Q4_K_M.gguf", 2048, 3300),
+}
+
+_MB = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ModelStatus:
+    state: str  # loading | ready | failed | unloaded
+    instances: int
+    load_seconds: float
+    error: str | None = None
+    resident_bytes: int = 0
+    loads: int = 0
+    unloads: int = 0
+
+
+@dataclass(frozen=True)
+class _Footprint:
+    weights: int
+    kv: int
+    mapped: bool
+
+
+def _measure(instance: Llama, mapped: bool) -> _Footprint:
+    """Weight bytes plus an f16 KV cache estimate for the instance's n_ctx."""
+    import llama_cpp
+
+    model = instance._model.model
+    n_head = max(1, llama_cpp.llama_model_n_head(model))
+    kv_width = llama_cpp.llama_model_n_embd(model) * llama_cpp.llama_model_n_head_kv(model) // n_head
+    kv = 2 * llama_cpp.llama_model_n_layer(model) * instance.n_ctx() * kv_width * 2
+    return _Footprint(weights=llama_cpp.llama_model_size(model), kv=kv, mapped=mapped)
+
+
 class ModelManager:
-    _qwen = None
-    _qwen_1_5b = None
-    _llama = None
-    _phi = None
-    _gemma_e2b = None
+    # (loader name, replica index) -> Llama. Replica 0 is the instance every
+    # caller shared before pooling; extra replicas map the same GGUF file, so
+    # weights are shared through the page cache and each one mainly adds its
+    # own KV cache (n_ctx) and thread budget. Replica -1 holds the weights-only
+    # instance used by the batched backend.
+    _instances: dict[tuple[str, int], Llama] = {}
+    _status: dict[str, ModelStatus] = {}
+    # Memory accounting: mmap'd instances of one GGUF share a single copy of
+    # the weights, every instance has its own KV cache.
+    _footprints: dict[tuple[str, int], _Footprint] = {}
+    _last_footprint: dict[str, _Footprint] = {}
+    _loads: Counter = Counter()
+    _unloads: Counter = Counter()
+    # One lock per instance key: concurrent first requests wait for the load in
+    # flight instead of starting their own, while different models (and
+    # replicas) still load in parallel.
+    _registry_lock = threading.Lock()
+    _load_locks: dict[tuple[str, int], threading.Lock] = {}
 
     @classmethod
-    def load_qwen(cls):
-        """Loads thew Qwen 2.5 (0.5B) model. the normalization model for cleaning user queries."""
-        if cls._qwen is None:
-            logger.info("Loading Qwen 2.5 0.5B (GGUF)...")
-            cls._qwen = Llama.from_pretrained(
-                repo_id="Qwen/Qwen2.5-0.5B-Instruct-GGUF",
-                filename="*q4_k_m.gguf",
-                verbose=False,
-                n_ctx=4096
+    def _lock_for(cls, key: tuple[str, int]) -> threading.Lock:
+        with cls._registry_lock:
+            return cls._load_locks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def _set_status(cls, loader_name: str, state: str, load_seconds: float = 0.0, error: str | None = None) -> None:
+        with cls._registry_lock:
+            instances = sum(1 for name, _ in cls._instances if name == loader_name)
+            previous = cls._status.get(loader_name)
+            if state != "ready":
+                # Keep reporting the duration of the last successful load.
+                load_seconds = previous.load_seconds if previous is not None else 0.0
+            cls._status[loader_name] = ModelStatus(state, instances, round(load_seconds, 3), error)
+
+    @classmethod
+    def _get_or_load(cls, loader_name: str, replica: int, description: str, **params) -> Llama:
+        key = (loader_name, replica)
+        instance = cls._instances.get(key)
+        if instance is not None:
+            return instance
+        with cls._lock_for(key):
+            instance = cls._instances.get(key)
+            if instance is not None:
+                return instance
+            source = GGUF_SOURCES[loader_name]
+            logger.info("Loading %s (GGUF)%s...", source.label, description)
+            cls._set_status(loader_name, "loading")
+            started = time.perf_counter()
+            try:
+                instance = Llama.from_pretrained(
+                    repo_id=source.repo_id,
+                    filename=source.filename,
+                    verbose=False,
+                    **params,
+                )
+            except Exception as exc:
+                cls._set_status(loader_name, "failed", error=str(exc))
+                raise
+            footprint = _measure(instance, mapped=params.get("use_mmap", True))
+            with cls._registry_lock:
+                cls._instances[key] = instance
+                cls._footprints[key] = footprint
+                cls._last_footprint[loader_name] = footprint
+                cls._loads[loader_name] += 1
+            elapsed = time.perf_counter() - started
+            cls._set_status(loader_name, "ready", load_seconds=elapsed)
+            logger.info("Loaded %s%s in %.1fs", source.label, description, elapsed)
+        return instance
+
+    @classmethod
+    def _load(
+        cls,
+        loader_name: str,
+        replica: int,
+        n_threads: int | None,
+        use_mmap: bool = True,
+        use_mlock: bool = False,
+    ) -> Llama:
+        params = {"n_ctx": GGUF_SOURCES[loader_name].n_ctx, "use_mmap": use_mmap, "use_mlock": use_mlock}
+        if n_threads:
+            params["n_threads"] = n_threads
+        description = f" replica={replica} n_threads={n_threads or 'auto'}" if replica else ""
+        return cls._get_or_load(loader_name, replica, description, **params)
+
+    @classmethod
+    def load_weights(cls, loader_name: str, use_mmap: bool = True, use_mlock: bool = False) -> Llama:
+        """Load a model with a minimal context, for callers that build their own (batched backend)."""
+        return cls._get_or_load(
+            loader_name,
+            -1,
+            " for batched decoding",
+            n_ctx=_WEIGHTS_ONLY_N_CTX,
+            use_mmap=use_mmap,
+            use_mlock=use_mlock,
+        )
+
+    @classmethod
+    def detach(cls, loader_name: str, weights: bool = False) -> list[Llama]:
+        """Forget a model's replicas (or its weights-only instance) and hand them back for closing.
+
+        Later loads create fresh instances right away, even while the detached
+        ones are still being closed.
+        """
+        with cls._registry_lock:
+            keys = [key for key in cls._instances if key[0] == loader_name and (key[1] == -1) == weights]
+            instances = [cls._instances.pop(key) for key in keys]
+            for key in keys:
+                cls._footprints.pop(key, None)
+            if instances:
+                cls._unloads[loader_name] += 1
+        if instances:
+            cls._set_status(loader_name, "unloaded")
+            logger.info("Unloaded %s (%d instances)", GGUF_SOURCES[loader_name].label, len(instances))
+        return instances
+
+    @classmethod
+    def unload(cls, loader_name: str, weights: bool = False) -> int:
+        """Drop and close a model's replicas (or its weights-only instance); returns how many were closed."""
+        instances = cls.detach(loader_name, weights)
+        for instance in instances:
+            instance.close()
+        return len(instances)
+
+    @classmethod
+    def resident_bytes(cls, loader_name: str | None = None) -> int:
+        total = 0
+        mapped: set[str] = set()
+        with cls._registry_lock:
+            footprints = list(cls._footprints.items())
+        for (name, _), footprint in footprints:
+            if loader_name is not None and name != loader_name:
+                continue
+            total += footprint.kv
+            if not footprint.mapped:
+                total += footprint.weights
+            elif name not in mapped:
+                mapped.add(name)
+                total += footprint.weights
+        return total
+
+    @classmethod
+    def estimate_bytes(cls, loader_name: str, instances: int = 1) -> int:
+        """Expected resident size of a model with this many instances, before loading it."""
+        footprint = cls._last_footprint.get(loader_name)
+        if footprint is None:
+            return GGUF_SOURCES[loader_name].approx_mb * _MB * instances
+        copies = 1 if footprint.mapped else instances
+        return footprint.weights * copies + footprint.kv * instances
+
+    @classmethod
+    def status(cls) -> dict[str, ModelStatus]:
+        with cls._registry_lock:
+            status = dict(cls._status)
+        return {
+            name: replace(
+                model_status,
+                resident_bytes=cls.resident_bytes(name),
+                loads=cls._loads[name],
+                unloads=cls._unloads[name],
             )
-        return cls._qwen
+            for name, model_status in status.items()
+        }
+
+    @classmethod
+    def load_qwen(cls, replica: int = 0, n_threads: int | None = None, use_mmap: bool = True, use_mlock: bool = False):
+        """Loads thew Qwen 2.5 (0.5B) model. the normalization model for cleaning user queries."""
+        return cls._load("load_qwen", replica, n_threads, use_mmap, use_mlock)
 
     @classmethod
-    def load_qwen_1_5b(cls):
+    def load_qwen_1_5b(
+        cls, replica: int = 0, n_threads: int | None = None, use_mmap: bool = True, use_mlock: bool = False
+    ):
         """Loads Qwen 2.5 (1.5B) model for context adjustment."""
-        if cls._qwen_1_5b is None:
-            logger.info("Loading Qwen 2.5 1.5B (GGUF)...")
-            cls._qwen_1_5b = Llama.from_pretrained(
-                repo_id="Qwen/Qwen2.5-1.5B-Instruct-GGUF",
-                filename="*q4_k_m.gguf",
-                verbose=False,
-                n_ctx=4096
-            )
-        return cls._qwen_1_5b
+        return cls._load("load_qwen_1_5b", replica, n_threads, use_mmap, use_mlock)
 
     @classmethod
-    def load_phi(cls):
+    def load_phi(cls, replica: int = 0, n_threads: int | None = None, use_mmap: bool = True, use_mlock: bool = False):
         """Loads Phi-3.5 Mini (3.8B) model for generalization (tone stripping)."""
-        if cls._phi is None:
-            logger.info("Loading Phi-3.5 Mini (GGUF)...")
-            cls._phi = Llama.from_pretrained(
-                repo_id="bartowski/Phi-3.5-mini-instruct-GGUF",
-                filename="*Q4_K_M.gguf",
-                verbose=False,
-                n_ctx=4096
-            )
-        return cls._phi
+        return cls._load("load_phi", replica, n_threads, use_mmap, use_mlock)
 
     @classmethod
-    def load_gemma(cls):
+    def load_gemma(cls, replica: int = 0, n_threads: int | None = None, use_mmap: bool = True, use_mlock: bool = False):
         """Loads the Gemma 4 E4B model. The local model for answering queries."""
-        if cls._llama is None:
-            logger.info("Loading Gemma 4 E4B (GGUF)...")
-            cls._llama = Llama.from_pretrained(
-                repo_id="unsloth/gemma-4-E4B-it-GGUF",
-                filename="*Q4_K_M.gguf",
-                verbose=False,
-                n_ctx=8192
-            )
-        return cls._llama
+        return cls._load("load_gemma", replica, n_threads, use_mmap, use_mlock)
 
     @classmethod
-    def load_gemma_e2b(cls):
+    def load_gemma_e2b(
+        cls, replica: int = 0, n_threads: int | None = None, use_mmap: bool = True, use_mlock: bool = False
+    ):
         """Loads Gemma 4 E2B (2B) model for opinion query rewriting (normalizer v22)."""
-        if cls._gemma_e2b is None:
-            logger.info("Loading Gemma 4 E2B (GGUF) for opinion rewriting...")
-            cls._gemma_e2b = Llama.from_pretrained(
-                repo_id="unsloth/gemma-4-E2B-it-GGUF",
-                filename="*Q4_K_M.gguf",
-                verbose=False,
-                n_ctx=2048,
-            )
-        return cls._gemma_e2b
\ No newline at end of file
+        return cls._load("load_gemma_e2b", replica, n_threads, use_mmap, use_mlock)
@@ -183,6 +183,10 @@ def _postprocess(raw: str, original: str) -> str:
     return text
 
 
+# System prompt + few-shot pairs, fixed across calls (kept evaluated by local backends).
+_OPINION_PREFIX_MESSAGES = 1 + 2 * len(_FEW_SHOTS)
+
+
 def _build_opinion_messages(query: str) -> list[dict]:
     messages: list[dict] = [{"role": "system", "content": _SYSTEM_PROMPT}]
     for user_input, assistant_output in _FEW_SHOTS:
@@ -219,6 +223,8 @@ class NormalizerService:
                 messages=messages,
                 max_tokens=8,
                 temperature=0.0,
+                prefix_messages=_OPINION_PREFIX_MESSAGES,
+                role="normalize",
             )
         )
         normalized = _postprocess(raw_output, raw_query)
@@ -1,9 +1,32 @@
+"""Request and feedback log in the stats SQLite DB.
+
+Rows are buffered in memory and written in batches: one executemany per
+table in a single transaction every STATS_FLUSH_INTERVAL_MS, or sooner once
+STATS_FLUSH_ROWS are waiting. The buffer is a ring of STATS_BUFFER_SIZE rows;
+if the DB falls that far behind the oldest rows are dropped and counted.
+close() writes everything still buffered. Each batch of request rows is
+folded into the stats rollups (see stats_rollup) in the same transaction.
+"""
+
+import asyncio
 import logging
+import time
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
 import aiosqlite
 
-from app.config import STATS_DB_PATH
+from app.config import STATS_BUFFER_SIZE, STATS_DB_PATH, STATS_FLUSH_INTERVAL_MS, STATS_FLUSH_ROWS
+from app.services.latency_histogram import bin_for
+from app.services.stats_rollup import (
+    ADDED_REQUEST_COLUMNS,
+    COMPACT_STATEMENTS,
+    SCHEMA_STATEMENTS,
+    STAGE_COLUMNS,
+    TOKEN_COLUMNS,
+)
+from app.services.token_usage import TokenUsage
 
 logger = logging.getLogger("dejaq.request_logger")
 
@@ -17,9 +40,15 @@ CREATE TABLE IF NOT EXISTS requests (
     cache_hit   INTEGER NOT NULL,
     difficulty  TEXT,
     model_used  TEXT,
-    response_id TEXT
+    response_id TEXT,
+    route       TEXT,
+    {stage_columns},
+    {token_columns}
+)
+""".format(
+    stage_columns=",\n    ".join(f"{column} INTEGER" for column in STAGE_COLUMNS.values()),
+    token_columns=",\n    ".join(f"{column} {column_type}" for column, column_type in TOKEN_COLUMNS.items()),
 )
-"""
 
 _CREATE_FEEDBACK_TABLE = """
 CREATE TABLE IF NOT EXISTS feedback_log (
@@ -42,26 +71,102 @@ _CREATE_INDEXES = (
 )
 
 
+_REQUEST_COLUMNS = (
+    "ts",
+    "org",
+    "department",
+    "latency_ms",
+    "cache_hit",
+    "difficulty",
+    "model_used",
+    "response_id",
+    "route",
+    *STAGE_COLUMNS.values(),
+    *TOKEN_COLUMNS,
+)
+
+_INSERT_REQUEST = (
+    f"INSERT INTO requests ({', '.join(_REQUEST_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _REQUEST_COLUMNS)})"
+)
+
+_INSERT_FEEDBACK = (
+    "INSERT INTO feedback_log (ts, response_id, org, department, rating, comment) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+@dataclass(frozen=True)
+class RequestLoggerStats:
+    buffered: int
+    max_buffered: int
+    written: int
+    dropped: int
+    flushes: int
+    avg_batch_rows: float
+    last_flush_ms: float
+
+
 class RequestLogger:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        buffer_size: int | None = None,
+        flush_rows: int | None = None,
+        flush_interval_ms: float | None = None,
+    ) -> None:
         self._db: aiosqlite.Connection | None = None
+        self._buffer_size = buffer_size or STATS_BUFFER_SIZE
+        self._flush_rows = flush_rows or STATS_FLUSH_ROWS
+        self._flush_interval_s = (flush_interval_ms or STATS_FLUSH_INTERVAL_MS) / 1000
+        # (insert statement, row) in arrival order
+        self._buffer: deque[tuple[str, tuple]] = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._flusher: asyncio.Task | None = None
+        self._closing = False
+        self._max_buffered = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._last_flush_ms = 0.0
 
     async def init(self) -> None:
         self._db = await aiosqlite.connect(STATS_DB_PATH)
+        # WAL lets the stats readers run alongside batched writes, and with
+        # it a commit only needs to sync the log on checkpoints.
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
         await self._db.execute(_CREATE_REQUESTS_TABLE)
         await self._db.execute(_CREATE_FEEDBACK_TABLE)
         for statement in _CREATE_INDEXES:
             await self._db.execute(statement)
-        # Migrate existing requests table — add response_id if missing
+        # Migrate existing requests table — add response_id, route, stage and token columns if missing
         try:
             cols = [row[1] for row in await (await self._db.execute("PRAGMA table_info(requests)")).fetchall()]
-            if "response_id" not in cols:
-                await self._db.execute("ALTER TABLE requests ADD COLUMN response_id TEXT")
+            for column, column_type in ADDED_REQUEST_COLUMNS.items():
+                if column not in cols:
+                    await self._db.execute(f"ALTER TABLE requests ADD COLUMN {column} {column_type}")
         except Exception:
             logger.warning("Could not migrate requests table", exc_info=True)
+        await self._db.create_function("latency_bin", 1, bin_for, deterministic=True)
+        # Catches up on rows written without the logger (seeds, older versions).
+        for statement in (*SCHEMA_STATEMENTS, *COMPACT_STATEMENTS):
+            await self._db.execute(statement)
         await self._db.commit()
+        if self._flusher is None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run_flusher())
         logger.info("RequestLogger initialized at %s", STATS_DB_PATH)
 
+    def _enqueue(self, statement: str, row: tuple) -> None:
+        if len(self._buffer) >= self._buffer_size:
+            self._buffer.popleft()
+            self._dropped += 1
+        self._buffer.append((statement, row))
+        self._max_buffered = max(self._max_buffered, len(self._buffer))
+        if len(self._buffer) >= self._flush_rows and self._wakeup is not None:
+            self._wakeup.set()
+
     async def log(
         self,
         org: str,
@@ -71,19 +176,44 @@ class RequestLogger:
         difficulty: str | None,
         model_used: str | None,
         response_id: str | None = None,
+        route: str | None = None,
+        stages: dict[str, int] | None = None,
+        usage: TokenUsage | None = None,
+        saved: TokenUsage | None = None,
+        saved_model: str | None = None,
     ) -> None:
+        """Buffer one request row; it is written with the next batch.
+
+        route is how the request was answered: cache, local, external,
+        coalesced or error. stages are the PipelineTrace step timings;
+        steps not in STAGES are not stored. usage is the tokens the answer's
+        generation used; saved is the tokens (and saved_model the model) of
+        the earlier generation a cache hit or coalesced answer reused.
+        """
         if self._db is None:
             return
         ts = datetime.now(timezone.utc).isoformat()
-        try:
-            await self._db.execute(
-                "INSERT INTO requests (ts, org, department, latency_ms, cache_hit, difficulty, model_used, response_id) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (ts, org, department, latency_ms, int(cache_hit), difficulty, model_used, response_id),
-            )
-            await self._db.commit()
-        except Exception:
-            logger.exception("Failed to write request log row")
+        stages = stages or {}
+        self._enqueue(
+            _INSERT_REQUEST,
+            (
+                ts,
+                org,
+                department,
+                latency_ms,
+                int(cache_hit),
+                difficulty,
+                model_used,
+                response_id,
+                route,
+                *(stages.get(stage) for stage in STAGE_COLUMNS),
+                usage.prompt_tokens if usage is not None else None,
+                usage.completion_tokens if usage is not None else None,
+                saved.prompt_tokens if saved is not None else None,
+                saved.completion_tokens if saved is not None else None,
+                saved_model if saved is not None else None,
+            ),
+        )
 
     async def log_feedback(
         self,
@@ -93,23 +223,71 @@ class RequestLogger:
         rating: str,
         comment: str | None,
     ) -> None:
+        """Buffer one feedback row; it is written with the next batch."""
         if self._db is None:
             return
         ts = datetime.now(timezone.utc).isoformat()
+        self._enqueue(_INSERT_FEEDBACK, (ts, response_id, org, department, rating, comment))
+
+    async def _run_flusher(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write every buffered row in one transaction."""
+        if self._db is None or not self._buffer:
+            return
+        batch = list(self._buffer)
+        self._buffer.clear()
+        by_statement: dict[str, list[tuple]] = {}
+        for statement, row in batch:
+            by_statement.setdefault(statement, []).append(row)
+        started = time.perf_counter()
         try:
-            await self._db.execute(
-                "INSERT INTO feedback_log (ts, response_id, org, department, rating, comment) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (ts, response_id, org, department, rating, comment),
-            )
+            for statement, rows in by_statement.items():
+                await self._db.executemany(statement, rows)
+            if _INSERT_REQUEST in by_statement:
+                for statement in COMPACT_STATEMENTS:
+                    await self._db.execute(statement)
             await self._db.commit()
         except Exception:
-            logger.exception("Failed to write feedback log row")
+            logger.exception("Failed to write %d stats log rows", len(batch))
+            self._dropped += len(batch)
+            try:
+                await self._db.rollback()
+            except Exception:
+                pass
+            return
+        self._written += len(batch)
+        self._flushes += 1
+        self._last_flush_ms = (time.perf_counter() - started) * 1000
 
     async def close(self) -> None:
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
         if self._db is not None:
             await self._db.close()
             self._db = None
 
+    def stats(self) -> RequestLoggerStats:
+        return RequestLoggerStats(
+            buffered=len(self._buffer),
+            max_buffered=self._max_buffered,
+            written=self._written,
+            dropped=self._dropped,
+            flushes=self._flushes,
+            avg_batch_rows=(self._written / self._flushes if self._flushes else 0.0),
+            last_flush_ms=self._last_flush_ms,
+        )
+
 
 request_logger = RequestLogger()
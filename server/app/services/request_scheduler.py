@@ -0,0 +1,228 @@
+"""Priority admission for local model calls.
+
+Every backend call asks the scheduler for a slot on its lane (one lane per
+backend and model, sized to how many calls that model can serve at once).
+Waiting calls are admitted by role priority, then arrival order, so a
+user-facing adjust on a cache hit does not queue behind background
+generalization.
+
+Background roles (priority >= DEJAQ_SCHEDULER_BACKGROUND_PRIORITY) are also
+deferred while any interactive call is running or waiting, on any lane, since
+they compete for the same CPU. The total max_tokens of background calls in
+flight is capped, and a call deferred for longer than
+DEJAQ_SCHEDULER_MAX_DEFER_SECONDS goes next regardless, so background work
+cannot starve.
+
+State is guarded by a thread lock and waiters are woken on their own event
+loop, because callers outside the API loop (Celery tasks under asyncio.run)
+share the same backends.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from app import config
+
+logger = logging.getLogger("dejaq.services.request_scheduler")
+
+
+@dataclass(frozen=True)
+class RoleQueueStats:
+    priority: int
+    requests: int
+    queued: int
+    running: int
+    deferred: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    roles: dict[str, RoleQueueStats]
+    background_tokens_in_flight: int
+
+
+@dataclass
+class _Waiter:
+    role: str
+    priority: int
+    tokens: int
+    background: bool
+    seq: int
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    admitted: bool = False
+    deferred: bool = False
+
+
+@dataclass
+class _Lane:
+    capacity: int
+    running: int = 0
+    waiters: list[_Waiter] = field(default_factory=list)
+
+
+@dataclass
+class _RoleCounters:
+    requests: int = 0
+    queued: int = 0
+    running: int = 0
+    deferred: int = 0
+    wait_total_ms: float = 0.0
+    wait_max_ms: float = 0.0
+
+
+def role_priority(role: str) -> int:
+    """Configured priority of a pipeline role; unknown roles rank like generate."""
+    return config.SCHEDULER_PRIORITIES.get(role, config.SCHEDULER_PRIORITIES["generate"])
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RequestScheduler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._lanes: dict[str, _Lane] = {}
+        self._roles: dict[str, _RoleCounters] = {}
+        self._seq = itertools.count()
+        self._interactive_running = 0
+        self._background_tokens = 0
+
+    @asynccontextmanager
+    async def slot(self, lane: str, capacity: int, role: str, max_tokens: int, priority: int | None = None):
+        """Hold one of the lane's `capacity` slots for the duration of a model call."""
+        if not config.SCHEDULER_ENABLED:
+            yield
+            return
+        priority = role_priority(role) if priority is None else priority
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(
+            role=role,
+            priority=priority,
+            tokens=max(0, max_tokens),
+            background=priority >= config.SCHEDULER_BACKGROUND_PRIORITY,
+            seq=0,
+            loop=loop,
+            future=loop.create_future(),
+        )
+        with self._lock:
+            waiter.seq = next(self._seq)
+            current = self._lanes.setdefault(lane, _Lane(capacity))
+            current.capacity = max(1, capacity)
+            current.waiters.append(waiter)
+            counters = self._roles.setdefault(role, _RoleCounters())
+            counters.requests += 1
+            counters.queued += 1
+            self._dispatch()
+        try:
+            await waiter.future
+        except BaseException:
+            with self._lock:
+                if not waiter.admitted:
+                    current.waiters.remove(waiter)
+                    self._roles[role].queued -= 1
+                    waiter = None
+            if waiter is not None:
+                self._release(lane, waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(lane, waiter)
+
+    def _release(self, lane: str, waiter: _Waiter) -> None:
+        with self._lock:
+            self._lanes[lane].running -= 1
+            self._roles[waiter.role].running -= 1
+            if waiter.background:
+                self._background_tokens -= waiter.tokens
+            else:
+                self._interactive_running -= 1
+            self._dispatch()
+
+    # -- admission (called with the lock held) -------------------------------
+
+    def _interactive_waiting(self) -> bool:
+        return any(not waiter.background for lane in self._lanes.values() for waiter in lane.waiters)
+
+    def _may_start_background(self, waiter: _Waiter, now: float) -> bool:
+        if now - waiter.enqueued >= config.SCHEDULER_MAX_DEFER_SECONDS:
+            return True
+        if self._interactive_running or self._interactive_waiting():
+            return False
+        # An oversized call may still run alone.
+        budget = config.SCHEDULER_BACKGROUND_TOKENS
+        return not self._background_tokens or self._background_tokens + waiter.tokens <= budget
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        for lane in self._lanes.values():
+            while lane.running < lane.capacity and lane.waiters:
+                waiter = min(lane.waiters, key=lambda w: (w.priority, w.seq))
+                if waiter.background and not self._may_start_background(waiter, now):
+                    if not waiter.deferred:
+                        waiter.deferred = True
+                        self._roles[waiter.role].deferred += 1
+                    break
+                lane.waiters.remove(waiter)
+                self._admit(lane, waiter, now)
+
+    def _admit(self, lane: _Lane, waiter: _Waiter, now: float) -> None:
+        waiter.admitted = True
+        lane.running += 1
+        if waiter.background:
+            self._background_tokens += waiter.tokens
+        else:
+            self._interactive_running += 1
+        counters = self._roles[waiter.role]
+        counters.queued -= 1
+        counters.running += 1
+        wait_ms = (now - waiter.enqueued) * 1000
+        counters.wait_total_ms += wait_ms
+        counters.wait_max_ms = max(counters.wait_max_ms, wait_ms)
+        try:
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+        except RuntimeError:
+            # The waiter's loop has closed; nobody will use or release this slot.
+            logger.warning("Scheduler waiter loop closed; releasing slot role=%s", waiter.role)
+            lane.running -= 1
+            counters.running -= 1
+            if waiter.background:
+                self._background_tokens -= waiter.tokens
+            else:
+                self._interactive_running -= 1
+
+    def stats(self) -> SchedulerStats:
+        with self._lock:
+            roles = {
+                role: RoleQueueStats(
+                    priority=role_priority(role),
+                    requests=counters.requests,
+                    queued=counters.queued,
+                    running=counters.running,
+                    deferred=counters.deferred,
+                    avg_wait_ms=(
+                        counters.wait_total_ms / (counters.requests - counters.queued)
+                        if counters.requests > counters.queued
+                        else 0.0
+                    ),
+                    max_wait_ms=counters.wait_max_ms,
+                )
+                for role, counters in self._roles.items()
+            }
+            return SchedulerStats(roles=roles, background_tokens_in_flight=self._background_tokens)
+
+
+request_scheduler = RequestScheduler()
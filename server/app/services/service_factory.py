@@ -1,18 +1,31 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 
 from app import config
+from app.services.batched_backend import BatchedBackend, BatchedBackendStats
 from app.services.context_adjuster import ContextAdjusterService
 from app.services.context_enricher import ContextEnricherService
 from app.services.llm_router import LLMRouterService
-from app.services.model_backends import InProcessBackend, ModelBackend, OllamaBackend
+from app.services.model_backends import (
+    MODEL_RUNTIME_SPECS,
+    InProcessBackend,
+    InProcessPoolStats,
+    ModelBackend,
+    OllamaBackend,
+    OllamaPoolStats,
+)
+from app.services.model_loader import ModelManager, ModelStatus
 from app.services.normalizer import NormalizerService
 
 logger = logging.getLogger("dejaq.services.service_factory")
 
 _backend_pool: dict[str, ModelBackend] = {}
 _service_pool: dict[str, object] = {}
+_lifecycle_tasks: dict[str, asyncio.Task] = {}
+_preload_failures: list[str] = []
 
 
 def _get_backend(backend_name: str) -> ModelBackend:
@@ -23,6 +36,13 @@ def _get_backend(backend_name: str) -> ModelBackend:
     if backend_name == "in_process":
         backend = InProcessBackend()
         logger.info("Initialized model backend: in_process")
+    elif backend_name == "batched":
+        backend = BatchedBackend()
+        logger.info(
+            "Initialized model backend: batched slots=%d n_ctx=%d",
+            config.BATCHED_SLOTS,
+            config.BATCHED_N_CTX,
+        )
     elif backend_name == "ollama":
         backend = OllamaBackend(
             base_url=config.OLLAMA_URL,
@@ -40,6 +60,110 @@ def _get_backend(backend_name: str) -> ModelBackend:
     return backend
 
 
+def _role_models() -> list[tuple[str, str]]:
+    """(backend, logical model) for every configured service role."""
+    return [
+        (config.ENRICHER_BACKEND, config.ENRICHER_MODEL_NAME),
+        (config.NORMALIZER_BACKEND, config.NORMALIZER_MODEL_NAME),
+        (config.LOCAL_LLM_BACKEND, config.LOCAL_LLM_MODEL_NAME),
+        (config.GENERALIZER_BACKEND, config.GENERALIZER_MODEL_NAME),
+        (config.CONTEXT_ADJUSTER_BACKEND, config.CONTEXT_ADJUSTER_MODEL_NAME),
+    ]
+
+
+async def preload_models(model_names: list[str]) -> None:
+    """Load the listed logical models on the local backends serving them, all in parallel."""
+    targets = sorted(
+        {
+            (backend_name, model)
+            for backend_name, model in _role_models()
+            if model in model_names and backend_name != "ollama"
+        }
+    )
+    unused = sorted(set(model_names) - {model for _, model in targets})
+    if unused:
+        logger.warning("DEJAQ_MODEL_PRELOAD: no local role uses %s; skipping", ", ".join(unused))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_get_backend(backend_name).preload(model) for backend_name, model in targets),
+        return_exceptions=True,
+    )
+    for (backend_name, model), result in zip(targets, results):
+        if isinstance(result, Exception):
+            _preload_failures.append(model)
+            logger.error("Preload failed backend=%s model=%s: %s", backend_name, model, result)
+    logger.info(
+        "Model preload finished models=%d failed=%d in %.1fs",
+        len(targets),
+        len(_preload_failures),
+        time.perf_counter() - started,
+    )
+
+
+async def _unload_idle_models(max_idle_seconds: float) -> None:
+    pinned = set(config.MODEL_PRELOAD)
+    interval = min(60.0, max(1.0, max_idle_seconds / 4))
+    while True:
+        await asyncio.sleep(interval)
+        for backend in list(_backend_pool.values()):
+            if not isinstance(backend, (InProcessBackend, BatchedBackend)):
+                continue
+            try:
+                unloaded = await backend.unload_idle(max_idle_seconds, pinned)
+            except Exception:
+                logger.exception("Idle model unload failed")
+                continue
+            if unloaded:
+                logger.info("Unloaded idle models after %.0fs: %s", max_idle_seconds, ", ".join(unloaded))
+
+
+def models_ready() -> bool:
+    """True once the startup preload list is loaded (always true without one)."""
+    task = _lifecycle_tasks.get("preload")
+    return task is None or (task.done() and not _preload_failures)
+
+
+def get_model_status() -> dict[str, ModelStatus]:
+    status = ModelManager.status()
+    return {name: status[spec.loader_name] for name, spec in MODEL_RUNTIME_SPECS.items() if spec.loader_name in status}
+
+
+async def open_backends() -> None:
+    """Open pooled clients for every configured backend and start model preload/idle unload (app startup)."""
+    for backend in _backend_pool.values():
+        if isinstance(backend, OllamaBackend):
+            await backend.open()
+    if config.MODEL_PRELOAD:
+        _preload_failures.clear()
+        _lifecycle_tasks["preload"] = asyncio.create_task(preload_models(config.MODEL_PRELOAD))
+    if config.MODEL_IDLE_UNLOAD_SECONDS:
+        _lifecycle_tasks["idle_unload"] = asyncio.create_task(
+            _unload_idle_models(config.MODEL_IDLE_UNLOAD_SECONDS)
+        )
+
+
+async def close_backends() -> None:
+    """Close pooled clients and batching engines (app shutdown)."""
+    for task in _lifecycle_tasks.values():
+        task.cancel()
+    await asyncio.gather(*_lifecycle_tasks.values(), return_exceptions=True)
+    _lifecycle_tasks.clear()
+    for backend in _backend_pool.values():
+        if isinstance(backend, OllamaBackend):
+            await backend.aclose()
+        elif isinstance(backend, BatchedBackend):
+            backend.close()
+
+
+def get_backend_stats() -> dict[str, OllamaPoolStats | InProcessPoolStats | BatchedBackendStats]:
+    return {
+        name: backend.stats()
+        for name, backend in _backend_pool.items()
+        if isinstance(backend, (OllamaBackend, InProcessBackend, BatchedBackend))
+    }
+
+
 def _service_key(role: str, *parts: str) -> str:
     return ":".join((role, *parts))
 
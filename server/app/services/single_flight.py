@@ -0,0 +1,240 @@
+"""Single-flight for concurrent identical cache misses.
+
+When several requests miss the cache on the same normalized query at once,
+the first one generates the answer and the rest wait for it instead of each
+calling the (possibly paid) LLM and queueing its own store. Flights are keyed
+like cache entries (namespace + doc id of the normalized query).
+
+Within a process, followers wait on the leader's future. With the optional
+Redis tier, a leader also takes a short-lived lock key, and requests on other
+gateway replicas poll for the answer the leader publishes when it finishes.
+A follower whose leader fails or runs past the wait limit generates on its
+own; Redis errors degrade to the in-process tier.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+
+import redis as redis_lib
+
+from app import config
+
+logger = logging.getLogger("dejaq.services.single_flight")
+
+_REDIS_TIMEOUT_S = 0.05
+
+
+@dataclass(frozen=True)
+class SharedAnswer:
+    answer: str
+    # The user query the answer was written for; followers asking it
+    # differently get it adjusted like a cache hit.
+    query: str
+    model_used: str
+    # Tokens the answer's generation used; followers log them as saved.
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+@dataclass(frozen=True)
+class SingleFlightStats:
+    in_flight: int
+    leaders: int
+    followers: int
+    remote_followers: int
+    shared: int
+    fallbacks: int
+    redis_errors: int
+
+
+@dataclass
+class _LocalFlight:
+    future: Future
+    started: float
+
+
+class FlightLead:
+    """Handle of the request generating the answer for a flight; finish() exactly once (extra calls are no-ops)."""
+
+    def __init__(self, owner: SingleFlight, key: str, flight: _LocalFlight) -> None:
+        self._owner = owner
+        self.key = key
+        self._flight = flight
+        self.redis_token: str | None = None
+        self._finished = False
+
+    async def finish(self, result: SharedAnswer | None) -> None:
+        """Hand the answer (None on failure) to every waiting follower."""
+        if self._finished:
+            return
+        self._finished = True
+        await self._owner._finish(self, self._flight, result)
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        wait_seconds: float,
+        redis_url: str | None = None,
+        poll_interval_ms: float = 100.0,
+        redis_client: redis_lib.Redis | None = None,
+    ) -> None:
+        self._wait_seconds = wait_seconds
+        self._poll_s = max(0.01, poll_interval_ms / 1000)
+        self._redis_url = redis_url
+        self._redis: redis_lib.Redis | None = redis_client
+        self._lock = threading.Lock()
+        self._flights: dict[str, _LocalFlight] = {}
+        self._leaders = 0
+        self._followers = 0
+        self._remote_followers = 0
+        self._shared = 0
+        self._fallbacks = 0
+        self._redis_errors = 0
+
+    def _get_redis(self) -> redis_lib.Redis | None:
+        if self._redis is None and self._redis_url is not None:
+            self._redis = redis_lib.Redis.from_url(
+                self._redis_url,
+                decode_responses=True,
+                socket_timeout=_REDIS_TIMEOUT_S,
+                socket_connect_timeout=_REDIS_TIMEOUT_S,
+            )
+        return self._redis
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f"singleflight:{key}"
+
+    @staticmethod
+    def _answer_key(key: str) -> str:
+        return f"singleflight:{key}:answer"
+
+    async def join(self, key: str) -> tuple[FlightLead | None, SharedAnswer | None]:
+        """Lead the generation for `key`, or wait for the one in flight.
+
+        Returns (lead, None) when the caller generates and then calls
+        lead.finish(); (None, answer) when another request's answer can be
+        used; (None, None) when that request failed or took too long and the
+        caller should generate on its own.
+        """
+        now = time.monotonic()
+        with self._lock:
+            flight = self._flights.get(key)
+            # A leader that never finished (client gone before streaming
+            # started) stops blocking the key after the wait limit.
+            if flight is None or now - flight.started >= self._wait_seconds:
+                flight = _LocalFlight(Future(), now)
+                self._flights[key] = flight
+                lead = FlightLead(self, key, flight)
+            else:
+                lead = None
+                self._followers += 1
+        if lead is None:
+            return None, self._count(await self._wait(flight))
+
+        remote = await self._claim_remote(lead)
+        if remote is not None:
+            # Another replica generated it; share with local followers too.
+            await lead.finish(remote)
+            return None, self._count(remote)
+        self._leaders += 1
+        return lead, None
+
+    def _count(self, result: SharedAnswer | None) -> SharedAnswer | None:
+        if result is None:
+            self._fallbacks += 1
+        else:
+            self._shared += 1
+        return result
+
+    async def _wait(self, flight: _LocalFlight) -> SharedAnswer | None:
+        remaining = self._wait_seconds - (time.monotonic() - flight.started)
+        # asyncio.wait leaves the shared future alone on timeout, so other
+        # followers keep waiting on it.
+        waiter = asyncio.wrap_future(flight.future)
+        done, _ = await asyncio.wait({waiter}, timeout=max(0.0, remaining))
+        return waiter.result() if done else None
+
+    async def _claim_remote(self, lead: FlightLead) -> SharedAnswer | None:
+        """Take the Redis lock for the flight, or poll for the answer of the replica holding it."""
+        client = self._get_redis()
+        if client is None:
+            return None
+        token = uuid.uuid4().hex
+        lock_key, answer_key = self._lock_key(lead.key), self._answer_key(lead.key)
+        ttl_ms = int(self._wait_seconds * 1000)
+        deadline = time.monotonic() + self._wait_seconds
+        counted = False
+        try:
+            while True:
+                # The answer outlives the lock for the wait limit, so requests
+                # arriving just after the leader finished still share it.
+                payload = await asyncio.to_thread(client.get, answer_key)
+                if payload is not None:
+                    return SharedAnswer(**json.loads(payload))
+                if await asyncio.to_thread(client.set, lock_key, token, nx=True, px=ttl_ms):
+                    lead.redis_token = token
+                    return None
+                if not counted:
+                    counted = True
+                    self._remote_followers += 1
+                if time.monotonic() >= deadline:
+                    # The remote leader is stuck; generate here without the lock.
+                    return None
+                await asyncio.sleep(self._poll_s)
+        except redis_lib.exceptions.RedisError as exc:
+            self._redis_errors += 1
+            logger.warning("Single-flight Redis claim failed: %s", exc)
+            return None
+
+    async def _finish(self, lead: FlightLead, flight: _LocalFlight, result: SharedAnswer | None) -> None:
+        with self._lock:
+            if self._flights.get(lead.key) is flight:
+                del self._flights[lead.key]
+        flight.future.set_result(result)
+        client = self._get_redis()
+        if client is None or lead.redis_token is None:
+            return
+        try:
+            await asyncio.to_thread(self._publish, client, lead, result)
+        except redis_lib.exceptions.RedisError as exc:
+            self._redis_errors += 1
+            logger.warning("Single-flight Redis publish failed: %s", exc)
+
+    def _publish(self, client: redis_lib.Redis, lead: FlightLead, result: SharedAnswer | None) -> None:
+        if result is not None:
+            # The lock is left to expire: pollers read the answer first, and
+            # releasing it early could let one of them take the lock between
+            # its read and our write.
+            client.set(self._answer_key(lead.key), json.dumps(asdict(result)), ex=max(1, int(self._wait_seconds)))
+        elif client.get(self._lock_key(lead.key)) == lead.redis_token:
+            # Failed: let a waiting replica take over right away.
+            client.delete(self._lock_key(lead.key))
+
+    def stats(self) -> SingleFlightStats:
+        with self._lock:
+            in_flight = len(self._flights)
+        return SingleFlightStats(
+            in_flight=in_flight,
+            leaders=self._leaders,
+            followers=self._followers,
+            remote_followers=self._remote_followers,
+            shared=self._shared,
+            fallbacks=self._fallbacks,
+            redis_errors=self._redis_errors,
+        )
+
+
+single_flight = SingleFlight(
+    config.SINGLE_FLIGHT_WAIT_SECONDS,
+    redis_url=config.REDIS_URL if config.SINGLE_FLIGHT_REDIS else None,
+)
@@ -0,0 +1,337 @@
+"""Per-minute and per-hour rollups of the requests table.
+
+Each rollup row sums the requests of one (bucket, org, department, model):
+count, hits, latency total and difficulty counts — everything the stats
+queries need, in a form that adds up exactly across buckets. Buckets are
+ISO timestamp prefixes ("2026-04-01T13" for the hour, "2026-04-01T13:05" for
+the minute), so they compare like the raw `ts` column.
+
+Rollups are folded from the raw table by id, up to a watermark stored next
+to them: COMPACT_STATEMENTS adds every row above the watermark and moves it,
+in the caller's transaction. Readers combine the rollups with the raw rows
+above the watermark, so results match the raw table whether or not the last
+rows have been folded yet, and a row that arrives late for an old bucket is
+still counted once.
+
+Latency histograms are rolled up alongside: one row per (bucket, org,
+department, route, hit/miss, latency bin) with its count, so percentiles for
+any range come from summing bin counts instead of reading every latency. The
+bins come from latency_histogram via the latency_bin() SQL function that
+register_functions() installs on a connection. Per-stage timings (one
+nullable column per PipelineTrace stage on the request row) get histograms
+the same way, keyed by route and stage.
+
+Token counts are rolled up per (bucket, org, department, model, kind): kind
+"used" sums the tokens generated answers consumed, "saved" the tokens of the
+original generation that each cache hit or coalesced answer avoided, with
+the model that generation ran on. Rows without token counts (logged before
+token accounting, or hits on entries stored before it) are left out.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+from app.services.latency_histogram import bin_for
+from app.utils.pipeline_trace import STAGES
+
+# granularity -> (table, length of the ts prefix used as bucket)
+ROLLUPS: dict[str, tuple[str, int]] = {
+    "hour": ("request_rollup_hour", 13),
+    "minute": ("request_rollup_minute", 16),
+}
+
+_CREATE_ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket      TEXT    NOT NULL,
+    org         TEXT    NOT NULL,
+    department  TEXT    NOT NULL,
+    model_used  TEXT    NOT NULL,
+    requests    INTEGER NOT NULL,
+    hits        INTEGER NOT NULL,
+    latency_sum INTEGER NOT NULL,
+    easy        INTEGER NOT NULL,
+    hard        INTEGER NOT NULL,
+    PRIMARY KEY (bucket, org, department, model_used)
+)
+"""
+
+# granularity -> latency histogram table (same buckets as ROLLUPS)
+LATENCY_ROLLUPS: dict[str, str] = {
+    "hour": "request_latency_hour",
+    "minute": "request_latency_minute",
+}
+
+# granularity -> stage latency histogram table (same buckets as ROLLUPS)
+STAGE_ROLLUPS: dict[str, str] = {
+    "hour": "request_stage_hour",
+    "minute": "request_stage_minute",
+}
+
+# stage -> requests column holding its milliseconds (NULL when the step did not run)
+STAGE_COLUMNS: dict[str, str] = {stage: f"{stage}_ms" for stage in STAGES}
+
+# granularity -> token usage table (same buckets as ROLLUPS)
+TOKEN_ROLLUPS: dict[str, str] = {
+    "hour": "request_tokens_hour",
+    "minute": "request_tokens_minute",
+}
+
+# requests columns holding the tokens a request used and the ones it saved.
+TOKEN_COLUMNS: dict[str, str] = {
+    "prompt_tokens": "INTEGER",
+    "completion_tokens": "INTEGER",
+    "saved_prompt_tokens": "INTEGER",
+    "saved_completion_tokens": "INTEGER",
+    "saved_model": "TEXT",
+}
+
+# Columns added to the requests table after its first release, with their types.
+ADDED_REQUEST_COLUMNS: dict[str, str] = {
+    "response_id": "TEXT",
+    "route": "TEXT",
+    **{column: "INTEGER" for column in STAGE_COLUMNS.values()},
+    **TOKEN_COLUMNS,
+}
+
+# Rows logged before the route column existed: hits were served from the cache.
+_LEGACY_ROUTE_SQL = "CASE WHEN cache_hit = 1 THEN 'cache' ELSE 'unknown' END"
+ROUTE_SQL = f"COALESCE(route, {_LEGACY_ROUTE_SQL})"
+
+# One row per stage, cross-joined with requests to read the stage columns as rows.
+STAGE_LIST_SQL = "(" + " UNION ALL ".join(f"SELECT '{stage}' AS stage" for stage in STAGES) + ") AS stages"
+
+_CREATE_LATENCY_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket      TEXT    NOT NULL,
+    org         TEXT    NOT NULL,
+    department  TEXT    NOT NULL,
+    route       TEXT    NOT NULL,
+    cache_hit   INTEGER NOT NULL,
+    latency_bin INTEGER NOT NULL,
+    count       INTEGER NOT NULL,
+    PRIMARY KEY (bucket, org, department, route, cache_hit, latency_bin)
+)
+"""
+
+_CREATE_STAGE_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket      TEXT    NOT NULL,
+    org         TEXT    NOT NULL,
+    department  TEXT    NOT NULL,
+    route       TEXT    NOT NULL,
+    stage       TEXT    NOT NULL,
+    latency_bin INTEGER NOT NULL,
+    count       INTEGER NOT NULL,
+    PRIMARY KEY (bucket, org, department, route, stage, latency_bin)
+)
+"""
+
+_CREATE_TOKEN_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket            TEXT    NOT NULL,
+    org               TEXT    NOT NULL,
+    department        TEXT    NOT NULL,
+    model             TEXT    NOT NULL,
+    kind              TEXT    NOT NULL,
+    requests          INTEGER NOT NULL,
+    hits              INTEGER NOT NULL,
+    prompt_tokens     INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    PRIMARY KEY (bucket, org, department, model, kind)
+)
+"""
+
+# Request rows as (kind, model, tokens) rows: one "used" row per request with
+# token counts, one "saved" row per request that avoided a generation.
+TOKEN_ROWS_SQL = """(
+    SELECT id, ts, org, department, COALESCE(model_used, '') AS model, 'used' AS kind, cache_hit,
+           prompt_tokens, completion_tokens
+    FROM requests WHERE prompt_tokens IS NOT NULL
+    UNION ALL
+    SELECT id, ts, org, department, COALESCE(saved_model, '') AS model, 'saved' AS kind, cache_hit,
+           saved_prompt_tokens AS prompt_tokens, saved_completion_tokens AS completion_tokens
+    FROM requests WHERE saved_prompt_tokens IS NOT NULL
+) AS token_rows"""
+
+_CREATE_STATE_TABLE = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name    TEXT    PRIMARY KEY,
+    last_id INTEGER NOT NULL
+)
+"""
+
+# A NULL model is stored as '' (the stats readers drop empty model names).
+_FOLD = """
+INSERT INTO {table} (bucket, org, department, model_used, requests, hits, latency_sum, easy, hard)
+SELECT
+    substr(ts, 1, {width}),
+    org,
+    department,
+    COALESCE(model_used, ''),
+    COUNT(*),
+    SUM(cache_hit),
+    SUM(latency_ms),
+    SUM(CASE WHEN difficulty = 'easy' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN difficulty = 'hard' THEN 1 ELSE 0 END)
+FROM requests
+WHERE id > (SELECT last_id FROM rollup_state WHERE name = 'requests')
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (bucket, org, department, model_used) DO UPDATE SET
+    requests = requests + excluded.requests,
+    hits = hits + excluded.hits,
+    latency_sum = latency_sum + excluded.latency_sum,
+    easy = easy + excluded.easy,
+    hard = hard + excluded.hard
+"""
+
+_FOLD_LATENCY = """
+INSERT INTO {table} (bucket, org, department, route, cache_hit, latency_bin, count)
+SELECT
+    substr(ts, 1, {width}),
+    org,
+    department,
+    {route},
+    cache_hit,
+    latency_bin(latency_ms),
+    COUNT(*)
+FROM requests
+WHERE id > (SELECT last_id FROM rollup_state WHERE name = 'requests')
+GROUP BY 1, 2, 3, 4, 5, 6
+ON CONFLICT (bucket, org, department, route, cache_hit, latency_bin) DO UPDATE SET
+    count = count + excluded.count
+"""
+
+_FOLD_STAGES = """
+INSERT INTO {table} (bucket, org, department, route, stage, latency_bin, count)
+SELECT
+    substr(ts, 1, {width}),
+    org,
+    department,
+    {route},
+    stages.stage,
+    latency_bin({stage_ms}),
+    COUNT(*)
+FROM requests CROSS JOIN {stage_list}
+WHERE id > (SELECT last_id FROM rollup_state WHERE name = 'requests') AND {stage_ms} IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6
+ON CONFLICT (bucket, org, department, route, stage, latency_bin) DO UPDATE SET
+    count = count + excluded.count
+"""
+
+
+_FOLD_TOKENS = """
+INSERT INTO {table} (bucket, org, department, model, kind, requests, hits, prompt_tokens, completion_tokens)
+SELECT
+    substr(ts, 1, {width}),
+    org,
+    department,
+    model,
+    kind,
+    COUNT(*),
+    SUM(cache_hit),
+    SUM(prompt_tokens),
+    SUM(COALESCE(completion_tokens, 0))
+FROM {token_rows}
+WHERE id > (SELECT last_id FROM rollup_state WHERE name = 'requests')
+GROUP BY 1, 2, 3, 4, 5
+ON CONFLICT (bucket, org, department, model, kind) DO UPDATE SET
+    requests = requests + excluded.requests,
+    hits = hits + excluded.hits,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens
+"""
+
+
+def stage_ms_sql(columns: set[str] | None = None) -> str:
+    """Milliseconds of `stages.stage` for a request row; pass `columns` to skip stage columns a table lacks."""
+    whens = " ".join(
+        f"WHEN '{stage}' THEN {column}"
+        for stage, column in STAGE_COLUMNS.items()
+        if columns is None or column in columns
+    )
+    return f"CASE stages.stage {whens} END" if whens else "NULL"
+
+
+SCHEMA_STATEMENTS: tuple[str, ...] = (
+    *(_CREATE_ROLLUP_TABLE.format(table=table) for table, _ in ROLLUPS.values()),
+    *(_CREATE_LATENCY_TABLE.format(table=table) for table in LATENCY_ROLLUPS.values()),
+    *(_CREATE_STAGE_TABLE.format(table=table) for table in STAGE_ROLLUPS.values()),
+    *(_CREATE_TOKEN_TABLE.format(table=table) for table in TOKEN_ROLLUPS.values()),
+    _CREATE_STATE_TABLE,
+    "INSERT OR IGNORE INTO rollup_state (name, last_id) VALUES ('requests', 0)",
+)
+
+# Run in one transaction, after the rows they should cover are inserted.
+COMPACT_STATEMENTS: tuple[str, ...] = (
+    *(_FOLD.format(table=table, width=width) for table, width in ROLLUPS.values()),
+    *(
+        _FOLD_LATENCY.format(table=LATENCY_ROLLUPS[name], width=width, route=ROUTE_SQL)
+        for name, (_, width) in ROLLUPS.items()
+    ),
+    *(
+        _FOLD_STAGES.format(
+            table=STAGE_ROLLUPS[name],
+            width=width,
+            route=ROUTE_SQL,
+            stage_ms=stage_ms_sql(),
+            stage_list=STAGE_LIST_SQL,
+        )
+        for name, (_, width) in ROLLUPS.items()
+    ),
+    *(
+        _FOLD_TOKENS.format(table=TOKEN_ROLLUPS[name], width=width, token_rows=TOKEN_ROWS_SQL)
+        for name, (_, width) in ROLLUPS.items()
+    ),
+    "UPDATE rollup_state SET last_id = (SELECT COALESCE(MAX(id), last_id) FROM requests) WHERE name = 'requests'",
+)
+
+
+def register_functions(con: sqlite3.Connection) -> None:
+    """Install the SQL functions the rollup and stats queries use."""
+    con.create_function("latency_bin", 1, bin_for, deterministic=True)
+
+
+def request_columns(con: sqlite3.Connection) -> set[str]:
+    return {row[1] for row in con.execute("PRAGMA table_info(requests)")}
+
+
+def route_sql(columns: set[str]) -> str:
+    """Route expression for a requests table with these columns."""
+    return ROUTE_SQL if "route" in columns else _LEGACY_ROUTE_SQL
+
+
+def compact(con: sqlite3.Connection) -> None:
+    """Create the rollup tables if needed and fold every new request row into them."""
+    register_functions(con)
+    with con:
+        columns = request_columns(con)
+        for column, column_type in ADDED_REQUEST_COLUMNS.items():
+            if column not in columns:
+                con.execute(f"ALTER TABLE requests ADD COLUMN {column} {column_type}")
+        for statement in (*SCHEMA_STATEMENTS, *COMPACT_STATEMENTS):
+            con.execute(statement)
+
+
+def watermark(con: sqlite3.Connection) -> int | None:
+    """Id of the last request row folded into the rollups; None if there are no rollups."""
+    try:
+        row = con.execute("SELECT last_id FROM rollup_state WHERE name = 'requests'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row is not None else None
+
+
+def granularity_for(lower: str | None, upper: str | None) -> str | None:
+    """Coarsest rollup whose buckets line up with both ISO bounds, or None if none do."""
+    for name in ("hour", "minute"):
+        width = ROLLUPS[name][1]
+        if all(bound is None or _starts_bucket(bound, width) for bound in (lower, upper)):
+            return name
+    return None
+
+
+def _starts_bucket(bound: str, width: int) -> bool:
+    # "2026-04-01T13:00:00+00:00" starts an hour; only zero fields may follow the prefix.
+    rest = bound[width:]
+    return rest.endswith("+00:00") and not rest[: -len("+00:00")].strip(":.0")
@@ -1,4 +1,6 @@
 import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import date, datetime, time, timezone
 
 import app.config as config
@@ -8,11 +10,19 @@ from app.db.session import get_session
 from app.schemas.admin.stats import (
     DepartmentStats,
     DepartmentStatsReport,
+    LatencyPercentiles,
+    ModelTokens,
     OrgStats,
     OrgStatsReport,
+    StageStats,
+    StageStatsReport,
     StatsMetrics,
 )
+from app.services import latency_histogram, stats_rollup, token_usage
+from app.utils.pipeline_trace import STAGES
 
+# Estimate for hits without recorded tokens (logged before token accounting,
+# or on entries stored before it).
 _TOKENS_PER_HIT = 150
 
 
@@ -32,52 +42,121 @@ def _validate_range(from_date: date | None, to_date: date | None) -> tuple[str |
     return _bound(from_date), _bound(to_date)
 
 
-def _where(
-    from_date: date | None,
-    to_date: date | None,
-    extra: str | None = None,
-) -> tuple[str, list[object]]:
-    lower, upper = _validate_range(from_date, to_date)
-    clauses: list[str] = []
-    params: list[object] = []
-    if lower is not None:
-        clauses.append("ts >= ?")
-        params.append(lower)
-    if upper is not None:
-        clauses.append("ts < ?")
-        params.append(upper)
-    if extra:
-        clauses.append(extra)
-    return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
-
-
 def _models(value: str | None) -> list[str]:
     return sorted(model for model in (value or "").split(",") if model)
 
 
-def _metrics(row) -> StatsMetrics:
+# (route, cache_hit) -> {latency bin: count}
+_Histograms = dict[tuple[str, int], dict[int, int]]
+# (model, "used" | "saved") -> [requests, hits, prompt tokens, completion tokens]
+_Tokens = dict[tuple[str, str], list[int]]
+
+
+def _percentiles(counts: dict[int, int]) -> LatencyPercentiles | None:
+    values = latency_histogram.percentiles(counts)
+    if values is None:
+        return None
+    return LatencyPercentiles(requests=sum(counts.values()), **values)
+
+
+def _merge(histograms: list[dict[int, int]]) -> dict[int, int]:
+    merged: dict[int, int] = {}
+    for counts in histograms:
+        for bin_index, count in counts.items():
+            merged[bin_index] = merged.get(bin_index, 0) + count
+    return merged
+
+
+def _latency_fields(histograms: _Histograms) -> dict:
+    routes = sorted({route for route, _ in histograms})
+    by_route = {
+        route: _percentiles(_merge([counts for (name, _), counts in histograms.items() if name == route]))
+        for route in routes
+    }
+    return {
+        "hit_latency": _percentiles(_merge([counts for (_, hit), counts in histograms.items() if hit])),
+        "miss_latency": _percentiles(_merge([counts for (_, hit), counts in histograms.items() if not hit])),
+        "latency_by_route": {route: value for route, value in by_route.items() if value is not None},
+    }
+
+
+def _token_fields(tokens: _Tokens, hits: int) -> dict:
+    used = [counts for (_, kind), counts in tokens.items() if kind == "used"]
+    savings = {
+        model: ModelTokens(
+            requests=counts[0],
+            prompt_tokens=counts[2],
+            completion_tokens=counts[3],
+            cost_usd=token_usage.cost_usd(model, counts[2], counts[3]),
+        )
+        for (model, kind), counts in sorted(tokens.items())
+        if kind == "saved"
+    }
+    tokens_saved = sum(saved.prompt_tokens + saved.completion_tokens for saved in savings.values())
+    hits_with_tokens = sum(counts[1] for (_, kind), counts in tokens.items() if kind == "saved")
+    return {
+        "est_tokens_saved": tokens_saved + max(0, hits - hits_with_tokens) * _TOKENS_PER_HIT,
+        "prompt_tokens": sum(counts[2] for counts in used),
+        "completion_tokens": sum(counts[3] for counts in used),
+        "tokens_saved": tokens_saved,
+        "cost_saved_usd": sum(saved.cost_usd for saved in savings.values()),
+        "savings_by_model": savings,
+    }
+
+
+def _metrics(row, histograms: _Histograms, tokens: _Tokens) -> StatsMetrics:
+    """Build metrics from (requests, hits, latency_sum, easy, hard, models) sums."""
     requests = int(row[0] or 0)
     hits = int(row[1] or 0)
-    misses = int(row[2] or 0)
-    avg_latency = row[3]
-    easy = int(row[4] or 0)
-    hard = int(row[5] or 0)
-    models = _models(row[6])
+    latency_sum = row[2]
+    models = row[5] if isinstance(row[5], list) else _models(row[5])
     return StatsMetrics(
         requests=requests,
         hits=hits,
-        misses=misses,
+        misses=requests - hits,
         hit_rate=(hits / requests if requests else 0.0),
-        avg_latency_ms=float(avg_latency) if avg_latency is not None else None,
-        est_tokens_saved=hits * _TOKENS_PER_HIT,
-        easy_count=easy,
-        hard_count=hard,
+        avg_latency_ms=(latency_sum / requests if requests else None),
+        easy_count=int(row[3] or 0),
+        hard_count=int(row[4] or 0),
         models_used=models,
+        **_latency_fields(histograms),
+        **_token_fields(tokens, hits),
     )
 
 
-def _connect() -> sqlite3.Connection:
-    return sqlite3.connect(config.STATS_DB_PATH)
+def _total(rows, histograms: dict[str, _Histograms], tokens: dict[str, _Tokens]) -> StatsMetrics:
+    """Metrics over grouped rows (key, requests, hits, latency_sum, easy, hard, models)."""
+    models: set[str] = set()
+    merged: _Histograms = {}
+    merged_tokens: _Tokens = {}
+    for row in rows:
+        models.update(_models(row[6]))
+        for series, counts in histograms.get(row[0], {}).items():
+            merged[series] = _merge([merged.get(series, {}), counts])
+        for series, counts in tokens.get(row[0], {}).items():
+            current = merged_tokens.setdefault(series, [0, 0, 0, 0])
+            merged_tokens[series] = [a + b for a, b in zip(current, counts)]
+    sums = [sum(int(row[column] or 0) for row in rows) for column in range(1, 6)]
+    return _metrics((*sums, sorted(models)), merged, merged_tokens)
+
+
+@contextmanager
+def _snapshot() -> Iterator[sqlite3.Connection]:
+    """Connection whose reads share one snapshot.
+
+    The watermark, rollups and raw tail must agree: a logger flush folding rows
+    between two reads would otherwise count them in both the rollups and the tail.
+    """
+    con = sqlite3.connect(config.STATS_DB_PATH, isolation_level=None)
+    try:
+        stats_rollup.register_functions(con)
+        con.execute("BEGIN")
+        try:
+            yield con
+        finally:
+            con.execute("COMMIT")
+    finally:
+        con.close()
 
 
 def _org_name_map() -> dict[str, str]:
@@ -97,20 +176,135 @@ def _dept_name_map(org_slug: str) -> dict[str, str]:
     return {slug: name for slug, name in rows}
 
 
-def _aggregate_sql(where_clause: str, group_by: str = "") -> str:
-    return f"""
-        SELECT
-            COUNT(*) AS total,
-            COALESCE(SUM(cache_hit), 0) AS hits,
-            COUNT(*) - COALESCE(SUM(cache_hit), 0) AS misses,
-            AVG(latency_ms) AS avg_lat,
-            SUM(CASE WHEN difficulty = 'easy' THEN 1 ELSE 0 END) AS easy,
-            SUM(CASE WHEN difficulty = 'hard' THEN 1 ELSE 0 END) AS hard,
-            GROUP_CONCAT(DISTINCT model_used) AS models
-        FROM requests
-        {where_clause}
-        {group_by}
+def _source(
+    con: sqlite3.Connection,
+    from_date: date | None,
+    to_date: date | None,
+    org_slug: str | None,
+    rollups: dict[str, str],
+    rollup_columns: str,
+    raw_columns: str,
+    raw_from: str = "requests",
+    raw_filter: str | None = None,
+) -> tuple[str, list[object]]:
+    """Rows in range: rollup buckets plus the raw rows not folded into them yet."""
+    lower, upper = _validate_range(from_date, to_date)
+    org_filter = [("org = ?", org_slug)] if org_slug is not None else []
+    last_id = stats_rollup.watermark(con)
+    granularity = stats_rollup.granularity_for(lower, upper) if last_id is not None else None
+    parts: list[str] = []
+    params: list[object] = []
+    if granularity is not None:
+        width = stats_rollup.ROLLUPS[granularity][1]
+        clauses = [("bucket >= ?", lower[:width])] if lower is not None else []
+        clauses += [("bucket < ?", upper[:width])] if upper is not None else []
+        clauses += org_filter
+        parts.append(f"SELECT {rollup_columns} FROM {rollups[granularity]}" + _clauses(clauses, params))
+    clauses = [("id > ?", last_id)] if granularity is not None else []
+    clauses += [("ts >= ?", lower)] if lower is not None else []
+    clauses += [("ts < ?", upper)] if upper is not None else []
+    clauses += org_filter
+    parts.append(f"SELECT {raw_columns} FROM {raw_from}" + _clauses(clauses, params) + _and(raw_filter, clauses))
+    return " UNION ALL ".join(parts), params
+
+
+def _clauses(clauses: list[tuple[str, object]], params: list[object]) -> str:
+    params.extend(value for _, value in clauses)
+    return " WHERE " + " AND ".join(clause for clause, _ in clauses) if clauses else ""
+
+
+def _and(condition: str | None, clauses: list) -> str:
+    if condition is None:
+        return ""
+    return f" AND {condition}" if clauses else f" WHERE {condition}"
+
+
+def _grouped(
+    key: str,
+    from_date: date | None,
+    to_date: date | None,
+    org_slug: str | None = None,
+) -> tuple[list[tuple], dict[str, _Histograms], dict[str, _Tokens]]:
+    """Rows of (key, requests, hits, latency_sum, easy, hard, models) ordered by key.
+
+    Also returns the latency histograms and token counts of each key.
     """
+    with _snapshot() as con:
+        columns = stats_rollup.request_columns(con)
+        source, params = _source(
+            con,
+            from_date,
+            to_date,
+            org_slug,
+            {name: table for name, (table, _) in stats_rollup.ROLLUPS.items()},
+            "org, department, model_used, requests, hits, latency_sum, easy, hard",
+            "org, department, COALESCE(model_used, '') AS model_used, 1 AS requests, cache_hit AS hits, "
+            "latency_ms AS latency_sum, CASE WHEN difficulty = 'easy' THEN 1 ELSE 0 END AS easy, "
+            "CASE WHEN difficulty = 'hard' THEN 1 ELSE 0 END AS hard",
+        )
+        rows = con.execute(
+            f"""
+            SELECT
+                {key},
+                SUM(requests),
+                SUM(hits),
+                SUM(latency_sum),
+                SUM(easy),
+                SUM(hard),
+                GROUP_CONCAT(DISTINCT model_used)
+            FROM ({source})
+            GROUP BY {key}
+            ORDER BY {key}
+            """,
+            params,
+        ).fetchall()
+        source, params = _source(
+            con,
+            from_date,
+            to_date,
+            org_slug,
+            stats_rollup.LATENCY_ROLLUPS,
+            "org, department, route, cache_hit, latency_bin, count",
+            f"org, department, {stats_rollup.route_sql(columns)} AS route, cache_hit, "
+            "latency_bin(latency_ms) AS latency_bin, 1 AS count",
+        )
+        bins = con.execute(
+            f"""
+            SELECT {key}, route, cache_hit, latency_bin, SUM(count)
+            FROM ({source})
+            GROUP BY {key}, route, cache_hit, latency_bin
+            """,
+            params,
+        ).fetchall()
+        token_rows = []
+        # Tables from before token accounting have no token columns (nor rows to count).
+        if set(stats_rollup.TOKEN_COLUMNS) <= columns:
+            source, params = _source(
+                con,
+                from_date,
+                to_date,
+                org_slug,
+                stats_rollup.TOKEN_ROLLUPS,
+                "org, department, model, kind, requests, hits, prompt_tokens, completion_tokens",
+                "org, department, model, kind, 1 AS requests, cache_hit AS hits, prompt_tokens, "
+                "COALESCE(completion_tokens, 0) AS completion_tokens",
+                raw_from=stats_rollup.TOKEN_ROWS_SQL,
+            )
+            token_rows = con.execute(
+                f"""
+                SELECT {key}, model, kind, SUM(requests), SUM(hits), SUM(prompt_tokens), SUM(completion_tokens)
+                FROM ({source})
+                GROUP BY {key}, model, kind
+                """,
+                params,
+            ).fetchall()
+    histograms: dict[str, _Histograms] = {}
+    for group, route, hit, bin_index, count in bins:
+        histograms.setdefault(group, {}).setdefault((route, int(hit)), {})[bin_index] = count
+    tokens: dict[str, _Tokens] = {}
+    for group, model, kind, *counts in token_rows:
+        tokens.setdefault(group, {})[(model, kind)] = [int(count or 0) for count in counts]
+    return rows, histograms, tokens
 
 
 def org_stats(
@@ -119,69 +313,16 @@ def org_stats(
     accessible_org_slugs: set[str] | None = None,
 ) -> OrgStatsReport:
     """Return per-org stats. Pass accessible_org_slugs=None for system/full access."""
-    where_clause, params = _where(from_date, to_date)
+    rows, histograms, tokens = _grouped("org", from_date, to_date)
+    if accessible_org_slugs is not None:
+        rows = [row for row in rows if row[0] in accessible_org_slugs]
     name_map = _org_name_map()
-    with _connect() as con:
-        rows = con.execute(
-            f"""
-            SELECT
-                org,
-                COUNT(*) AS total,
-                COALESCE(SUM(cache_hit), 0) AS hits,
-                COUNT(*) - COALESCE(SUM(cache_hit), 0) AS misses,
-                AVG(latency_ms) AS avg_lat,
-                SUM(CASE WHEN difficulty = 'easy' THEN 1 ELSE 0 END) AS easy,
-                SUM(CASE WHEN difficulty = 'hard' THEN 1 ELSE 0 END) AS hard,
-                GROUP_CONCAT(DISTINCT model_used) AS models
-            FROM requests
-            {where_clause}
-            GROUP BY org
-            ORDER BY org
-            """,
-            params,
-        ).fetchall()
-        total_row = con.execute(_aggregate_sql(where_clause), params).fetchone()
-
     items = []
-    total_items = []
     for row in rows:
         slug = row[0]
-        if accessible_org_slugs is not None and slug not in accessible_org_slugs:
-            continue
-        metrics = _metrics(row[1:])
+        metrics = _metrics(row[1:], histograms.get(slug, {}), tokens.get(slug, {}))
         items.append(OrgStats(org=slug, org_name=name_map.get(slug, slug), **metrics.model_dump()))
-        total_items.append(metrics)
-
-    if accessible_org_slugs is not None:
-        # Recompute total from visible rows only
-        if not total_items:
-            agg_total = StatsMetrics(
-                requests=0, hits=0, misses=0, hit_rate=0.0,
-                avg_latency_ms=None, est_tokens_saved=0,
-                easy_count=0, hard_count=0, models_used=[],
-            )
-        else:
-            total_requests = sum(m.requests for m in total_items)
-            total_hits = sum(m.hits for m in total_items)
-            total_misses = sum(m.misses for m in total_items)
-            latencies = [m.avg_latency_ms for m in total_items if m.avg_latency_ms is not None]
-            all_models: set[str] = set()
-            for m in total_items:
-                all_models.update(m.models_used)
-            agg_total = StatsMetrics(
-                requests=total_requests,
-                hits=total_hits,
-                misses=total_misses,
-                hit_rate=total_hits / total_requests if total_requests else 0.0,
-                avg_latency_ms=sum(latencies) / len(latencies) if latencies else None,
-                est_tokens_saved=total_hits * _TOKENS_PER_HIT,
-                easy_count=sum(m.easy_count for m in total_items),
-                hard_count=sum(m.hard_count for m in total_items),
-                models_used=sorted(all_models),
-            )
-        return OrgStatsReport(items=items, total=agg_total)
-
-    return OrgStatsReport(items=items, total=_metrics(total_row))
+    return OrgStatsReport(items=items, total=_total(rows, histograms, tokens))
 
 
 def department_stats(
@@ -189,36 +330,14 @@ def department_stats(
     from_date: date | None = None,
     to_date: date | None = None,
 ) -> DepartmentStatsReport:
-    where_clause, params = _where(from_date, to_date, "org = ?")
-    params.append(org_slug)
-    with _connect() as con:
-        rows = con.execute(
-            f"""
-            SELECT
-                department,
-                COUNT(*) AS total,
-                COALESCE(SUM(cache_hit), 0) AS hits,
-                COUNT(*) - COALESCE(SUM(cache_hit), 0) AS misses,
-                AVG(latency_ms) AS avg_lat,
-                SUM(CASE WHEN difficulty = 'easy' THEN 1 ELSE 0 END) AS easy,
-                SUM(CASE WHEN difficulty = 'hard' THEN 1 ELSE 0 END) AS hard,
-                GROUP_CONCAT(DISTINCT model_used) AS models
-            FROM requests
-            {where_clause}
-            GROUP BY department
-            ORDER BY department
-            """,
-            params,
-        ).fetchall()
-        total_row = con.execute(_aggregate_sql(where_clause), params).fetchone()
-
+    rows, histograms, tokens = _grouped("department", from_date, to_date, org_slug)
     dept_name_map = _dept_name_map(org_slug)
     items = []
     for row in rows:
         slug = row[0]
         if slug not in dept_name_map:
             continue
-        metrics = _metrics(row[1:])
+        metrics = _metrics(row[1:], histograms.get(slug, {}), tokens.get(slug, {}))
         items.append(
             DepartmentStats(
                 org=org_slug,
@@ -227,4 +346,48 @@ def department_stats(
                 **metrics.model_dump(),
             )
         )
-    return DepartmentStatsReport(org=org_slug, items=items, total=_metrics(total_row))
+    return DepartmentStatsReport(org=org_slug, items=items, total=_total(rows, histograms, tokens))
+
+
+def stage_stats(
+    from_date: date | None = None,
+    to_date: date | None = None,
+    accessible_org_slugs: set[str] | None = None,
+) -> StageStatsReport:
+    """Latency distribution of each pipeline stage per org and route."""
+    with _snapshot() as con:
+        columns = stats_rollup.request_columns(con)
+        stage_ms = stats_rollup.stage_ms_sql(columns)
+        source, params = _source(
+            con,
+            from_date,
+            to_date,
+            None,
+            stats_rollup.STAGE_ROLLUPS,
+            "org, route, stage, latency_bin, count",
+            f"org, {stats_rollup.route_sql(columns)} AS route, stages.stage AS stage, "
+            f"latency_bin({stage_ms}) AS latency_bin, 1 AS count",
+            raw_from=f"requests CROSS JOIN {stats_rollup.STAGE_LIST_SQL}",
+            raw_filter=f"{stage_ms} IS NOT NULL",
+        )
+        bins = con.execute(
+            f"""
+            SELECT org, route, stage, latency_bin, SUM(count)
+            FROM ({source})
+            GROUP BY org, route, stage, latency_bin
+            """,
+            params,
+        ).fetchall()
+    histograms: dict[tuple[str, str, str], dict[int, int]] = {}
+    for org, route, stage, bin_index, count in bins:
+        if accessible_org_slugs is not None and org not in accessible_org_slugs:
+            continue
+        histograms.setdefault((org, route, stage), {})[bin_index] = count
+    order = {stage: index for index, stage in enumerate(STAGES)}
+    items = [
+        StageStats(org=org, route=route, stage=stage, **_percentiles(counts).model_dump())
+        for (org, route, stage), counts in sorted(
+            histograms.items(), key=lambda item: (item[0][0], item[0][1], order.get(item[0][2], len(order)))
+        )
+    ]
+    return StageStatsReport(items=items)
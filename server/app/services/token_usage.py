@@ -0,0 +1,67 @@
+"""Token usage of the model calls made while serving one request.
+
+The gateway binds a UsageMeter to the request's context; model backends and
+provider clients record what each call actually consumed (the local
+tokenizer's counts, or the provider's reported usage) under the call's
+pipeline role. Recording is a no-op outside a metered request, so
+background work such as generalize-and-store is not attributed to anyone.
+Streams record when they finish, in the context of the code consuming them.
+"""
+
+from __future__ import annotations
+
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+
+from app import config
+
+
+@dataclass(frozen=True)
+class TokenUsage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageMeter:
+    """Summed token usage of one request's model calls, by pipeline role."""
+
+    def __init__(self) -> None:
+        self._usage: dict[str, TokenUsage] = {}
+
+    def add(self, role: str, usage: TokenUsage) -> None:
+        current = self._usage.get(role, TokenUsage())
+        self._usage[role] = TokenUsage(
+            current.prompt_tokens + usage.prompt_tokens,
+            current.completion_tokens + usage.completion_tokens,
+        )
+
+    def get(self, role: str) -> TokenUsage | None:
+        return self._usage.get(role)
+
+
+_meter: ContextVar[UsageMeter | None] = ContextVar("dejaq_usage_meter", default=None)
+
+
+def bind_usage(meter: UsageMeter) -> Token[UsageMeter | None]:
+    return _meter.set(meter)
+
+
+def clear_usage(token: Token[UsageMeter | None]) -> None:
+    _meter.reset(token)
+
+
+def record(role: str, prompt_tokens: int | None, completion_tokens: int | None) -> None:
+    """Add a model call's token counts to the current request's meter, if any."""
+    meter = _meter.get()
+    if meter is not None:
+        meter.add(role, TokenUsage(int(prompt_tokens or 0), int(completion_tokens or 0)))
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Price of the tokens under DEJAQ_MODEL_PRICES; 0 for unlisted models."""
+    prompt_price, completion_price = config.MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
@@ -10,6 +10,8 @@ from app.config import REDIS_URL, EVICTION_FLOOR
 from app.services.context_adjuster import ContextAdjusterService
 from app.services.memory_chromaDB import get_memory_service, _pool
 from app.services.service_factory import get_context_adjuster_service
+from app.services.token_usage import TokenUsage
+from app.utils.embedding_codec import decode_embedding
 
 logger = logging.getLogger("dejaq.tasks.cache")
 
@@ -50,6 +52,16 @@ def _run_async_in_worker(coro):
     return _worker_loop.run_until_complete(coro)
 
 
+def _decode_task_embedding(payload: str | None, doc_id: str) -> list[float] | None:
+    if not payload:
+        return None
+    try:
+        return decode_embedding(payload)
+    except ValueError:
+        logger.warning("cache_store embedding_payload=invalid doc_id=%s; re-embedding", doc_id)
+        return None
+
+
 @celery_app.task(
     name="app.tasks.cache_tasks.generalize_and_store_task",
     bind=True,
@@ -65,11 +77,19 @@ def generalize_and_store_task(
     user_id: str,
     cache_namespace: str = "dejaq_default",
     model_profile: str = "default",
+    query_embedding: str | None = None,
+    prompt_tokens: int | None = None,
+    completion_tokens: int | None = None,
+    model_used: str | None = None,
 ) -> dict:
     """Generalize an LLM answer (via Phi-3.5) and store in ChromaDB cache.
 
     All arguments are plain strings — no model objects or unpickleable data.
     cache_namespace selects the ChromaDB collection (department isolation).
+    query_embedding is an optional base64 payload from embedding_codec; when
+    present the worker stores it as-is and never loads the embedder.
+    prompt_tokens/completion_tokens/model_used describe the answer's
+    generation and are kept on the entry to report what its hits save.
     """
     start = time.perf_counter()
     doc_id = hashlib.sha256(clean_query.encode()).hexdigest()[:16]
@@ -83,7 +103,15 @@ def generalize_and_store_task(
         context_adjuster = _get_adjuster(resolved_model_profile)
         memory = get_memory_service(cache_namespace)
         generalized = _run_async_in_worker(context_adjuster.generalize(answer))
-        doc_id = memory.store_interaction(clean_query, generalized, original_query, user_id)
+        doc_id = memory.store_interaction(
+            clean_query,
+            generalized,
+            original_query,
+            user_id,
+            embedding=_decode_task_embedding(query_embedding, doc_id),
+            usage=TokenUsage(prompt_tokens, completion_tokens or 0) if prompt_tokens is not None else None,
+            model_used=model_used,
+        )
         latency_ms = int((time.perf_counter() - start) * 1000)
         logger.info(
             "cache_store status=stored namespace=%s doc_id=%s latency=%dms",
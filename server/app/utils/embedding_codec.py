@@ -0,0 +1,32 @@
+"""Compact, JSON-safe encoding for query embeddings sent to Celery workers.
+
+Payloads look like ``"f16:<base64>"`` or ``"f32:<base64>"`` so the worker can
+decode without knowing which format the API process was configured with.
+"""
+
+from __future__ import annotations
+
+import base64
+from typing import Sequence
+
+import numpy as np
+
+EMBEDDING_FORMATS = {"float16": "f16", "float32": "f32"}
+_DTYPES = {"f16": np.dtype("<f2"), "f32": np.dtype("<f4")}
+
+
+def encode_embedding(vector: Sequence[float], fmt: str = "float32") -> str:
+    try:
+        tag = EMBEDDING_FORMATS[fmt]
+    except KeyError as exc:
+        raise ValueError(f"Unsupported embedding format: {fmt}") from exc
+    raw = np.asarray(vector, dtype=_DTYPES[tag]).tobytes()
+    return f"{tag}:{base64.b64encode(raw).decode('ascii')}"
+
+
+def decode_embedding(payload: str) -> list[float]:
+    tag, sep, body = payload.partition(":")
+    if not sep or tag not in _DTYPES:
+        raise ValueError("Malformed embedding payload")
+    values = np.frombuffer(base64.b64decode(body), dtype=_DTYPES[tag])
+    return values.astype(np.float32).tolist()
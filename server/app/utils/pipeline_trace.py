@@ -5,6 +5,26 @@ from contextlib import contextmanager
 from dataclasses import dataclass, field
 from typing import Iterator
 
+# Steps the gateway traces, in pipeline order; each is stored with the request
+# log row (see request_logger). first_token is the time to the first streamed
+# token within generate.
+STAGES: tuple[str, ...] = (
+    "enrich",
+    "normalize",
+    "cache",
+    "adjust",
+    "filter",
+    "single_flight",
+    "llm_config",
+    "llm_config_wait",
+    "credentials",
+    "classify",
+    "classify_wait",
+    "generate",
+    "first_token",
+    "store",
+)
+
 
 @dataclass
 class PipelineTrace:
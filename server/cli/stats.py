@@ -11,9 +11,6 @@ from rich import box
 
 from app.services import stats_service
 
-_TOKENS_PER_HIT = 150
-
-
 def _style(hit_rate: float) -> str:
     return "green" if hit_rate >= 0.5 else "yellow"
 
@@ -30,6 +27,10 @@ def _fmt_latency(avg: float | None) -> str:
     return f"{avg:.0f} ms"
 
 
+def _fmt_cost(usd: float) -> str:
+    return f"${usd:,.4f}" if usd else "—"
+
+
 def run() -> None:
     db_path = os.getenv("DEJAQ_STATS_DB", "dejaq_stats.db")
 
@@ -100,16 +101,97 @@ def run() -> None:
     console = Console()
     console.print(table)
     console.print()
+    _print_savings(console, org_report.items)
+    _print_stage_stats(console, stats_service.stage_stats())
     _print_cache_health(console, db_path)
 
 
+def _print_savings(console: Console, orgs) -> None:
+    """Print the recorded tokens cache hits saved, per org and model."""
+    rows = [(org.org, model, saved) for org in orgs for model, saved in org.savings_by_model.items()]
+    if not rows:
+        return
+    table = Table(
+        title="[bold]Tokens Saved by Model[/bold]",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+    )
+    table.add_column("Org", style="dim")
+    table.add_column("Model")
+    table.add_column("Answers Reused", justify="right")
+    table.add_column("Prompt Tokens", justify="right")
+    table.add_column("Completion Tokens", justify="right")
+    table.add_column("Cost Saved", justify="right")
+    for org, model, saved in rows:
+        table.add_row(
+            org,
+            model or "—",
+            str(saved.requests),
+            f"{saved.prompt_tokens:,}",
+            f"{saved.completion_tokens:,}",
+            _fmt_cost(saved.cost_usd),
+        )
+    console.print(table)
+    console.print()
+
+
+def _print_stage_stats(console: Console, report) -> None:
+    """Print per-stage latency percentiles for each org and route."""
+    if not report.items:
+        return
+    table = Table(
+        title="[bold]Pipeline Stage Latency[/bold]",
+        box=box.ROUNDED,
+        header_style="bold cyan",
+    )
+    table.add_column("Org", style="dim")
+    table.add_column("Route")
+    table.add_column("Stage")
+    table.add_column("Requests", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p90", justify="right")
+    table.add_column("p99", justify="right")
+
+    previous = None
+    for row in report.items:
+        if previous is not None and (row.org, row.route) != previous:
+            table.add_section()
+        previous = (row.org, row.route)
+        table.add_row(
+            row.org,
+            row.route,
+            row.stage,
+            str(row.requests),
+            _fmt_latency(row.p50_ms),
+            _fmt_latency(row.p90_ms),
+            _fmt_latency(row.p99_ms),
+        )
+    console.print(table)
+    console.print()
+
+
+def _cache_collections(cache_store: str) -> list:
+    """Open every cache namespace on the configured store (Chroma server or local files)."""
+    if cache_store == "local":
+        from app.config import LOCAL_STORE_DIR
+        from app.services.cache_store import LocalVectorStore, list_local_namespaces
+        from app.services.memory_chromaDB import EMBEDDING_DIM
+        return [
+            LocalVectorStore(namespace, LOCAL_STORE_DIR, EMBEDDING_DIM)
+            for namespace in list_local_namespaces(LOCAL_STORE_DIR)
+        ]
+
+    import chromadb
+    from app.config import CHROMA_HOST, CHROMA_PORT
+    client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    return [client.get_collection(col.name) for col in client.list_collections()]
+
+
 def _print_cache_health(console: Console, db_path: str) -> None:
     """Print a Cache Health panel showing score distribution across cached entries."""
     try:
-        import chromadb
-        from app.config import CHROMA_HOST, CHROMA_PORT, EVICTION_FLOOR
-        client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        collections = client.list_collections()
+        from app.config import CACHE_STORE, EVICTION_FLOOR
+        collections = _cache_collections(CACHE_STORE)
     except Exception as exc:
         console.print(f"[dim]Cache Health unavailable: {exc}[/dim]")
         return
@@ -120,9 +202,8 @@ def _print_cache_health(console: Console, db_path: str) -> None:
     negative = 0
     below_floor = 0
 
-    for col in collections:
+    for collection in collections:
         try:
-            collection = client.get_collection(col.name)
             results = collection.get(include=["metadatas"])
             for meta in (results["metadatas"] or []):
                 score = float(meta.get("score", 0.0))
@@ -4,7 +4,10 @@ import argparse
 import asyncio
 import statistics
 import time
+from dataclasses import asdict
 
+from app import config
+from app.services.batched_backend import BatchedBackend
 from app.services.model_backends import CompletionRequest, InProcessBackend, OllamaBackend
 
 
@@ -25,7 +28,13 @@ async def _run_once(backend, request: CompletionRequest, concurrency: int) -> fl
 
 async def _benchmark(args: argparse.Namespace) -> int:
     if args.backend == "in_process":
+        if args.replicas is not None:
+            config.LLAMA_REPLICAS_BY_MODEL[args.model] = max(1, args.replicas)
+        if args.threads_per_replica is not None:
+            config.LLAMA_THREADS_PER_REPLICA = max(0, args.threads_per_replica)
         backend = InProcessBackend()
+    elif args.backend == "batched":
+        backend = BatchedBackend(slots=args.concurrency)
     else:
         backend = OllamaBackend(
             base_url=args.ollama_url,
@@ -64,6 +73,11 @@ async def _benchmark(args: argparse.Namespace) -> int:
     print(f"ratio_vs_single={ratio_vs_single:.2f}x")
     print(f"ratio_vs_serial={ratio_vs_serial:.2f}")
     print(f"threshold_ratio_vs_serial={args.max_serial_ratio:.2f}")
+    if isinstance(backend, (InProcessBackend, BatchedBackend)):
+        pool = backend.stats().models.get(args.model)
+        if pool is not None:
+            for key, value in asdict(pool).items():
+                print(f"pool_{key}={value:.1f}" if isinstance(value, float) else f"pool_{key}={value}")
     print(f"result={'PASS' if passed else 'FAIL'}")
 
     return 0 if passed else 1
@@ -73,7 +87,7 @@ def main() -> int:
     parser = argparse.ArgumentParser(
         description="Benchmark backend concurrency by comparing one request vs N concurrent requests."
     )
-    parser.add_argument("--backend", choices=("in_process", "ollama"), required=True)
+    parser.add_argument("--backend", choices=("in_process", "batched", "ollama"), required=True)
     parser.add_argument("--model", required=True, help="Logical model name, e.g. qwen_0_5b or gemma_local")
     parser.add_argument("--prompt", default="What is the capital of France?")
     parser.add_argument("--concurrency", type=int, default=10)
@@ -81,6 +95,18 @@ def main() -> int:
     parser.add_argument("--warmup", type=int, default=1)
     parser.add_argument("--max-tokens", type=int, default=64)
     parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument(
+        "--replicas",
+        type=int,
+        default=None,
+        help="in_process only: Llama replicas for --model (default: DEJAQ_LLAMA_REPLICAS[_BY_MODEL]).",
+    )
+    parser.add_argument(
+        "--threads-per-replica",
+        type=int,
+        default=None,
+        help="in_process only: n_threads per replica, 0 = split physical cores (default: DEJAQ_LLAMA_THREADS_PER_REPLICA).",
+    )
     parser.add_argument("--ollama-url", default="http://127.0.0.1:11434")
     parser.add_argument("--timeout", type=float, default=60.0)
     parser.add_argument(
@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from pathlib import Path
 
 import pytest
+import redis as redis_lib
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
 
@@ -27,6 +28,67 @@ def memory_service():
     return MemoryService(collection_name="test_collection")
 
 
+class FakeRedis:
+    """In-memory stand-in for the few Redis commands the shared cache tiers use.
+
+    Set ``fail`` to make every command raise like an unreachable server.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, str] = {}
+        self.fail = False
+
+    def _check(self) -> None:
+        if self.fail:
+            raise redis_lib.exceptions.ConnectionError("down")
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        self._check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self._check()
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value)
+        return value
+
+    def delete(self, key):
+        self._check()
+        self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client: FakeRedis) -> None:
+        self.client = client
+        self.pending: list[tuple[str, str]] = []
+
+    def set(self, key, value, ex=None):
+        self.pending.append((key, value))
+
+    def execute(self):
+        self.client._check()
+        self.client.data.update(self.pending)
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    return FakeRedis()
+
+
 # ── Model-backed fixtures (session-scoped — load once) ──
 
 @pytest.fixture(scope="session")
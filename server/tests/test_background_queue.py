@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.services.background_queue import BackgroundWorkQueue
+
+pytestmark = pytest.mark.no_model
+
+
+def _job(ran: list[str], label: str, gate: asyncio.Event | None = None):
+    async def run() -> None:
+        if gate is not None:
+            await gate.wait()
+        ran.append(label)
+
+    return run
+
+
+def test_full_queue_drops_new_jobs_and_coalesces_duplicates():
+    queue = BackgroundWorkQueue(capacity=2, workers=1, policy="drop_new")
+    ran: list[str] = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        results = [await queue.submit("a", _job(ran, "a", gate))]
+        await asyncio.sleep(0)  # the worker takes "a" and blocks on the gate
+        results.append(await queue.submit("b", _job(ran, "b-old")))
+        results.append(await queue.submit("c", _job(ran, "c")))
+        results.append(await queue.submit("b", _job(ran, "b-new")))
+        results.append(await queue.submit("d", _job(ran, "d")))
+        gate.set()
+        await queue.close(timeout=1)
+        return results
+
+    results = asyncio.run(scenario())
+    stats = queue.stats()
+
+    assert results == ["queued", "queued", "queued", "coalesced", "dropped"]
+    assert ran == ["a", "b-new", "c"]
+    assert (stats.submitted, stats.coalesced, stats.dropped, stats.completed) == (3, 1, 1, 3)
+    assert (stats.depth, stats.max_depth, stats.in_flight) == (0, 2, 0)
+
+
+def test_drop_oldest_policy_keeps_newest_jobs():
+    queue = BackgroundWorkQueue(capacity=1, workers=1, policy="drop_oldest")
+    ran: list[str] = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        await queue.submit("a", _job(ran, "a", gate))
+        await asyncio.sleep(0)
+        await queue.submit("b", _job(ran, "b"))
+        assert await queue.submit("c", _job(ran, "c")) == "queued"
+        gate.set()
+        await queue.close(timeout=1)
+
+    asyncio.run(scenario())
+
+    assert ran == ["a", "c"]
+    assert queue.stats().dropped == 1
+
+
+def test_wait_policy_applies_backpressure_until_room_or_timeout():
+    queue = BackgroundWorkQueue(capacity=1, workers=1, policy="wait", wait_seconds=0.05)
+    ran: list[str] = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        await queue.submit("a", _job(ran, "a", gate))
+        await asyncio.sleep(0)
+        await queue.submit("b", _job(ran, "b"))
+        timed_out = await queue.submit("c", _job(ran, "c"))
+        asyncio.get_running_loop().call_later(0.01, gate.set)
+        admitted = await queue.submit("d", _job(ran, "d"))
+        await queue.close(timeout=1)
+        return timed_out, admitted
+
+    assert asyncio.run(scenario()) == ("dropped", "queued")
+    assert ran == ["a", "b", "d"]
+
+
+def test_close_drains_queued_jobs_and_counts_failures():
+    queue = BackgroundWorkQueue(capacity=8, workers=2)
+    ran: list[str] = []
+
+    async def broken() -> None:
+        raise RuntimeError("store failed")
+
+    async def scenario():
+        for label in ("a", "b", "c"):
+            await queue.submit(label, _job(ran, label))
+        await queue.submit("x", broken)
+        await queue.close(timeout=1)
+
+    asyncio.run(scenario())
+    stats = queue.stats()
+
+    assert sorted(ran) == ["a", "b", "c"]
+    assert (stats.completed, stats.failed, stats.depth) == (3, 1, 0)
+
+
+def test_close_gives_up_after_timeout():
+    queue = BackgroundWorkQueue(capacity=8, workers=1)
+
+    async def scenario():
+        await queue.submit("slow", asyncio.Event().wait)
+        await queue.submit("queued", asyncio.Event().wait)
+        await asyncio.sleep(0)
+        await queue.close(timeout=0.05)
+
+    asyncio.run(scenario())
+
+    assert queue.stats().dropped == 1
@@ -0,0 +1,208 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.batched_backend import BatchedBackend, _BatchEngine
+from app.services.model_backends import CompletionRequest
+
+pytestmark = pytest.mark.no_model
+
+EOG = 0
+
+
+class FakeRuntime:
+    """Scripted stand-in for _LlamaRuntime: a prompt's text selects its reply pieces."""
+
+    def __init__(self, scripts: dict[str, list[str]], n_ctx: int = 256, n_batch: int = 64, step_delay: float = 0.0):
+        self.scripts = scripts
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.step_delay = step_delay
+        self.vocab: list[str] = ["<eog>"]
+        self.batches: list[list[tuple[int, int, int, bool]]] = []
+        self.prompts: dict[int, str] = {}
+        self.sampled: dict[int, int] = {}
+        self.ended: list[int] = []
+        self.closed = False
+
+    def prompt(self, messages):
+        return [ord(c) for c in messages[-1]["content"]], ["<end>"]
+
+    def start_sequence(self, seq, temperature):
+        self.prompts[seq] = ""
+        self.sampled[seq] = 0
+
+    def decode(self, entries):
+        if self.step_delay:
+            threading.Event().wait(self.step_delay)
+        self.batches.append(list(entries))
+        for token, pos, seq, _ in entries:
+            if pos == len(self.prompts[seq]):
+                self.prompts[seq] += chr(token)
+
+    def sample(self, seq, batch_index):
+        reply = self.scripts[self.prompts[seq][: self._prompt_len(seq)]]
+        index = self.sampled[seq]
+        self.sampled[seq] += 1
+        if index >= len(reply):
+            return EOG
+        self.vocab.append(reply[index])
+        return len(self.vocab) - 1
+
+    def _prompt_len(self, seq):
+        return next(len(text) for text in self.scripts if self.prompts[seq].startswith(text))
+
+    def is_eog(self, token):
+        return token == EOG
+
+    def piece(self, token):
+        return self.vocab[token].encode()
+
+    def end_sequence(self, seq):
+        self.ended.append(seq)
+
+    def close(self):
+        self.closed = True
+
+
+def _backend(runtime: FakeRuntime, slots: int = 4) -> BatchedBackend:
+    backend = BatchedBackend(slots=slots)
+    backend._engines["fake"] = _BatchEngine(runtime, slots, name="fake")
+    return backend
+
+
+def _request(prompt: str, max_tokens: int = 32) -> CompletionRequest:
+    return CompletionRequest(
+        model_name="fake",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=0.0,
+    )
+
+
+def test_concurrent_requests_share_decode_steps():
+    runtime = FakeRuntime({"alpha": ["A1", "A2", "A3"], "beta": ["B1", "B2"], "gamma": ["G1"]}, step_delay=0.002)
+    backend = _backend(runtime)
+
+    async def run():
+        return await asyncio.gather(*(backend.complete(_request(p)) for p in ("alpha", "beta", "gamma")))
+
+    try:
+        assert asyncio.run(run()) == ["A1A2A3", "B1B2", "G1"]
+        stats = backend.stats().models["fake"]
+    finally:
+        backend.close()
+
+    # At least one llama_decode carried tokens from all three sequences.
+    assert any(len({seq for _, _, seq, _ in batch}) == 3 for batch in runtime.batches)
+    assert (stats.requests, stats.tokens_generated, stats.active) == (3, 6, 0)
+    assert stats.avg_sequences_per_step > 1
+    assert runtime.closed
+
+
+def test_new_request_joins_while_another_is_generating():
+    runtime = FakeRuntime({"long": [f"x{i}" for i in range(20)], "late": ["L"]}, step_delay=0.005)
+    backend = _backend(runtime)
+
+    async def run():
+        long_stream = backend.stream(_request("long"))
+        first = await long_stream.__anext__()
+        late = await backend.complete(_request("late"))
+        rest = [piece async for piece in long_stream]
+        return first, late, rest
+
+    try:
+        first, late, rest = asyncio.run(run())
+    finally:
+        backend.close()
+
+    assert late == "L"
+    assert first + "".join(rest) == "".join(f"x{i}" for i in range(20))
+    mixed = [batch for batch in runtime.batches if len({seq for _, _, seq, _ in batch}) == 2]
+    # The late prompt was evaluated alongside the running sequence's next token.
+    assert mixed and any(not logits for _, _, _, logits in mixed[0])
+
+
+def test_long_prompts_are_evaluated_in_n_batch_chunks():
+    prompt = "p" * 50
+    runtime = FakeRuntime({prompt: ["ok"]}, n_batch=16)
+    backend = _backend(runtime)
+
+    try:
+        assert asyncio.run(backend.complete(_request(prompt))) == "ok"
+    finally:
+        backend.close()
+
+    assert [len(batch) for batch in runtime.batches[:4]] == [16, 16, 16, 2]
+    assert [pos for _, pos, _, _ in runtime.batches[3]] == [48, 49]
+    assert runtime.batches[3][-1][3] is True
+
+
+def test_stop_string_is_held_back_and_trimmed():
+    runtime = FakeRuntime({"q": ["Hello", " <e", "nd>", " never sent"]})
+    backend = _backend(runtime)
+
+    async def run():
+        return [piece async for piece in backend.stream(_request("q"))]
+
+    try:
+        pieces = asyncio.run(run())
+    finally:
+        backend.close()
+
+    assert "".join(pieces) == "Hello "
+    assert all("<" not in piece for piece in pieces)
+
+
+def test_requests_wait_for_kv_room_and_slots():
+    runtime = FakeRuntime({"aa": ["1", "2"], "bb": ["3"]}, n_ctx=40)
+    backend = _backend(runtime, slots=1)
+
+    async def run():
+        return await asyncio.gather(
+            backend.complete(_request("aa", max_tokens=30)),
+            backend.complete(_request("bb", max_tokens=30)),
+        )
+
+    try:
+        assert asyncio.run(run()) == ["12", "3"]
+    finally:
+        backend.close()
+
+    # One slot: the two sequences never share a decode step.
+    assert all(len({seq for _, _, seq, _ in batch}) == 1 for batch in runtime.batches)
+
+
+def test_prompt_longer_than_context_is_rejected():
+    runtime = FakeRuntime({"x" * 20: ["never"]}, n_ctx=10)
+    backend = _backend(runtime)
+
+    try:
+        with pytest.raises(ValueError, match="exceed context window"):
+            asyncio.run(backend.complete(_request("x" * 20)))
+    finally:
+        backend.close()
+
+
+def test_abandoned_stream_frees_its_slot():
+    runtime = FakeRuntime({"long": [f"x{i}" for i in range(1000)], "next": ["N"]}, step_delay=0.002)
+    backend = _backend(runtime, slots=1)
+
+    async def run():
+        stream = backend.stream(_request("long", max_tokens=1000))
+        await stream.__anext__()
+        await stream.aclose()
+        return await backend.complete(_request("next"))
+
+    try:
+        assert asyncio.run(run()) == "N"
+    finally:
+        backend.close()
+
+    assert runtime.ended[0] == 0
+
+
+def test_slots_are_clamped_to_n_batch():
+    assert BatchedBackend(slots=64, n_batch=32)._slots == 32
+    assert BatchedBackend(slots=4, n_batch=32)._slots == 4
@@ -0,0 +1,177 @@
+import pytest
+
+from app.services.cache_store import LocalVectorStore, delete_local_namespace, list_local_namespaces
+
+pytestmark = pytest.mark.no_model
+
+DIM = 3
+
+
+def _meta(answer: str, score: float = 0.0) -> dict:
+    return {"generalized_answer": answer, "score": score}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore("acme__support", str(tmp_path), DIM)
+
+
+def _fill(store: LocalVectorStore) -> None:
+    store.upsert(
+        ids=["a", "b", "c"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.0, 0.0, 1.0]],
+        documents=["doc a", "doc b", "doc c"],
+        metadatas=[_meta("A"), _meta("B", -6.0), _meta("C", 1.0)],
+    )
+
+
+def test_query_returns_nearest_first_with_cosine_distance(store):
+    _fill(store)
+
+    result = store.query(
+        query_embeddings=[[0.0, 1.0, 0.1], [1.0, 0.0, 0.0]],
+        n_results=2,
+        include=["documents", "metadatas", "distances"],
+    )
+
+    assert result["ids"][0][0] == "b"
+    assert result["ids"][1][0] == "a"
+    assert result["distances"][1][0] == pytest.approx(0.0, abs=1e-6)
+    assert result["distances"][0][0] < result["distances"][0][1]
+    assert result["documents"][0][0] == "doc b"
+    assert result["metadatas"][1][0]["generalized_answer"] == "A"
+
+
+def test_query_on_empty_store_returns_empty_rows(store):
+    result = store.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=5, include=["documents", "metadatas"])
+    assert result == {"ids": [[]], "distances": [[]], "documents": [[]], "metadatas": [[]]}
+
+
+def test_get_supports_ids_where_and_paging(store):
+    _fill(store)
+
+    assert store.get(ids=["c", "missing"])["ids"] == ["c"]
+    assert store.get(where={"score": {"$lt": -5.0}}, include=[])["ids"] == ["b"]
+    page = store.get(include=["documents"], limit=1, offset=1)
+    assert page["ids"] == ["b"] and page["documents"] == ["doc b"] and page["metadatas"] is None
+    with pytest.raises(ValueError):
+        store.get(where={"score": {"$in": [1.0]}})
+
+
+def test_update_delete_and_slot_reuse(store):
+    _fill(store)
+    store.update(ids=["a"], metadatas=[_meta("A2", 3.0)])
+    store.delete(ids=["b"])
+
+    assert store.count() == 2
+    assert store.get(ids=["a"])["metadatas"][0]["score"] == 3.0
+
+    store.upsert(ids=["d"], embeddings=[[0.0, 1.0, 0.0]], documents=["doc d"], metadatas=[_meta("D")])
+    slots = dict(store._conn.execute("SELECT id, slot FROM entries").fetchall())
+    assert slots["d"] == 1  # reused b's slot
+    result = store.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=1, include=[])
+    assert result["ids"] == [["d"]]
+
+
+def test_upsert_existing_id_replaces_vector_and_document(store):
+    _fill(store)
+    store.upsert(ids=["a"], embeddings=[[0.0, 0.0, 1.0]], documents=["doc a2"], metadatas=[_meta("A2")])
+
+    assert store.count() == 3
+    result = store.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=3, include=["documents"])
+    assert "doc a2" in result["documents"][0]
+    assert result["distances"][0][0] > 0.5
+
+
+def test_warm_start_and_cross_instance_visibility(tmp_path):
+    writer = LocalVectorStore("ns", str(tmp_path), DIM)
+    reader = LocalVectorStore("ns", str(tmp_path), DIM)
+
+    writer.upsert(ids=["a"], embeddings=[[1.0, 0.0, 0.0]], documents=["doc a"], metadatas=[_meta("A")])
+    assert reader.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=1, include=[])["ids"] == [["a"]]
+
+    writer.close()
+    reopened = LocalVectorStore("ns", str(tmp_path), DIM)
+    assert reopened.count() == 1
+    assert reopened.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=1, include=[])["ids"] == [["a"]]
+
+
+def test_query_survives_a_delete_from_another_process(tmp_path, monkeypatch):
+    reader = LocalVectorStore("ns", str(tmp_path), DIM)
+    writer = LocalVectorStore("ns", str(tmp_path), DIM)
+    _fill(writer)
+    refresh = reader._refresh
+
+    def refresh_then_delete():
+        refresh()
+        writer.delete(["a"])
+
+    monkeypatch.setattr(reader, "_refresh", refresh_then_delete)
+    result = reader.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=3, include=["documents"])
+
+    assert result["ids"][0][0] == "a" and result["documents"][0][0] == "doc a"
+    monkeypatch.setattr(reader, "_refresh", refresh)
+    assert "a" not in reader.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=3, include=[])["ids"][0]
+
+
+def test_grows_vector_file_past_initial_capacity(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.cache_store._MIN_CAPACITY", 2)
+    store = LocalVectorStore("ns", str(tmp_path), DIM)
+    for i in range(5):
+        vector = [0.0, 0.0, 0.0]
+        vector[i % DIM] = 1.0 + i
+        store.upsert(ids=[f"e{i}"], embeddings=[vector], documents=[f"doc {i}"], metadatas=[_meta(str(i))])
+
+    assert store.count() == 5
+    assert store.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=2, include=[])["ids"][0][0] in {"e1", "e4"}
+
+
+def test_list_and_delete_namespaces(tmp_path):
+    LocalVectorStore("acme__a", str(tmp_path), DIM)
+    LocalVectorStore("acme__b", str(tmp_path), DIM).close()
+
+    assert list_local_namespaces(str(tmp_path)) == ["acme__a", "acme__b"]
+    assert delete_local_namespace(str(tmp_path), "acme__b") is True
+    assert list_local_namespaces(str(tmp_path)) == ["acme__a"]
+
+
+def test_memory_service_runs_on_local_store(tmp_path, monkeypatch):
+    from app.services.memory_chromaDB import MemoryService
+
+    vectors = {"capital of france": [1.0] + [0.0] * 383, "speed of light": [0.0, 1.0] + [0.0] * 382}
+    monkeypatch.setattr("app.services.memory_chromaDB.CACHE_STORE", "local")
+    monkeypatch.setattr("app.services.memory_chromaDB.LOCAL_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr("app.services.memory_chromaDB._embed", lambda text: vectors[text])
+    monkeypatch.setattr("app.services.memory_chromaDB._embed_many", lambda texts: [vectors[t] for t in texts])
+
+    svc = MemoryService(collection_name="acme__support")
+    doc_id = svc.store_interaction("capital of france", "Paris.", "what's the capital of france?", "u1")
+
+    hit, miss = svc.lookup_cache_batch(["capital of france", "speed of light"])
+    assert hit.hit and hit.generalized_answer == "Paris." and hit.entry_id == doc_id
+    assert miss.hit is False
+    assert svc.get_all_entries()[0]["normalized_query"] == "capital of france"
+    svc.update_score(doc_id, -10.0)
+    assert svc.evict_below_floor(-5.0) == 1
+    assert svc.count == 0
+
+
+def test_hits_report_the_usage_stored_with_the_entry(tmp_path, monkeypatch):
+    from app.services.memory_chromaDB import MemoryService
+    from app.services.token_usage import TokenUsage
+
+    vectors = {"capital of france": [1.0] + [0.0] * 383, "speed of light": [0.0, 1.0] + [0.0] * 382}
+    monkeypatch.setattr("app.services.memory_chromaDB.CACHE_STORE", "local")
+    monkeypatch.setattr("app.services.memory_chromaDB.LOCAL_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr("app.services.memory_chromaDB._embed", lambda text: vectors[text])
+    monkeypatch.setattr("app.services.memory_chromaDB._embed_many", lambda texts: [vectors[t] for t in texts])
+
+    svc = MemoryService(collection_name="acme__support")
+    svc.store_interaction(
+        "capital of france", "Paris.", "orig", "u1", usage=TokenUsage(21, 8), model_used="gemini-2.5-flash"
+    )
+    svc.store_interaction("speed of light", "c.", "orig", "u1")
+
+    metered, legacy = svc.lookup_cache_batch(["capital of france", "speed of light"])
+    assert (metered.usage, metered.model_used) == (TokenUsage(21, 8), "gemini-2.5-flash")
+    assert (legacy.hit, legacy.usage, legacy.model_used) == (True, None, None)
@@ -36,3 +36,73 @@ class TestPredictComplexity:
             "and providing specific GDP data to support your arguments."
         )
         assert complex_["score"] > simple["score"]
+
+
+class TestBatchedInference:
+    def test_batch_matches_single_predictions(self, classifier_service, monkeypatch):
+        monkeypatch.setattr("app.services.classifier.CLASSIFIER_CACHE_MAX_ENTRIES", 0)
+        queries = ["What is 2 + 2?", "Write a sonnet about entropy in the style of Milton."]
+        batched = classifier_service.predict_batch(queries)
+        singles = [classifier_service.predict_complexity(query) for query in queries]
+
+        assert [item["task_type"] for item in batched] == [item["task_type"] for item in singles]
+        for got, expected in zip(batched, singles):
+            assert got["score"] == pytest.approx(expected["score"], abs=1e-3)
+
+    def test_concurrent_classify_calls_share_batches(self, classifier_service):
+        import asyncio
+
+        from app.services.classifier import get_classifier_batch_stats
+
+        async def run_all() -> list[dict]:
+            return await asyncio.gather(
+                *(classifier_service.classify(f"What is {n} + {n}?") for n in range(4))
+            )
+
+        results = asyncio.run(run_all())
+
+        assert len(results) == 4
+        assert all(result["complexity"] in ("easy", "hard") for result in results)
+        stats = get_classifier_batch_stats()
+        assert stats is not None and stats.items >= 4
+
+
+class TestOnnxBackend:
+    PROMPTS = [
+        "What is 2 + 2?",
+        "Hello, how are you?",
+        "Summarize this article",
+        "Write a sonnet about entropy in the style of Milton.",
+        "Compare and contrast the economic policies of Keynesianism and monetarism, "
+        "analyzing their historical effectiveness across at least three different countries.",
+    ]
+
+    @pytest.fixture
+    def onnx_classifier(self, tmp_path, monkeypatch, classifier_service):
+        pytest.importorskip("onnxruntime")
+        import app.services.classifier as classifier_module
+
+        def load(quantize: bool):
+            monkeypatch.setattr(classifier_module, "CLASSIFIER_ONNX_PATH", str(tmp_path / "classifier.onnx"))
+            monkeypatch.setattr(classifier_module, "CLASSIFIER_ONNX_QUANTIZE", quantize)
+            monkeypatch.setattr(classifier_module.ClassifierService, "_onnx_runtime", None)
+            monkeypatch.setattr(classifier_module.ClassifierService, "_result_caches", {})
+            return classifier_module.ClassifierService(backend="onnx")
+
+        return load
+
+    def test_matches_torch_backend(self, classifier_service, onnx_classifier):
+        expected = classifier_service.predict_batch(self.PROMPTS)
+        got = onnx_classifier(quantize=False).predict_batch(self.PROMPTS)
+
+        assert [item["task_type"] for item in got] == [item["task_type"] for item in expected]
+        assert [item["complexity"] for item in got] == [item["complexity"] for item in expected]
+        for onnx_item, torch_item in zip(got, expected):
+            assert onnx_item["score"] == pytest.approx(torch_item["score"], abs=1e-3)
+
+    def test_int8_stays_close_to_torch_backend(self, classifier_service, onnx_classifier):
+        expected = classifier_service.predict_batch(self.PROMPTS)
+        got = onnx_classifier(quantize=True).predict_batch(self.PROMPTS)
+
+        for onnx_item, torch_item in zip(got, expected):
+            assert onnx_item["score"] == pytest.approx(torch_item["score"], abs=0.05)
@@ -0,0 +1,106 @@
+import pytest
+
+from app.services.classifier_cache import ClassifierResultCache
+
+pytestmark = pytest.mark.no_model
+
+
+def _result(score: float) -> dict:
+    return {"complexity": "easy", "score": score, "task_type": "Open QA"}
+
+
+def test_local_tier_hits_and_misses():
+    cache = ClassifierResultCache(max_entries=8, namespace="torch")
+    assert cache.get_many(["Prompt: a", "Prompt: b"]) == [None, None]
+
+    cache.put_many(["Prompt: a"], [_result(0.1)])
+
+    assert cache.get_many(["Prompt: a", "Prompt: b"]) == [_result(0.1), None]
+    assert cache.get_local("Prompt: a") == _result(0.1)
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (2, 3, 1)
+
+
+def test_local_miss_is_not_counted():
+    cache = ClassifierResultCache(max_entries=8, namespace="torch")
+    assert cache.get_local("Prompt: a") is None
+    assert cache.stats().misses == 0
+
+
+def test_redis_tier_shares_results_between_replicas(fake_redis):
+    writer = ClassifierResultCache(max_entries=8, namespace="torch", redis_client=fake_redis)
+    reader = ClassifierResultCache(max_entries=8, namespace="torch", redis_client=fake_redis)
+
+    writer.put_many(["Prompt: a"], [_result(0.2)])
+
+    assert reader.get_many(["Prompt: a"]) == [_result(0.2)]
+    assert reader.stats().redis_hits == 1
+    # Promoted into the local tier.
+    assert reader.get_local("Prompt: a") == _result(0.2)
+
+
+def test_redis_namespaces_are_separate(fake_redis):
+    torch_cache = ClassifierResultCache(max_entries=8, namespace="torch", redis_client=fake_redis)
+    onnx_cache = ClassifierResultCache(max_entries=8, namespace="onnx-int8", redis_client=fake_redis)
+
+    torch_cache.put_many(["Prompt: a"], [_result(0.2)])
+
+    assert onnx_cache.get_many(["Prompt: a"]) == [None]
+
+
+def test_redis_errors_fall_back_to_local_tier(fake_redis):
+    fake_redis.fail = True
+    cache = ClassifierResultCache(max_entries=8, namespace="torch", redis_client=fake_redis)
+
+    cache.put_many(["Prompt: a"], [_result(0.3)])
+
+    assert cache.get_many(["Prompt: a", "Prompt: b"]) == [_result(0.3), None]
+    stats = cache.stats()
+    assert stats.redis_errors == 2
+    assert stats.misses == 1
+
+
+def test_service_skips_forward_pass_for_cached_prompts(monkeypatch):
+    from app.services import classifier as classifier_module
+
+    monkeypatch.setattr(classifier_module.ClassifierService, "_result_caches", {})
+    service = object.__new__(classifier_module.ClassifierService)
+    service._backend = "torch"
+    forwarded: list[list[str]] = []
+
+    def fake_predict(prompts):
+        forwarded.append(prompts)
+        return [_result(0.1 * len(prompt)) for prompt in prompts]
+
+    monkeypatch.setattr(service, "_predict_prompts", fake_predict)
+
+    first = service.predict_batch(["a", "bb"])
+    second = service.predict_batch(["bb", "ccc"])
+
+    assert forwarded == [["Prompt: a", "Prompt: bb"], ["Prompt: ccc"]]
+    assert second[0] == first[1]
+    second[0]["complexity"] = "hard"
+    assert service.predict_batch(["bb"])[0]["complexity"] == "easy"
+
+
+def test_classify_batches_on_the_callers_backend(monkeypatch):
+    import asyncio
+
+    from app.services import classifier as classifier_module
+
+    monkeypatch.setattr(classifier_module.ClassifierService, "_result_caches", {})
+    monkeypatch.setattr(classifier_module.ClassifierService, "_batchers", {})
+    services = {}
+    for backend, score in (("torch", 0.1), ("onnx", 0.9)):
+        service = object.__new__(classifier_module.ClassifierService)
+        service._backend = backend
+        monkeypatch.setattr(service, "_predict_prompts", lambda prompts, s=score: [_result(s) for _ in prompts])
+        services[backend] = service
+
+    async def classify_both():
+        return await asyncio.gather(services["torch"].classify("q"), services["onnx"].classify("q"))
+
+    torch_result, onnx_result = asyncio.run(classify_both())
+
+    assert (torch_result["score"], onnx_result["score"]) == (0.1, 0.9)
+    assert sorted(classifier_module.ClassifierService._batchers) == ["onnx", "torch"]
@@ -63,6 +63,12 @@ PARITY_ROWS = [
         ["stats_service.org_stats", "stats_service.department_stats"],
         ("GET", "/admin/v1/stats/orgs/{org_slug}/departments"),
     ),
+    (
+        "stats stages",
+        ("stats",),
+        ["stats_service.stage_stats"],
+        ("GET", "/admin/v1/stats/stages"),
+    ),
 ]
 
 
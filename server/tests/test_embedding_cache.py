@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+
+pytestmark = pytest.mark.no_model
+
+
+def _vec(seed: float, dim: int = 4) -> list[float]:
+    return [seed + i for i in range(dim)]
+
+
+def test_put_then_get_returns_float32_vector():
+    cache = EmbeddingCache(slots=16, dim=4)
+    cache.put("capital of france", _vec(1.0))
+
+    vector = cache.get("capital of france")
+
+    assert vector is not None
+    assert vector.dtype == np.float32
+    assert vector.tolist() == _vec(1.0)
+    assert cache.get("unrelated query") is None
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.writes) == (1, 1, 1)
+
+
+def test_colliding_text_replaces_slot():
+    cache = EmbeddingCache(slots=1, dim=4)
+    cache.put("first", _vec(1.0))
+    cache.put("second", _vec(2.0))
+
+    assert cache.get("first") is None
+    assert cache.get("second").tolist() == _vec(2.0)
+
+
+def test_slot_torn_by_concurrent_writers_reads_as_miss(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    first = EmbeddingCache(slots=1, dim=4, path=str(path))
+    second = EmbeddingCache(slots=1, dim=4, path=str(path))
+    first.put("first", _vec(1.0))
+
+    # The other process overwrote half the vector before ours stamped its key.
+    second._table["vec"][0][:2] = _vec(9.0)[:2]
+
+    assert first.get("first") is None
+    assert second.get("first") is None
+
+
+def test_rejects_wrong_dimension():
+    cache = EmbeddingCache(slots=4, dim=4)
+    with pytest.raises(ValueError):
+        cache.put("q", [1.0, 2.0])
+
+
+def test_mmap_store_survives_reopen(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    writer = EmbeddingCache(slots=32, dim=4, path=str(path))
+    writer.put("hot query", _vec(5.0))
+    writer.flush()
+
+    reader = EmbeddingCache(slots=32, dim=4, path=str(path))
+
+    assert reader.get("hot query").tolist() == _vec(5.0)
+    assert reader.stats().persistent is True
+
+
+def test_mmap_with_different_shape_is_recreated(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    EmbeddingCache(slots=8, dim=4, path=str(path)).put("q", _vec(1.0))
+
+    resized = EmbeddingCache(slots=16, dim=4, path=str(path))
+
+    assert resized.get("q") is None
+
+
+def test_mmap_from_another_model_is_replaced_without_breaking_open_mappings(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    old = EmbeddingCache(slots=8, dim=4, path=str(path), model="old-embedder")
+    old.put("q", _vec(1.0))
+
+    new = EmbeddingCache(slots=8, dim=4, path=str(path), model="new-embedder")
+
+    assert new.get("q") is None
+    # The process still mapping the old file keeps working on it.
+    assert old.get("q").tolist() == _vec(1.0)
+    new.put("q", _vec(2.0))
+    new.flush()
+    assert EmbeddingCache(slots=8, dim=4, path=str(path), model="new-embedder").get("q").tolist() == _vec(2.0)
@@ -0,0 +1,35 @@
+import pytest
+
+from app.utils.embedding_codec import decode_embedding, encode_embedding
+
+pytestmark = pytest.mark.no_model
+
+
+def test_float32_round_trip_is_exact():
+    vector = [0.125, -0.5, 0.0078125, 1.0]
+    payload = encode_embedding(vector, "float32")
+
+    assert payload.startswith("f32:")
+    assert decode_embedding(payload) == vector
+
+
+def test_float16_round_trip_is_close_and_smaller():
+    vector = [0.1234, -0.5678, 0.9, 0.0001] * 96
+    half = encode_embedding(vector, "float16")
+    full = encode_embedding(vector, "float32")
+
+    decoded = decode_embedding(half)
+    assert len(half) < len(full)
+    assert len(decoded) == len(vector)
+    assert max(abs(a - b) for a, b in zip(decoded, vector)) < 1e-3
+
+
+@pytest.mark.parametrize("payload", ["", "f64:AAAA", "f32:not-base64!", "f32:AAA="])
+def test_malformed_payload_raises_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_embedding(payload)
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        encode_embedding([1.0], "bfloat16")
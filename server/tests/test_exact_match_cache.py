@@ -0,0 +1,104 @@
+import pytest
+
+from app.services.exact_match_cache import ExactMatchCache
+
+pytestmark = pytest.mark.no_model
+
+
+def test_get_put_and_lru_eviction():
+    cache: ExactMatchCache[str] = ExactMatchCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"  # refreshes "a"
+    cache.put("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.services.exact_match_cache.time.monotonic", lambda: now[0])
+    cache: ExactMatchCache[str] = ExactMatchCache(max_entries=4, ttl_seconds=5)
+    cache.put("a", "A")
+    now[0] += 6
+
+    assert cache.get("a") is None
+    assert cache.stats().expirations == 1
+
+
+def test_invalidate_where_matches_values():
+    cache: ExactMatchCache[str] = ExactMatchCache(max_entries=4, ttl_seconds=60)
+    cache.put("a", "doc1")
+    cache.put("b", "doc1")
+    cache.put("c", "doc2")
+
+    assert cache.invalidate_where(lambda value: value == "doc1") == 2
+    assert cache.get("c") == "doc2"
+    assert cache.stats().size == 1
+
+
+def test_zero_size_disables_cache():
+    cache: ExactMatchCache[str] = ExactMatchCache(max_entries=0, ttl_seconds=60)
+    cache.put("a", "A")
+    assert cache.enabled is False
+    assert cache.get("a") is None
+
+
+def test_clear_in_one_process_drops_entries_in_others(fake_redis):
+    api = ExactMatchCache(max_entries=4, namespace="acme", check_interval_ms=0, redis_client=fake_redis)
+    worker = ExactMatchCache(max_entries=4, namespace="acme", redis_client=fake_redis)
+    other = ExactMatchCache(max_entries=4, namespace="globex", check_interval_ms=0, redis_client=fake_redis)
+    api.put("a", "A")
+    other.put("a", "A")
+
+    worker.clear()
+
+    assert api.get("a") is None
+    assert other.get("a") == "A"
+    api.put("a", "A2")
+    assert api.get("a") == "A2"
+
+
+def test_generation_is_read_at_most_once_per_interval(monkeypatch, fake_redis):
+    now = [100.0]
+    monkeypatch.setattr("app.services.exact_match_cache.time.monotonic", lambda: now[0])
+    api = ExactMatchCache(max_entries=4, namespace="acme", check_interval_ms=100, redis_client=fake_redis)
+    worker = ExactMatchCache(max_entries=4, namespace="acme", redis_client=fake_redis)
+    api.put("a", "A")
+
+    worker.clear()
+    assert api.get("a") == "A"
+    now[0] += 0.1
+    assert api.get("a") is None
+
+
+def test_redis_errors_back_off_and_fall_back_to_local_entries(fake_redis):
+    fake_redis.fail = True
+    cache = ExactMatchCache(max_entries=4, namespace="acme", redis_client=fake_redis)
+    cache.put("a", "A")
+    cache.clear()
+    cache.put("a", "A")
+
+    assert cache.get("a") == "A"
+    # The failed read backs off; the invalidation is still attempted.
+    assert cache.stats().redis_errors == 2
+
+
+def test_put_skips_values_computed_before_an_invalidation(fake_redis):
+    api = ExactMatchCache(max_entries=4, namespace="acme", check_interval_ms=0, redis_client=fake_redis)
+    worker = ExactMatchCache(max_entries=4, namespace="acme", redis_client=fake_redis)
+
+    epoch = api.epoch()
+    worker.clear()
+    api.put("a", "stale", epoch)
+    assert api.get("a") is None
+
+    epoch = api.epoch()
+    api.invalidate("b")
+    api.put("a", "stale", epoch)
+    assert api.get("a") is None
+
+    api.put("a", "fresh", api.epoch())
+    assert api.get("a") == "fresh"
@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from app.services.latency_histogram import bin_for, bin_value, percentiles
+
+pytestmark = pytest.mark.no_model
+
+
+def test_bins_are_exact_below_64ms_and_within_two_percent_above():
+    assert [bin_value(bin_for(ms)) for ms in (0, 1, 26, 63)] == [0.0, 1.0, 26.0, 63.0]
+    for ms in (64, 65, 100, 1_000, 26_000, 123_456, 10_000_000):
+        assert abs(bin_value(bin_for(ms)) - ms) / ms <= 0.02
+    assert all(bin_for(ms) <= bin_for(ms + 1) for ms in range(0, 5_000))
+
+
+def test_percentiles_use_nearest_rank_and_merge_by_adding_counts():
+    latencies = [random.Random(7).randint(20, 130_000) for _ in range(1_000)]
+    first: dict[int, int] = {}
+    second: dict[int, int] = {}
+    for index, ms in enumerate(latencies):
+        target = first if index % 2 else second
+        target[bin_for(ms)] = target.get(bin_for(ms), 0) + 1
+    merged = {key: first.get(key, 0) + second.get(key, 0) for key in first.keys() | second.keys()}
+
+    result = percentiles(merged)
+    ordered = sorted(latencies)
+
+    for name, rank in (("p50_ms", 500), ("p90_ms", 900), ("p95_ms", 950), ("p99_ms", 990)):
+        exact = ordered[rank - 1]
+        assert abs(result[name] - exact) / exact <= 0.02
+    assert percentiles({}) is None
+    assert percentiles({bin_for(40): 3}) == {"p50_ms": 40.0, "p90_ms": 40.0, "p95_ms": 40.0, "p99_ms": 40.0}
@@ -181,3 +181,202 @@ class TestThreshold:
             result = svc.check_cache("capital of france")
 
         assert result is None, "Entry at distance 0.18 should miss (above 0.15 threshold)"
+
+
+class _FakeCollection:
+    """Minimal in-memory stand-in for a Chroma collection (cosine distance on stored vectors)."""
+
+    def __init__(self) -> None:
+        self.docs: dict[str, tuple[str, dict]] = {}
+        self.vectors: dict[str, list[float]] = {}
+        self.query_calls = 0
+        self.last_n_results: int | None = None
+
+    def count(self) -> int:
+        return len(self.docs)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for doc_id, embedding, document, meta in zip(ids, embeddings, documents, metadatas):
+            self.docs[doc_id] = (document, dict(meta))
+            self.vectors[doc_id] = list(embedding)
+
+    def query(self, query_embeddings, n_results, include):
+        self.query_calls += 1
+        self.last_n_results = n_results
+        out = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        for query in query_embeddings:
+            ranked = sorted(
+                (1.0 - sum(a * b for a, b in zip(query, self.vectors[i])), i) for i in self.docs
+            )[:n_results]
+            out["ids"].append([i for _, i in ranked])
+            out["distances"].append([round(dist, 6) for dist, _ in ranked])
+            out["documents"].append([self.docs[i][0] for _, i in ranked])
+            out["metadatas"].append([dict(self.docs[i][1]) for _, i in ranked])
+        return out
+
+    def get(self, ids=None, include=None, where=None, limit=None, offset=None):
+        if where is not None:
+            floor = where["score"]["$lt"]
+            found = [i for i, (_, meta) in self.docs.items() if meta.get("score", 0.0) < floor]
+        else:
+            found = [i for i in (ids or []) if i in self.docs]
+        return {"ids": found, "metadatas": [dict(self.docs[i][1]) for i in found]}
+
+    def update(self, ids, metadatas):
+        for doc_id, meta in zip(ids, metadatas):
+            document, _ = self.docs[doc_id]
+            self.docs[doc_id] = (document, dict(meta))
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+
+@pytest.fixture
+def fake_memory(monkeypatch):
+    collection = _FakeCollection()
+
+    class _FakeClient:
+        def __init__(self, host, port):
+            pass
+
+        def get_or_create_collection(self, name, metadata):
+            return collection
+
+    monkeypatch.setattr("app.services.memory_chromaDB.chromadb.HttpClient", _FakeClient)
+    monkeypatch.setattr("app.services.memory_chromaDB._embed", lambda text: [0.0, 1.0])
+    return MemoryService(collection_name="exact_match_test"), collection
+
+
+class TestExactMatchLayer:
+    def test_repeat_hit_skips_chroma(self, fake_memory):
+        svc, collection = fake_memory
+        svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+
+        first = svc.lookup_cache("capital of france")
+        second = svc.lookup_cache("capital of france")
+
+        assert first.hit and second == first
+        assert collection.query_calls == 1
+        assert svc.exact_cache_stats().hits == 1
+
+    def test_misses_are_not_remembered(self, fake_memory):
+        svc, collection = fake_memory
+        assert svc.lookup_cache("capital of france").hit is False
+        svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+        assert svc.lookup_cache("capital of france").hit is True
+
+    def test_store_replaces_remembered_answer(self, fake_memory):
+        svc, _ = fake_memory
+        svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+        svc.lookup_cache("capital of france")
+        svc.store_interaction("capital of france", "Paris, on the Seine.", "orig", "u1")
+
+        assert svc.lookup_cache("capital of france").generalized_answer == "Paris, on the Seine."
+
+    def test_delete_update_and_evict_invalidate(self, fake_memory):
+        svc, collection = fake_memory
+        doc_id = svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+
+        svc.lookup_cache("capital of france")
+        svc.update_score(doc_id, 1.0)
+        svc.lookup_cache("capital of france")
+        assert collection.query_calls == 2
+
+        svc.delete_entry(doc_id)
+        assert svc.lookup_cache("capital of france").hit is False
+
+        doc_id = svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+        svc.lookup_cache("capital of france")
+        svc.update_score(doc_id, -10.0)
+        svc.lookup_cache("capital of france")
+        assert svc.evict_below_floor(-5.0) == 1
+        assert svc.lookup_cache("capital of france").hit is False
+
+    def test_eviction_in_another_process_clears_remembered_hits(self, fake_memory, fake_redis, monkeypatch):
+        _, collection = fake_memory
+        monkeypatch.setattr("app.services.memory_chromaDB.EXACT_CACHE_REDIS_CHECK_MS", 0.0)
+        api = MemoryService(collection_name="exact_match_test", redis_client=fake_redis)
+        worker = MemoryService(collection_name="exact_match_test", redis_client=fake_redis)
+        doc_id = api.store_interaction("capital of france", "Paris.", "orig", "u1")
+        api.lookup_cache("capital of france")
+        assert api.lookup_cache("capital of france").hit is True
+        assert collection.query_calls == 1
+
+        worker.update_score(doc_id, -10.0)
+        assert worker.evict_below_floor(-5.0) == 1
+
+        assert api.lookup_cache("capital of france").hit is False
+        assert collection.query_calls == 2
+
+
+_VECTORS = {
+    "capital of france": [1.0, 0.0, 0.0],
+    "france capital city": [0.95, 0.31, 0.0],
+    "boiling point of water": [0.0, 1.0, 0.0],
+    "speed of light": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def vector_memory(fake_memory, monkeypatch):
+    monkeypatch.setattr("app.services.memory_chromaDB._embed", lambda text: _VECTORS[text])
+    monkeypatch.setattr("app.services.memory_chromaDB._embed_many", lambda texts: [_VECTORS[t] for t in texts])
+    return fake_memory
+
+
+class TestBatchLookup:
+    def test_batch_returns_one_result_per_query_from_one_query_call(self, vector_memory):
+        svc, collection = vector_memory
+        svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+        svc.store_interaction("boiling point of water", "100 C.", "orig", "u1")
+
+        results = svc.lookup_cache_batch(["boiling point of water", "speed of light", "capital of france"])
+
+        assert collection.query_calls == 1
+        assert [r.hit for r in results] == [True, False, True]
+        assert results[0].generalized_answer == "100 C."
+        assert results[2].generalized_answer == "Paris."
+        assert results[1].query_embedding == _VECTORS["speed of light"]
+        assert results[1].nearest_distance == pytest.approx(1.0)
+
+    def test_batch_serves_exact_hits_without_querying(self, vector_memory):
+        svc, collection = vector_memory
+        svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+        svc.lookup_cache("capital of france")
+
+        results = svc.lookup_cache_batch(["capital of france"])
+
+        assert results[0].hit
+        assert collection.query_calls == 1
+
+    def test_highest_score_within_threshold_wins(self, vector_memory):
+        svc, _ = vector_memory
+        near = svc.store_interaction("capital of france", "Paris.", "orig", "u1")
+        better = svc.store_interaction("france capital city", "Paris, France.", "orig", "u1")
+        far = svc.store_interaction("boiling point of water", "100 C.", "orig", "u1")
+        svc.update_score(better, 2.0)
+        svc.update_score(far, 9.0)  # above threshold: never eligible however high it scores
+
+        result = svc.lookup_cache("capital of france")
+
+        assert result.entry_id == better
+        assert result.nearest_prompt == "capital of france"
+        assert near != better
+
+    def test_threshold_and_n_results_are_configurable_per_namespace(self, fake_memory, monkeypatch):
+        from app.services.memory_chromaDB import MemoryService
+
+        monkeypatch.setattr("app.services.memory_chromaDB._embed", lambda text: _VECTORS[text])
+        monkeypatch.setattr(
+            "app.services.memory_chromaDB.CACHE_SIMILARITY_THRESHOLDS", {"strict_ns": 0.01}
+        )
+        _, collection = fake_memory
+        strict = MemoryService(collection_name="strict_ns", n_results=2)
+        strict.store_interaction("capital of france", "Paris.", "orig", "u1")
+        strict.store_interaction("boiling point of water", "100 C.", "orig", "u1")
+        strict.store_interaction("speed of light", "c.", "orig", "u1")
+
+        assert strict.lookup_cache("france capital city").hit is False
+        assert collection.last_n_results == 2
+        assert MemoryService(collection_name="other_ns").lookup_cache("france capital city").hit is True
@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.micro_batcher import MicroBatcher
+
+pytestmark = pytest.mark.no_model
+
+
+class RecordingEncoder:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_single_embed_returns_own_vector():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_batch_size=8, max_wait_ms=1.0)
+    try:
+        assert batcher.run("abc") == [3.0, 1.0]
+    finally:
+        batcher.close()
+
+    stats = batcher.stats()
+    assert stats.batches == 1
+    assert stats.items == 1
+
+
+def test_concurrent_embeds_share_one_encode_call():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_batch_size=16, max_wait_ms=200.0)
+    texts = ["a" * n for n in range(1, 9)]
+    try:
+        with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+            vectors = list(pool.map(batcher.run, texts))
+    finally:
+        batcher.close()
+
+    assert vectors == [[float(len(text)), 1.0] for text in texts]
+    assert len(encoder.batches) < len(texts)
+    stats = batcher.stats()
+    assert stats.items == len(texts)
+    assert stats.max_batch_size > 1
+    assert stats.max_queue_wait_ms >= 0.0
+
+
+def test_batch_never_exceeds_max_size():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_batch_size=3, max_wait_ms=100.0)
+    futures = [batcher.submit(f"text {i}") for i in range(7)]
+    try:
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+
+    assert len(results) == 7
+    assert all(len(batch) <= 3 for batch in encoder.batches)
+    assert batcher.stats().max_batch_size <= 3
+
+
+def test_encode_failure_propagates_to_every_caller():
+    def failing_encode(texts: list[str]) -> list[list[float]]:
+        raise RuntimeError("encoder down")
+
+    batcher = MicroBatcher(failing_encode, max_batch_size=4, max_wait_ms=50.0)
+    futures = [batcher.submit("one"), batcher.submit("two")]
+    try:
+        for future in futures:
+            with pytest.raises(RuntimeError, match="encoder down"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_result_count_mismatch_fails_every_caller():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch_size=4, max_wait_ms=50.0)
+    futures = [batcher.submit("one"), batcher.submit("two")]
+    try:
+        for future in futures:
+            with pytest.raises(RuntimeError, match="returned 1 results for 2 items"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_async_callers_can_await_results():
+    import asyncio
+
+    batcher = MicroBatcher(lambda items: [item.upper() for item in items], max_batch_size=8, max_wait_ms=50.0)
+
+    async def run_all() -> list[str]:
+        return await asyncio.gather(
+            *(asyncio.wrap_future(batcher.submit(word)) for word in ("a", "b", "c"))
+        )
+
+    try:
+        assert asyncio.run(run_all()) == ["A", "B", "C"]
+    finally:
+        batcher.close()
+
+    assert batcher.stats().max_queue_depth >= 1
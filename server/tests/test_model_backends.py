@@ -1,13 +1,16 @@
 import asyncio
+import json
 import time
 
 import httpx
+import numpy as np
 
 from app.services.context_adjuster import ContextAdjusterService
 from app.services.context_enricher import ContextEnricherService
 from app.services.llm_router import LLMRouterService
 from app.services.model_backends import CompletionRequest, InProcessBackend, OllamaBackend
 from app.services.normalizer import NormalizerService
+from app.services.request_scheduler import RequestScheduler
 
 
 class FakeBackend:
@@ -242,3 +245,382 @@ def test_ollama_backend_requests_can_overlap():
 
     elapsed = asyncio.run(run_batch())
     assert elapsed < 0.7
+
+
+def test_ollama_backend_reuses_pooled_connections():
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = json.dumps({"message": {"role": "assistant", "content": "pooled"}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backend = OllamaBackend(
+        base_url=f"http://127.0.0.1:{server.server_address[1]}",
+        timeout_seconds=5.0,
+        max_connections=4,
+        max_keepalive_connections=4,
+    )
+    request = CompletionRequest(
+        model_name="qwen_1_5b",
+        messages=[{"role": "user", "content": "hello"}],
+        max_tokens=16,
+        temperature=0.0,
+    )
+
+    async def run_requests():
+        await backend.open()
+        try:
+            outputs = [await backend.complete(request) for _ in range(5)]
+            return outputs, backend.stats()
+        finally:
+            await backend.aclose()
+
+    try:
+        outputs, stats = asyncio.run(run_requests())
+    finally:
+        server.shutdown()
+
+    assert outputs == ["pooled"] * 5
+    assert stats.requests == 5
+    assert stats.connections_opened == 1
+    assert stats.reused_requests == 4
+
+
+def _collect(stream) -> list[str]:
+    async def run() -> list[str]:
+        return [piece async for piece in stream]
+
+    return asyncio.run(run())
+
+
+def test_in_process_backend_streams_deltas(monkeypatch):
+    calls: dict[str, object] = {}
+
+    class StreamingModel:
+        def create_chat_completion(self, **kwargs):
+            calls.update(kwargs)
+            yield {"choices": [{"delta": {"role": "assistant"}}]}
+            for piece in ("Par", "is", "."):
+                yield {"choices": [{"delta": {"content": piece}}]}
+
+    monkeypatch.setattr(
+        "app.services.model_loader.ModelManager.load_gemma",
+        lambda: StreamingModel(),
+    )
+
+    pieces = _collect(
+        InProcessBackend().stream(
+            CompletionRequest(
+                model_name="gemma_local",
+                messages=[{"role": "user", "content": "hello"}],
+                max_tokens=10,
+                temperature=0.1,
+            )
+        )
+    )
+
+    assert pieces == ["Par", "is", "."]
+    assert calls["stream"] is True
+
+
+def test_ollama_backend_streams_ndjson_chat():
+    captured: dict[str, object] = {}
+    lines = [
+        {"message": {"role": "assistant", "content": "from "}, "done": False},
+        {"message": {"role": "assistant", "content": "ollama"}, "done": False},
+        {"message": {"role": "assistant", "content": ""}, "done": True},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        captured["payload"] = request.read().decode("utf-8")
+        body = "\n".join(json.dumps(line) for line in lines) + "\n"
+        return httpx.Response(200, content=body.encode())
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama.test")
+    backend = OllamaBackend(base_url="http://ollama.test", timeout_seconds=5.0, client=client)
+
+    try:
+        pieces = _collect(
+            backend.stream(
+                CompletionRequest(
+                    model_name="qwen_1_5b",
+                    messages=[{"role": "user", "content": "hello"}],
+                    max_tokens=32,
+                    temperature=0.0,
+                )
+            )
+        )
+    finally:
+        asyncio.run(client.aclose())
+
+    assert pieces == ["from ", "ollama"]
+    assert '"stream":true' in captured["payload"]
+
+
+def test_llm_router_streams_local_response():
+    class StreamingBackend(FakeBackend):
+        async def stream(self, request: CompletionRequest):
+            self.requests.append(request)
+            for piece in ("a", "b"):
+                yield piece
+
+    backend = StreamingBackend()
+    llm_router = LLMRouterService(backend=backend, model_name="gemma_local")
+
+    assert _collect(llm_router.stream_local_response("Hi", system_prompt="Be brief.")) == ["a", "b"]
+    assert backend.requests[0].messages[0] == {"role": "system", "content": "Be brief."}
+
+
+def test_in_process_backend_dispatches_to_free_replicas(monkeypatch):
+    import app.config as config
+
+    loads: list[dict] = []
+
+    class SleepingModel:
+        def create_chat_completion(self, **kwargs):
+            time.sleep(0.2)
+            return {"choices": [{"message": {"content": "done"}}]}
+
+    def load_gemma(**kwargs):
+        loads.append(kwargs)
+        return SleepingModel()
+
+    monkeypatch.setattr("app.services.model_loader.ModelManager.load_gemma", load_gemma)
+    monkeypatch.setattr(config, "LLAMA_REPLICAS_BY_MODEL", {"gemma_local": 2})
+    monkeypatch.setattr(config, "LLAMA_THREADS_PER_REPLICA", 3)
+
+    scheduler = RequestScheduler()
+    monkeypatch.setattr("app.services.model_backends.request_scheduler", scheduler)
+    backend = InProcessBackend()
+    request = CompletionRequest(
+        model_name="gemma_local",
+        messages=[{"role": "user", "content": "hello"}],
+        max_tokens=16,
+        temperature=0.0,
+    )
+
+    async def run_batch() -> float:
+        started = time.perf_counter()
+        await asyncio.gather(*(backend.complete(request) for _ in range(4)))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run_batch())
+    stats = backend.stats().models["gemma_local"]
+
+    assert loads == [{"n_threads": 3}, {"replica": 1, "n_threads": 3}]
+    # Two replicas serve four requests in two waves instead of four.
+    assert 0.35 <= elapsed < 0.7
+    assert (stats.replicas, stats.busy, stats.queued, stats.requests) == (2, 0, 0, 4)
+    # Calls beyond the replica count wait in the scheduler, not in the pool.
+    assert scheduler.stats().roles["generate"].max_wait_ms >= 150
+
+
+def test_replica_threads_split_physical_cores(monkeypatch):
+    import app.config as config
+    from app.services.model_backends import replica_threads
+
+    monkeypatch.setattr(config, "LLAMA_THREADS_PER_REPLICA", 0)
+    monkeypatch.setattr("app.services.model_backends.os.cpu_count", lambda: 16)
+
+    assert replica_threads(1) is None
+    assert replica_threads(2) == 4
+    assert replica_threads(16) == 1
+
+
+def test_services_mark_static_prompt_prefix():
+    backend = FakeBackend("backend output")
+    enricher = ContextEnricherService(backend=backend, model_name="qwen_1_5b")
+    adjuster = ContextAdjusterService(
+        adjust_backend=backend,
+        adjust_model_name="qwen_1_5b",
+        generalize_backend=backend,
+        generalize_model_name="phi_generalizer",
+    )
+    normalizer = NormalizerService(backend=backend, model_name="gemma_e2b")
+
+    for query in ("first", "second"):
+        asyncio.run(enricher.enrich(query, [{"role": "user", "content": "hi"}]))
+        asyncio.run(adjuster.generalize(query))
+        asyncio.run(adjuster.adjust(query, "answer"))
+        asyncio.run(normalizer.normalize(f"What is the best {query} movie?"))
+
+    per_call = len(backend.requests) // 2
+    for first, second in zip(backend.requests[:per_call], backend.requests[per_call:]):
+        prefix = first.prefix_messages
+        assert prefix == len(first.messages) - 1
+        assert first.messages[:prefix] == second.messages[:prefix]
+        assert first.messages[-1] != second.messages[-1]
+
+
+class PrefixModel:
+    """Token-level stand-in for Llama: one token per character, states are copies."""
+
+    def __init__(self):
+        self.input_ids = np.zeros(4096, dtype=np.intc)
+        self.n_tokens = 0
+        self.evaluated = 0
+        self.loads = 0
+
+    @property
+    def _input_ids(self):
+        return self.input_ids[: self.n_tokens]
+
+    def n_ctx(self):
+        return len(self.input_ids)
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return [ord(c) for c in text.decode("utf-8")]
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.input_ids[self.n_tokens : self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+
+    def save_state(self):
+        return (self.input_ids.copy(), self.n_tokens)
+
+    def load_state(self, state):
+        self.input_ids, self.n_tokens = state[0].copy(), state[1]
+        self.loads += 1
+
+    def create_chat_completion(self, messages, **kwargs):
+        # Mirrors Llama.generate: evaluate only what follows the matching prefix.
+        tokens = self.tokenize(_format(messages).prompt.encode("utf-8"))
+        keep = 0
+        for a, b in zip(self._input_ids.tolist(), tokens[:-1]):
+            if a != b:
+                break
+            keep += 1
+        self.n_tokens = keep
+        self.eval(tokens[keep:])
+        return {"choices": [{"message": {"content": "done"}}]}
+
+
+def _format(messages):
+    from llama_cpp.llama_chat_format import ChatFormatterResponse
+
+    prompt = "".join(f"<{m['role']}>{m['content']}</{m['role']}>" for m in messages) + "<assistant>"
+    return ChatFormatterResponse(prompt=prompt, added_special=True)
+
+
+def test_in_process_backend_restores_prefix_state_between_prompts(monkeypatch):
+    import app.config as config
+
+    model = PrefixModel()
+    monkeypatch.setattr("app.services.model_loader.ModelManager.load_qwen_1_5b", lambda: model)
+    monkeypatch.setattr("app.services.model_backends.chat_formatter", lambda llama: _format)
+    monkeypatch.setattr(config, "LLAMA_PREFIX_CACHE_ENTRIES", 4)
+
+    enrich_prefix = [{"role": "system", "content": "rewrite " * 50}]
+    adjust_prefix = [{"role": "system", "content": "adjust " * 50}]
+    backend = InProcessBackend()
+
+    def run(prefix, last):
+        before = model.evaluated
+        asyncio.run(
+            backend.complete(
+                CompletionRequest(
+                    model_name="qwen_1_5b",
+                    messages=[*prefix, {"role": "user", "content": last}],
+                    max_tokens=8,
+                    temperature=0.0,
+                    prefix_messages=len(prefix),
+                )
+            )
+        )
+        return model.evaluated - before
+
+    run(enrich_prefix, "one")
+    run(adjust_prefix, "one")
+    enrich_again = run(enrich_prefix, "two")
+    enrich_third = run(enrich_prefix, "six")
+    stats = backend.stats().models["qwen_1_5b"]
+
+    # Only the changing turn is evaluated once the prefix is cached.
+    assert enrich_again == len("two</user><assistant>")
+    assert enrich_third == len("six</user><assistant>")
+    assert model.loads == 1
+    assert (stats.prefix_evaluated, stats.prefix_restored, stats.prefix_reused) == (2, 1, 1)
+
+
+def test_ollama_backend_sends_keep_alive(monkeypatch):
+    import app.config as config
+
+    monkeypatch.setattr(config, "OLLAMA_KEEP_ALIVE", "30m")
+    backend = OllamaBackend(base_url="http://ollama.test", timeout_seconds=5.0)
+    request = CompletionRequest(
+        model_name="qwen_1_5b",
+        messages=[{"role": "user", "content": "hello"}],
+        max_tokens=8,
+        temperature=0.0,
+    )
+
+    assert backend._chat_payload(request, stream=False)["keep_alive"] == "30m"
+    monkeypatch.setattr(config, "OLLAMA_KEEP_ALIVE", "")
+    assert "keep_alive" not in backend._chat_payload(request, stream=False)
+
+
+def test_backends_record_token_usage_under_the_request_role(monkeypatch):
+    from app.services.token_usage import TokenUsage, UsageMeter, bind_usage, clear_usage
+
+    class CountingModel:
+        def create_chat_completion(self, **kwargs):
+            return {
+                "choices": [{"message": {"content": "four"}}],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 3},
+            }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json={"message": {"content": "from ollama"}, "done": True, "prompt_eval_count": 9, "eval_count": 2},
+        )
+
+    monkeypatch.setattr("app.services.model_loader.ModelManager.load_gemma", lambda: CountingModel())
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama.test")
+    ollama = OllamaBackend(base_url="http://ollama.test", timeout_seconds=5.0, client=client)
+    meter = UsageMeter()
+
+    def request(model_name: str, role: str) -> CompletionRequest:
+        return CompletionRequest(
+            model_name=model_name,
+            messages=[{"role": "user", "content": "2+2?"}],
+            max_tokens=8,
+            temperature=0.0,
+            role=role,
+        )
+
+    async def run() -> None:
+        token = bind_usage(meter)
+        try:
+            await InProcessBackend().complete(request("gemma_local", "generate"))
+            await ollama.complete(request("qwen_1_5b", "adjust"))
+            await ollama.complete(request("qwen_1_5b", "adjust"))
+        finally:
+            clear_usage(token)
+        # Outside a metered request nothing is recorded.
+        await ollama.complete(request("qwen_1_5b", "adjust"))
+        await client.aclose()
+
+    asyncio.run(run())
+
+    assert meter.get("generate") == TokenUsage(12, 3)
+    assert meter.get("adjust") == TokenUsage(18, 4)
@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from app.services.model_backends import CompletionRequest, InProcessBackend, model_load_options
+from app.services.model_loader import GGUF_SOURCES, ModelManager, _Footprint
+
+MB = 1024 * 1024
+
+pytestmark = pytest.mark.no_model
+
+
+class FakeLlama:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def create_chat_completion(self, **kwargs):
+        return {"choices": [{"message": {"content": "done"}}]}
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Replace Llama.from_pretrained with a slow fake and give ModelManager fresh state."""
+    calls: list[dict] = []
+    lock = threading.Lock()
+
+    def from_pretrained(**kwargs):
+        time.sleep(0.2)
+        with lock:
+            calls.append(kwargs)
+        return FakeLlama(**kwargs)
+
+    def measure(instance, mapped):
+        # Weights sized like the real GGUF estimate, 10 MB of KV per instance.
+        source = next(s for s in GGUF_SOURCES.values() if s.repo_id == instance.kwargs["repo_id"])
+        return _Footprint(weights=source.approx_mb * MB, kv=10 * MB, mapped=mapped)
+
+    monkeypatch.setattr("app.services.model_loader.Llama.from_pretrained", from_pretrained)
+    monkeypatch.setattr("app.services.model_loader._measure", measure)
+    for name in ("_instances", "_status", "_load_locks", "_footprints", "_last_footprint"):
+        monkeypatch.setattr(ModelManager, name, {})
+    monkeypatch.setattr(ModelManager, "_loads", Counter())
+    monkeypatch.setattr(ModelManager, "_unloads", Counter())
+    return calls
+
+
+def _in_threads(*targets):
+    results: list = [None] * len(targets)
+
+    def run(index, target):
+        results[index] = target()
+
+    threads = [threading.Thread(target=run, args=(i, target)) for i, target in enumerate(targets)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def test_concurrent_first_use_loads_once(loads):
+    results, _ = _in_threads(*([ModelManager.load_qwen] * 8))
+
+    assert len(loads) == 1
+    assert all(instance is results[0] for instance in results)
+    status = ModelManager.status()["load_qwen"]
+    assert (status.state, status.instances) == ("ready", 1)
+    assert status.load_seconds >= 0.2
+
+
+def test_different_models_load_in_parallel(loads):
+    results, elapsed = _in_threads(ModelManager.load_qwen, ModelManager.load_phi, ModelManager.load_gemma_e2b)
+
+    assert len(loads) == 3
+    assert elapsed < 0.5
+
+
+def test_load_options_and_unload(loads):
+    model = ModelManager.load_gemma(n_threads=6, use_mmap=False, use_mlock=True)
+    weights = ModelManager.load_weights("load_gemma")
+
+    assert model.kwargs["n_threads"] == 6
+    assert (model.kwargs["use_mmap"], model.kwargs["use_mlock"]) == (False, True)
+    assert ModelManager.unload("load_gemma") == 1
+    assert model.closed and not weights.closed
+    assert ModelManager.status()["load_gemma"].state == "unloaded"
+    assert ModelManager.load_gemma() is not model
+
+
+def test_failed_load_is_reported(monkeypatch, loads):
+    def broken(**kwargs):
+        raise RuntimeError("no such file")
+
+    monkeypatch.setattr("app.services.model_loader.Llama.from_pretrained", broken)
+    with pytest.raises(RuntimeError):
+        ModelManager.load_qwen()
+    status = ModelManager.status()["load_qwen"]
+    assert (status.state, status.error) == ("failed", "no such file")
+
+
+def test_model_load_options_prefer_per_model_settings(monkeypatch):
+    import app.config as config
+
+    monkeypatch.setattr(config, "LLAMA_THREADS_PER_REPLICA", 2)
+    monkeypatch.setattr(config, "LLAMA_THREADS_BY_MODEL", {"gemma_local": 8})
+    monkeypatch.setattr(config, "LLAMA_USE_MMAP", True)
+    monkeypatch.setattr(config, "LLAMA_USE_MMAP_BY_MODEL", {"phi_generalizer": False})
+    monkeypatch.setattr(config, "LLAMA_USE_MLOCK", False)
+    monkeypatch.setattr(config, "LLAMA_USE_MLOCK_BY_MODEL", {"gemma_local": True})
+
+    assert model_load_options("gemma_local") == {"n_threads": 8, "use_mlock": True}
+    assert model_load_options("phi_generalizer") == {"n_threads": 2, "use_mmap": False}
+    assert model_load_options("qwen_1_5b") == {"n_threads": 2}
+
+
+def test_in_process_backend_unloads_idle_models(monkeypatch):
+    detached: list[str] = []
+
+    def detach(name, weights=False):
+        detached.append(name)
+        return [FakeLlama()]
+
+    monkeypatch.setattr("app.services.model_loader.ModelManager.load_qwen_1_5b", lambda **kwargs: FakeLlama())
+    monkeypatch.setattr("app.services.model_loader.ModelManager.load_gemma", lambda **kwargs: FakeLlama())
+    monkeypatch.setattr("app.services.model_loader.ModelManager.detach", detach)
+
+    backend = InProcessBackend()
+
+    async def scenario():
+        for model_name in ("qwen_1_5b", "gemma_local"):
+            await backend.complete(_request(model_name))
+        kept = await backend.unload_idle(3600, pinned=set())
+        released = await backend.unload_idle(0, pinned={"gemma_local"})
+        return kept, released
+
+    kept, released = asyncio.run(scenario())
+
+    assert kept == []
+    assert released == ["qwen_1_5b"] and detached == ["load_qwen_1_5b"]
+    assert list(backend.stats().models) == ["gemma_local"]
+
+
+def test_unload_skips_a_model_whose_request_waits_for_a_slot(monkeypatch):
+    import app.config as config
+    from app.services.request_scheduler import request_scheduler
+
+    class ClosableLlama(FakeLlama):
+        def create_chat_completion(self, **kwargs):
+            assert not self.closed, "used a closed model"
+            return super().create_chat_completion(**kwargs)
+
+    instance = ClosableLlama()
+    monkeypatch.setattr(config, "SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(config, "LLAMA_REPLICAS", 1)
+    monkeypatch.setattr(config, "LLAMA_REPLICAS_BY_MODEL", {})
+    monkeypatch.setattr("app.services.model_loader.ModelManager.load_qwen_1_5b", lambda **kwargs: instance)
+    monkeypatch.setattr("app.services.model_loader.ModelManager.detach", lambda name, weights=False: [instance])
+    backend = InProcessBackend()
+
+    async def scenario():
+        await backend.preload("qwen_1_5b")
+        async with request_scheduler.slot("in_process:qwen_1_5b", 1, "generate", 4):
+            parked = asyncio.create_task(backend.complete(_request("qwen_1_5b")))
+            await asyncio.sleep(0.05)
+            unloaded = await backend.unload_idle(0, pinned=set())
+        return unloaded, await parked
+
+    unloaded, answer = asyncio.run(scenario())
+
+    assert (unloaded, answer) == ([], "done")
+    assert not instance.closed
+    assert list(backend.stats().models) == ["qwen_1_5b"]
+
+
+def _request(model_name: str) -> CompletionRequest:
+    return CompletionRequest(
+        model_name=model_name,
+        messages=[{"role": "user", "content": "hi"}],
+        max_tokens=4,
+        temperature=0.0,
+    )
+
+
+def test_resident_bytes_share_mapped_weights(loads):
+    ModelManager.load_qwen_1_5b()
+    ModelManager.load_qwen_1_5b(replica=1)
+    ModelManager.load_phi(use_mmap=False)
+    ModelManager.load_phi(replica=1, use_mmap=False)
+
+    assert ModelManager.resident_bytes("load_qwen_1_5b") == (1250 + 2 * 10) * MB
+    assert ModelManager.resident_bytes("load_phi") == 2 * (3900 + 10) * MB
+
+    ModelManager.unload("load_qwen_1_5b")
+    status = ModelManager.status()["load_qwen_1_5b"]
+    assert (status.resident_bytes, status.loads, status.unloads) == (0, 2, 1)
+    # Measured footprint from the last load: weights once plus KV per replica.
+    assert ModelManager.estimate_bytes("load_qwen_1_5b", instances=3) == (1250 + 3 * 10) * MB
+
+
+def test_in_process_backend_evicts_least_recently_used_model_over_budget(monkeypatch, loads):
+    import app.config as config
+
+    monkeypatch.setattr(config, "LLAMA_REPLICAS", 1)
+    monkeypatch.setattr(config, "LLAMA_REPLICAS_BY_MODEL", {})
+    monkeypatch.setattr(config, "MODEL_MEMORY_BUDGET_MB", 7000)
+    backend = InProcessBackend()
+
+    async def scenario():
+        await backend.complete(_request("qwen_1_5b"))  # 1250 MB
+        await backend.complete(_request("gemma_local"))  # 5500 MB
+        await backend.complete(_request("qwen_1_5b"))  # gemma is now least recently used
+        await backend.complete(_request("phi_generalizer"))  # 3900 MB: gemma has to go
+
+    asyncio.run(scenario())
+    stats = backend.stats()
+
+    assert sorted(stats.models) == ["phi_generalizer", "qwen_1_5b"]
+    assert stats.evictions == 1
+    assert stats.resident_bytes == (1250 + 3900 + 2 * 10) * MB <= stats.budget_bytes
+    assert ModelManager.status()["load_gemma"].state == "unloaded"
+
+
+def test_budget_never_evicts_a_model_in_use(monkeypatch, loads):
+    import app.config as config
+
+    monkeypatch.setattr(config, "LLAMA_REPLICAS", 1)
+    monkeypatch.setattr(config, "LLAMA_REPLICAS_BY_MODEL", {})
+    monkeypatch.setattr(config, "MODEL_MEMORY_BUDGET_MB", 6000)
+    backend = InProcessBackend()
+
+    async def scenario():
+        await backend.complete(_request("gemma_local"))
+        pool = await backend._get_pool("gemma_local")
+        async with pool.lease():
+            await backend.complete(_request("qwen_1_5b"))
+
+    asyncio.run(scenario())
+
+    assert sorted(backend.stats().models) == ["gemma_local", "qwen_1_5b"]
+    assert backend.stats().evictions == 0
+
+
+def test_preload_loads_configured_models_in_parallel(monkeypatch):
+    import app.config as config
+    import app.services.service_factory as service_factory
+
+    def slow_loader(**kwargs):
+        time.sleep(0.3)
+        return FakeLlama()
+
+    for loader in ("load_qwen_1_5b", "load_gemma", "load_gemma_e2b"):
+        monkeypatch.setattr(f"app.services.model_loader.ModelManager.{loader}", slow_loader)
+    monkeypatch.setattr(config, "ENRICHER_BACKEND", "in_process")
+    monkeypatch.setattr(config, "ENRICHER_MODEL_NAME", "qwen_1_5b")
+    monkeypatch.setattr(config, "LOCAL_LLM_BACKEND", "in_process")
+    monkeypatch.setattr(config, "LOCAL_LLM_MODEL_NAME", "gemma_local")
+    monkeypatch.setattr(config, "NORMALIZER_BACKEND", "ollama")
+    monkeypatch.setattr(config, "NORMALIZER_MODEL_NAME", "gemma_e2b")
+    monkeypatch.setattr(config, "MODEL_PRELOAD", ["qwen_1_5b", "gemma_local", "gemma_e2b"])
+    monkeypatch.setattr(config, "MODEL_IDLE_UNLOAD_SECONDS", 0.0)
+    service_factory._backend_pool.clear()
+    service_factory._service_pool.clear()
+
+    async def scenario():
+        started = time.perf_counter()
+        await service_factory.open_backends()
+        ready_before = service_factory.models_ready()
+        await service_factory._lifecycle_tasks["preload"]
+        elapsed = time.perf_counter() - started
+        ready_after = service_factory.models_ready()
+        await service_factory.close_backends()
+        return ready_before, ready_after, elapsed
+
+    ready_before, ready_after, elapsed = asyncio.run(scenario())
+    backend = service_factory._backend_pool["in_process"]
+    service_factory._backend_pool.clear()
+
+    assert (ready_before, ready_after) == (False, True)
+    # Both in-process models load at once; gemma_e2b is served by Ollama.
+    assert elapsed < 0.5
+    assert sorted(backend.stats().models) == ["gemma_local", "qwen_1_5b"]
@@ -1,8 +1,15 @@
+import asyncio
+import json
+from dataclasses import replace
+
 from fastapi.testclient import TestClient
 
 from app.main import app
 from app.routers import openai_compat
+from app.services import token_usage
 from app.services.memory_chromaDB import CacheLookupResult
+from app.services.token_usage import TokenUsage
+from app.utils.embedding_codec import decode_embedding
 
 
 class StubEnricher:
@@ -181,6 +188,90 @@ def test_cache_miss_includes_difficulty_and_nearest_cache_headers(monkeypatch, c
     assert "nearest_prompt=capital city of france" in done
 
 
+def test_speculative_pipeline_uses_concurrent_classification_on_miss(monkeypatch, caplog):
+    async def _noop_log(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(openai_compat, "_enricher", StubEnricher())
+    monkeypatch.setattr(openai_compat, "_normalizer", StubNormalizer())
+    monkeypatch.setattr(openai_compat, "_adjuster", StubAdjuster())
+    monkeypatch.setattr(openai_compat, "_llm_router", StubRouter())
+    monkeypatch.setattr(openai_compat, "_classifier", EasyLabelHighScoreClassifier())
+    monkeypatch.setattr(openai_compat, "_external_llm", StubExternalLLM())
+    monkeypatch.setattr(openai_compat, "get_memory_service", lambda namespace: StubMemory())
+    monkeypatch.setattr(
+        openai_compat,
+        "_read_effective_llm_config",
+        lambda org_slug, org_id: openai_compat.EffectiveLlmConfig(
+            external_model="gemini-2.5-flash",
+            routing_threshold=0.9,
+        ),
+    )
+    monkeypatch.setattr(openai_compat.request_logger, "log", _noop_log)
+    monkeypatch.setattr(openai_compat.cache_filter, "should_cache", lambda enriched, clean: (False, "test"))
+    monkeypatch.setattr(openai_compat, "USE_CELERY", False)
+    monkeypatch.setattr(openai_compat, "SPECULATIVE_PIPELINE", True)
+
+    client = TestClient(app)
+    with caplog.at_level("INFO", logger="dejaq.router.openai_compat"):
+        response = client.post(
+            "/v1/chat/completions",
+            json={
+                "model": "gpt-4o-mini",
+                "messages": [{"role": "user", "content": "What is the capital of France?"}],
+                "stream": False,
+            },
+        )
+
+    assert response.status_code == 200
+    assert response.headers["x-dejaq-prompt-difficulty"] == "easy"
+    assert response.headers["x-dejaq-prompt-difficulty-score"] == "0.4200"
+    done = next(
+        record.message
+        for record in caplog.records
+        if record.name == "dejaq.router.openai_compat" and record.message.startswith("done cache=miss")
+    )
+    assert "classify:" in done
+    assert "classify_wait:" in done
+
+
+def test_speculative_pipeline_discards_classification_on_hit(monkeypatch):
+    logged: list[dict] = []
+
+    async def _capture_log(*args, **kwargs):
+        logged.append(kwargs)
+
+    class FailingClassifier:
+        def predict_complexity(self, query: str) -> dict:
+            raise RuntimeError("classifier should not affect hits")
+
+    monkeypatch.setattr(openai_compat, "_enricher", StubEnricher())
+    monkeypatch.setattr(openai_compat, "_normalizer", StubNormalizer())
+    monkeypatch.setattr(openai_compat, "_adjuster", StubAdjuster())
+    monkeypatch.setattr(openai_compat, "_classifier", FailingClassifier())
+    monkeypatch.setattr(openai_compat, "get_memory_service", lambda namespace: StubHitMemory())
+    monkeypatch.setattr(openai_compat.request_logger, "log", _capture_log)
+    monkeypatch.setattr(openai_compat, "SPECULATIVE_PIPELINE", True)
+
+    client = TestClient(app)
+    response = client.post(
+        "/v1/chat/completions",
+        json={
+            "model": "gpt-4o-mini",
+            "messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "stream": False,
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"] == "Cached Paris answer."
+    assert response.headers["x-dejaq-model-used"] == "cache"
+    assert "x-dejaq-prompt-difficulty" not in response.headers
+    stages = logged[0]["stages"]
+    assert "classify" not in stages
+    assert "llm_config" not in stages
+
+
 def test_cache_miss_logs_enriched_prompt_when_enricher_succeeds(monkeypatch, caplog):
     async def _noop_log(*args, **kwargs):
         return None
@@ -569,6 +660,48 @@ def test_celery_store_keeps_legacy_args_and_sends_profile_header(monkeypatch):
     assert captured["headers"] == {"dejaq_model_profile": "weak_cpu"}
 
 
+def test_celery_store_attaches_lookup_embedding(monkeypatch):
+    async def _noop_log(*args, **kwargs):
+        return None
+
+    captured: dict[str, object] = {}
+
+    class FakeTask:
+        def apply_async(self, *, args, headers, kwargs=None):
+            captured["args"] = args
+            captured["kwargs"] = kwargs
+
+    class EmbeddingMissMemory(StubMemory):
+        def lookup_cache(self, clean_query: str):
+            return CacheLookupResult(hit=False, query_embedding=[0.25, -0.5])
+
+    monkeypatch.setattr(openai_compat, "_enricher", StubEnricher())
+    monkeypatch.setattr(openai_compat, "_normalizer", StubNormalizer())
+    monkeypatch.setattr(openai_compat, "_adjuster", StubAdjuster())
+    monkeypatch.setattr(openai_compat, "_llm_router", StubRouter())
+    monkeypatch.setattr(openai_compat, "_classifier", StubClassifier())
+    monkeypatch.setattr(openai_compat, "generalize_and_store_task", FakeTask())
+    monkeypatch.setattr(openai_compat, "get_memory_service", lambda namespace: EmbeddingMissMemory())
+    monkeypatch.setattr(openai_compat.request_logger, "log", _noop_log)
+    monkeypatch.setattr(openai_compat.cache_filter, "should_cache", lambda enriched, clean: (True, "test"))
+    monkeypatch.setattr(openai_compat, "USE_CELERY", True)
+    monkeypatch.setattr(openai_compat, "STORE_TASK_EMBEDDING", "float32")
+
+    client = TestClient(app)
+    response = client.post(
+        "/v1/chat/completions",
+        json={
+            "model": "gpt-4o-mini",
+            "messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "stream": False,
+        },
+    )
+
+    assert response.status_code == 200
+    assert len(captured["args"]) == 5
+    assert decode_embedding(captured["kwargs"]["query_embedding"]) == [0.25, -0.5]
+
+
 def test_chat_completions_logs_compact_miss_summary(monkeypatch, caplog):
     async def _noop_log(*args, **kwargs):
         return None
@@ -739,3 +872,222 @@ def test_hard_query_unmapped_external_model_returns_422(monkeypatch):
 
     assert response.status_code == 422
     assert "not mapped to a supported provider" in response.json()["detail"]
+
+
+class StreamingRouter(StubRouter):
+    def __init__(self, pieces: list[str], fail: bool = False):
+        self.pieces = pieces
+        self.fail = fail
+
+    async def stream_local_response(self, query: str, history=None, max_tokens=1024, system_prompt=None):
+        for piece in self.pieces:
+            yield piece
+        if self.fail:
+            raise RuntimeError("model crashed")
+
+
+def _sse_contents(body: str) -> list[str]:
+    contents = []
+    for line in body.splitlines():
+        if not line.startswith("data: {"):
+            continue
+        delta = json.loads(line[len("data: "):])["choices"][0]["delta"]
+        if delta.get("content"):
+            contents.append(delta["content"])
+    return contents
+
+
+def _patch_streaming_miss(monkeypatch, router: StreamingRouter) -> dict[str, object]:
+    async def _noop_log(*args, **kwargs):
+        return None
+
+    captured: dict[str, object] = {}
+
+    class FakeTask:
+        def apply_async(self, *, args, headers, kwargs=None):
+            captured["args"] = args
+            captured["kwargs"] = kwargs
+
+    monkeypatch.setattr(openai_compat, "_enricher", StubEnricher())
+    monkeypatch.setattr(openai_compat, "_normalizer", StubNormalizer())
+    monkeypatch.setattr(openai_compat, "_llm_router", router)
+    monkeypatch.setattr(openai_compat, "generalize_and_store_task", FakeTask())
+    monkeypatch.setattr(openai_compat, "get_memory_service", lambda namespace: StubMemory())
+    monkeypatch.setattr(openai_compat.request_logger, "log", _noop_log)
+    monkeypatch.setattr(openai_compat.cache_filter, "should_cache", lambda enriched, clean: (True, "test"))
+    monkeypatch.setattr(openai_compat, "USE_CELERY", True)
+    return captured
+
+
+def _post_stream(client: TestClient):
+    return client.post(
+        "/v1/chat/completions",
+        headers={"X-DejaQ-Routing-Mode": "easy_local"},
+        json={
+            "model": "gpt-4o-mini",
+            "messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "stream": True,
+        },
+    )
+
+
+def test_streaming_miss_forwards_model_deltas_and_stores_full_answer(monkeypatch):
+    captured = _patch_streaming_miss(monkeypatch, StreamingRouter([" Paris", " is the", " capital."]))
+
+    response = _post_stream(TestClient(app))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "x-dejaq-response-id" in response.headers
+    assert _sse_contents(response.text) == ["Paris", " is the", " capital."]
+    assert response.text.rstrip().endswith("data: [DONE]")
+    assert captured["args"][1] == "Paris is the capital."
+
+
+def test_streaming_miss_failure_is_not_stored(monkeypatch):
+    captured = _patch_streaming_miss(monkeypatch, StreamingRouter([], fail=True))
+
+    response = _post_stream(TestClient(app))
+
+    assert response.status_code == 200
+    assert _sse_contents(response.text) == [openai_compat.GENERATION_ERROR_ANSWER]
+    assert "args" not in captured
+
+
+def test_streaming_leader_gone_before_the_body_releases_its_flight(monkeypatch):
+    from starlette.requests import Request
+
+    from app.schemas.openai_compat import OAIChatRequest
+
+    _patch_streaming_miss(monkeypatch, StreamingRouter([" Paris"]))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.0"},
+        "method": "POST",
+        "path": "/v1/chat/completions",
+        "headers": [(b"x-dejaq-routing-mode", b"easy_local")],
+    }
+    oai_request = OAIChatRequest(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "What is the capital of France?"}],
+        stream=True,
+    )
+    sent: list[str] = []
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message["type"])
+        # The client is gone before the body starts.
+        await asyncio.Event().wait()
+
+    async def scenario():
+        response = await openai_compat.chat_completions(oai_request, Request(scope))
+        in_flight = openai_compat.single_flight.stats().in_flight
+        await response(scope, receive, send)
+        return in_flight
+
+    assert asyncio.run(scenario()) == 1
+    assert sent == ["http.response.start"]
+    assert openai_compat.single_flight.stats().in_flight == 0
+
+
+class MeteredRouter(StubRouter):
+    async def generate_local_response(self, query: str, history=None, max_tokens=1024, system_prompt=None):
+        token_usage.record("generate", 11, 7)
+        return await super().generate_local_response(query, history, max_tokens, system_prompt)
+
+
+class MeteredStreamingRouter(StreamingRouter):
+    async def stream_local_response(self, query: str, history=None, max_tokens=1024, system_prompt=None):
+        async for piece in super().stream_local_response(query, history, max_tokens, system_prompt):
+            yield piece
+        token_usage.record("generate", 11, 3)
+
+
+def _capture_log(monkeypatch) -> list[dict]:
+    logged: list[dict] = []
+
+    async def _log(*args, **kwargs):
+        logged.append({"args": args, **kwargs})
+
+    monkeypatch.setattr(openai_compat.request_logger, "log", _log)
+    return logged
+
+
+def test_miss_reports_recorded_usage_and_stores_it_with_the_entry(monkeypatch):
+    captured: dict[str, object] = {}
+
+    class FakeTask:
+        def apply_async(self, *, args, headers, kwargs=None):
+            captured["kwargs"] = kwargs
+
+    monkeypatch.setattr(openai_compat, "_enricher", StubEnricher())
+    monkeypatch.setattr(openai_compat, "_normalizer", StubNormalizer())
+    monkeypatch.setattr(openai_compat, "_llm_router", MeteredRouter())
+    monkeypatch.setattr(openai_compat, "generalize_and_store_task", FakeTask())
+    monkeypatch.setattr(openai_compat, "get_memory_service", lambda namespace: StubMemory())
+    monkeypatch.setattr(openai_compat.cache_filter, "should_cache", lambda enriched, clean: (True, "test"))
+    monkeypatch.setattr(openai_compat, "USE_CELERY", True)
+    logged = _capture_log(monkeypatch)
+
+    response = TestClient(app).post(
+        "/v1/chat/completions",
+        headers={"X-DejaQ-Routing-Mode": "easy_local"},
+        json={
+            "model": "gpt-4o-mini",
+            "messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "stream": False,
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["usage"] == {"prompt_tokens": 11, "completion_tokens": 7, "total_tokens": 18}
+    assert logged[0]["usage"] == TokenUsage(11, 7)
+    assert captured["kwargs"] == {
+        "prompt_tokens": 11,
+        "completion_tokens": 7,
+        "model_used": response.headers["x-dejaq-model-used"],
+    }
+
+
+def test_streaming_miss_records_usage_when_the_stream_ends(monkeypatch):
+    captured = _patch_streaming_miss(monkeypatch, MeteredStreamingRouter([" Paris."]))
+    logged = _capture_log(monkeypatch)
+
+    response = _post_stream(TestClient(app))
+
+    assert response.status_code == 200
+    assert logged[0]["usage"] == TokenUsage(11, 3)
+    assert captured["kwargs"]["prompt_tokens"] == 11
+    assert captured["kwargs"]["completion_tokens"] == 3
+
+
+def test_cache_hit_logs_the_entrys_generation_as_saved(monkeypatch):
+    class MeteredHitMemory(StubHitMemory):
+        def lookup_cache(self, clean_query: str):
+            result = super().lookup_cache(clean_query)
+            return replace(result, usage=TokenUsage(40, 120), model_used="gemini-2.5-flash")
+
+    monkeypatch.setattr(openai_compat, "_enricher", StubEnricher())
+    monkeypatch.setattr(openai_compat, "_normalizer", StubNormalizer())
+    monkeypatch.setattr(openai_compat, "_adjuster", StubAdjuster())
+    monkeypatch.setattr(openai_compat, "get_memory_service", lambda namespace: MeteredHitMemory())
+    logged = _capture_log(monkeypatch)
+
+    response = TestClient(app).post(
+        "/v1/chat/completions",
+        json={
+            "model": "gpt-4o-mini",
+            "messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "stream": False,
+        },
+    )
+
+    assert response.status_code == 200
+    # No model call served the hit (the stub adjuster records nothing).
+    assert response.json()["usage"]["total_tokens"] == 0
+    assert logged[0]["saved"] == TokenUsage(40, 120)
+    assert logged[0]["saved_model"] == "gemini-2.5-flash"
@@ -4,6 +4,7 @@ from types import SimpleNamespace
 import pytest
 
 from app.schemas.chat import ExternalLLMRequest, ExternalLLMResponse
+from app.services.token_usage import TokenUsage, UsageMeter, bind_usage, clear_usage
 from app.utils.exceptions import ExternalLLMAuthError, ExternalLLMTimeoutError
 
 
@@ -220,3 +221,169 @@ def test_provider_clients_map_timeout_errors_uniformly(monkeypatch, provider_nam
 
     with pytest.raises(ExternalLLMTimeoutError):
         asyncio.run(client.generate_response(_request(), "SecretKey123"))
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+class _FakeAsyncStream:
+    """Stands in for openai.AsyncStream: async-iterable and closed by `async with`."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks.__aiter__()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+        return False
+
+
+def _collect(stream, meter: UsageMeter | None = None) -> list[str]:
+    async def run() -> list[str]:
+        token = bind_usage(meter or UsageMeter())
+        try:
+            return [piece async for piece in stream]
+        finally:
+            clear_usage(token)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("provider_name", ["google", "openai", "anthropic"])
+def test_provider_clients_stream_text_deltas(monkeypatch, provider_name):
+    calls = {}
+    if provider_name == "google":
+        from app.services.llm_providers import google as module
+
+        class FakeModels:
+            async def generate_content_stream(self, **kwargs):
+                calls.update(kwargs)
+                return _aiter(
+                    [
+                        SimpleNamespace(text="Hel", usage_metadata=None),
+                        SimpleNamespace(text=None, usage_metadata=None),
+                        SimpleNamespace(
+                            text="lo", usage_metadata=SimpleNamespace(prompt_token_count=3, candidates_token_count=4)
+                        ),
+                    ]
+                )
+
+        class FakeClient:
+            def __init__(self, api_key):
+                self.aio = SimpleNamespace(models=FakeModels())
+
+        monkeypatch.setattr(module.genai, "Client", FakeClient)
+        client = module.GoogleProviderClient()
+    elif provider_name == "openai":
+        from app.services.llm_providers import openai as module
+
+        def _chunk(content):
+            return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+        class FakeCompletions:
+            async def create(self, **kwargs):
+                calls.update(kwargs)
+                usage = SimpleNamespace(prompt_tokens=3, completion_tokens=4)
+                return _FakeAsyncStream(
+                    _aiter([_chunk("Hel"), _chunk("lo"), _chunk(None), SimpleNamespace(choices=[], usage=usage)])
+                )
+
+        class FakeClient:
+            def __init__(self, api_key):
+                self.chat = SimpleNamespace(completions=FakeCompletions())
+
+        monkeypatch.setattr(module.openai, "AsyncOpenAI", FakeClient)
+        client = module.OpenAIProviderClient()
+    else:
+        from app.services.llm_providers import anthropic as module
+
+        class FakeStream:
+            text_stream = _aiter(["Hel", "lo"])
+
+            async def get_final_message(self):
+                return SimpleNamespace(usage=SimpleNamespace(input_tokens=3, output_tokens=4))
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        class FakeMessages:
+            def stream(self, **kwargs):
+                calls.update(kwargs)
+                return FakeStream()
+
+        class FakeClient:
+            def __init__(self, api_key):
+                self.messages = FakeMessages()
+
+        monkeypatch.setattr(module.anthropic, "AsyncAnthropic", FakeClient)
+        client = module.AnthropicProviderClient()
+
+    meter = UsageMeter()
+    assert _collect(client.stream_response(_request(), "SecretKey123"), meter) == ["Hel", "lo"]
+    assert calls["model"] == "provider-model"
+    assert meter.get("generate") == TokenUsage(prompt_tokens=3, completion_tokens=4)
+    if provider_name == "openai":
+        assert calls["stream"] is True
+        assert calls["stream_options"] == {"include_usage": True}
+
+
+def test_provider_stream_maps_errors_raised_mid_stream(monkeypatch):
+    from app.services.llm_providers import openai as module
+
+    class FakeTimeoutError(Exception):
+        pass
+
+    async def _failing_stream():
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="partial"))], usage=None)
+        raise FakeTimeoutError("slow secret")
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            return _FakeAsyncStream(_failing_stream())
+
+    class FakeClient:
+        def __init__(self, api_key):
+            self.chat = SimpleNamespace(completions=FakeCompletions())
+
+    monkeypatch.setattr(module.openai, "AsyncOpenAI", FakeClient)
+    monkeypatch.setattr(module.openai, "APITimeoutError", FakeTimeoutError)
+
+    with pytest.raises(ExternalLLMTimeoutError):
+        _collect(module.OpenAIProviderClient().stream_response(_request(), "SecretKey123"))
+
+
+def test_openai_stream_is_closed_when_the_consumer_stops_early(monkeypatch):
+    from app.services.llm_providers import openai as module
+
+    chunk = SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Hel"))], usage=None)
+    stream = _FakeAsyncStream(_aiter([chunk, chunk]))
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            return stream
+
+    class FakeClient:
+        def __init__(self, api_key):
+            self.chat = SimpleNamespace(completions=FakeCompletions())
+
+    monkeypatch.setattr(module.openai, "AsyncOpenAI", FakeClient)
+
+    async def first_piece():
+        pieces = module.OpenAIProviderClient().stream_response(_request(), "SecretKey123")
+        piece = await pieces.__anext__()
+        await pieces.aclose()
+        return piece
+
+    assert asyncio.run(first_piece()) == "Hel"
+    assert stream.closed
@@ -164,6 +164,85 @@ class TestRequestLoggerLog:
         asyncio.run(run())  # must not raise
 
 
+class TestRequestLoggerBuffer:
+    def _buffered(self, **kwargs):
+        import app.services.request_logger as rl_mod
+
+        return rl_mod.RequestLogger(**kwargs)
+
+    def _count(self, db_path, table="requests"):
+        con = sqlite3.connect(db_path)
+        count = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        con.close()
+        return count
+
+    def test_rows_are_written_in_batches_and_drained_on_close(self, logger):
+        _, db_path = logger
+        rl = self._buffered(flush_rows=1000, flush_interval_ms=60_000)
+
+        async def run():
+            await rl.init()
+            for i in range(50):
+                await rl.log("acme", "eng", i, i % 2 == 0, None, None)
+            await rl.log_feedback("ns:doc", "acme", "eng", "positive", None)
+            before_close = self._count(db_path)
+            await rl.close()
+            return before_close
+
+        assert asyncio.run(run()) == 0
+        assert self._count(db_path) == 50
+        assert self._count(db_path, "feedback_log") == 1
+        stats = rl.stats()
+        assert (stats.written, stats.flushes, stats.buffered, stats.dropped) == (51, 1, 0, 0)
+
+    def test_flushes_once_the_row_threshold_is_reached(self, logger):
+        _, db_path = logger
+        rl = self._buffered(flush_rows=10, flush_interval_ms=60_000)
+
+        async def run():
+            await rl.init()
+            for i in range(10):
+                await rl.log("acme", "eng", i, True, None, None)
+            await asyncio.sleep(0.2)
+            written = self._count(db_path)
+            await rl.close()
+            return written
+
+        assert asyncio.run(run()) == 10
+
+    def test_full_buffer_drops_oldest_rows(self, logger):
+        _, db_path = logger
+        rl = self._buffered(buffer_size=5, flush_rows=1000, flush_interval_ms=60_000)
+
+        async def run():
+            await rl.init()
+            for i in range(8):
+                await rl.log("acme", "eng", i, True, None, None)
+            await rl.close()
+
+        asyncio.run(run())
+
+        con = sqlite3.connect(db_path)
+        latencies = [row[0] for row in con.execute("SELECT latency_ms FROM requests ORDER BY id")]
+        con.close()
+        assert latencies == [3, 4, 5, 6, 7]
+        assert rl.stats().dropped == 3 and rl.stats().max_buffered == 5
+
+    def test_enables_wal_mode(self, logger):
+        rl, db_path = logger
+
+        async def run():
+            await rl.init()
+            await rl.close()
+
+        asyncio.run(run())
+
+        con = sqlite3.connect(db_path)
+        mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+        con.close()
+        assert mode == "wal"
+
+
 class TestStatsCLI:
     def _seed(self, db_path, rows):
         con = sqlite3.connect(db_path)
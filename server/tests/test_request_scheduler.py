@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.request_scheduler import RequestScheduler
+
+pytestmark = pytest.mark.no_model
+
+
+async def _call(scheduler, order, role, lane="in_process:qwen_1_5b", release=None, max_tokens=64):
+    async with scheduler.slot(lane, 1, role, max_tokens):
+        order.append(role)
+        if release is not None:
+            await release.wait()
+        else:
+            await asyncio.sleep(0)
+
+
+def test_waiting_calls_run_by_role_priority():
+    scheduler = RequestScheduler()
+    order: list[str] = []
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(_call(scheduler, order, "generate", release=release))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(_call(scheduler, order, role)) for role in ("generalize", "generate", "adjust")]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(running, *waiting)
+
+    asyncio.run(scenario())
+
+    assert order == ["generate", "adjust", "generate", "generalize"]
+    stats = scheduler.stats().roles
+    assert stats["generalize"].max_wait_ms > 0
+    assert stats["adjust"].requests == 1 and stats["adjust"].queued == 0
+
+
+def test_background_waits_for_interactive_calls_on_other_models():
+    scheduler = RequestScheduler()
+    order: list[str] = []
+
+    async def scenario():
+        release = asyncio.Event()
+        adjust = asyncio.create_task(_call(scheduler, order, "adjust", release=release))
+        await asyncio.sleep(0)
+        generalize = asyncio.create_task(_call(scheduler, order, "generalize", lane="in_process:phi_generalizer"))
+        await asyncio.sleep(0.01)
+        deferred = list(order)
+        release.set()
+        await asyncio.gather(adjust, generalize)
+        return deferred
+
+    assert asyncio.run(scenario()) == ["adjust"]
+    assert order == ["adjust", "generalize"]
+    assert scheduler.stats().roles["generalize"].deferred == 1
+
+
+def test_background_runs_after_max_defer(monkeypatch):
+    import app.config as config
+
+    monkeypatch.setattr(config, "SCHEDULER_MAX_DEFER_SECONDS", 0.0)
+    scheduler = RequestScheduler()
+    order: list[str] = []
+
+    async def scenario():
+        release = asyncio.Event()
+        adjust = asyncio.create_task(_call(scheduler, order, "adjust", release=release))
+        await asyncio.sleep(0)
+        await _call(scheduler, order, "generalize", lane="in_process:phi_generalizer")
+        release.set()
+        await adjust
+
+    asyncio.run(scenario())
+
+    assert order == ["adjust", "generalize"]
+
+
+def test_background_token_budget(monkeypatch):
+    import app.config as config
+
+    monkeypatch.setattr(config, "SCHEDULER_BACKGROUND_TOKENS", 1024)
+    scheduler = RequestScheduler()
+    order: list[str] = []
+
+    async def scenario():
+        release = asyncio.Event()
+        first = asyncio.create_task(_call(scheduler, order, "generalize", lane="a", release=release, max_tokens=1024))
+        second = asyncio.create_task(_call(scheduler, order, "generalize", lane="b", max_tokens=1024))
+        await asyncio.sleep(0.01)
+        in_flight = scheduler.stats().background_tokens_in_flight
+        release.set()
+        await asyncio.gather(first, second)
+        return in_flight
+
+    assert asyncio.run(scenario()) == 1024
+    assert scheduler.stats().background_tokens_in_flight == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = RequestScheduler()
+    order: list[str] = []
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(_call(scheduler, order, "generate", release=release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_call(scheduler, order, "adjust"))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        queued = scheduler.stats().roles["adjust"].queued
+        release.set()
+        await running
+        await _call(scheduler, order, "adjust")
+        return queued
+
+    assert asyncio.run(scenario()) == 0
+    assert order == ["generate", "adjust"]
+
+
+def test_waiters_on_another_event_loop_are_woken():
+    # Celery tasks drive the services with asyncio.run() on their own loop.
+    scheduler = RequestScheduler()
+    order: list[str] = []
+    thread_started = threading.Event()
+
+    def background():
+        async def run():
+            thread_started.set()
+            await _call(scheduler, order, "generalize", lane="in_process:phi_generalizer")
+
+        asyncio.run(run())
+
+    async def scenario():
+        release = asyncio.Event()
+        adjust = asyncio.create_task(_call(scheduler, order, "adjust", release=release))
+        await asyncio.sleep(0)
+        thread = threading.Thread(target=background)
+        thread.start()
+        await asyncio.to_thread(thread_started.wait)
+        await asyncio.sleep(0.05)
+        release.set()
+        await adjust
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(scenario())
+
+    assert order == ["adjust", "generalize"]
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SharedAnswer, SingleFlight
+
+pytestmark = pytest.mark.no_model
+
+ANSWER = SharedAnswer("Paris.", "what is the capital of france?", "gemma-4-e4b")
+
+
+def test_concurrent_duplicates_share_the_leaders_answer():
+    flights = SingleFlight(wait_seconds=5)
+    generations: list[str] = []
+
+    async def request():
+        lead, shared = await flights.join("ns:doc")
+        if lead is None:
+            return shared
+        generations.append("generate")
+        await asyncio.sleep(0.05)
+        await lead.finish(ANSWER)
+        return ANSWER
+
+    async def scenario():
+        return await asyncio.gather(*(request() for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    stats = flights.stats()
+
+    assert generations == ["generate"]
+    assert results == [ANSWER] * 5
+    assert (stats.leaders, stats.followers, stats.shared, stats.in_flight) == (1, 4, 4, 0)
+
+
+def test_failed_leader_lets_followers_generate():
+    flights = SingleFlight(wait_seconds=5)
+
+    async def scenario():
+        lead, _ = await flights.join("ns:doc")
+        follower = asyncio.create_task(flights.join("ns:doc"))
+        await asyncio.sleep(0)
+        await lead.finish(None)
+        await lead.finish(ANSWER)  # no-op after the first finish
+        followed = await follower
+        retried = await flights.join("ns:doc")
+        return followed, retried
+
+    followed, (retry_lead, retry_shared) = asyncio.run(scenario())
+
+    assert followed == (None, None)
+    assert retry_lead is not None and retry_shared is None
+    assert flights.stats().fallbacks == 1
+
+
+def test_followers_stop_waiting_for_a_stuck_leader():
+    flights = SingleFlight(wait_seconds=1)
+
+    async def scenario():
+        await flights.join("ns:doc")  # never finishes
+        follower = await flights.join("ns:doc")
+        await asyncio.sleep(0.05)
+        flights._flights["ns:doc"].started -= 1
+        replacement, _ = await flights.join("ns:doc")
+        return follower, replacement
+
+    follower, replacement = asyncio.run(scenario())
+
+    assert follower == (None, None)
+    assert replacement is not None
+
+
+def test_redis_tier_shares_answers_across_replicas(fake_redis):
+    replica_a = SingleFlight(wait_seconds=5, poll_interval_ms=10, redis_client=fake_redis)
+    replica_b = SingleFlight(wait_seconds=5, poll_interval_ms=10, redis_client=fake_redis)
+
+    async def scenario():
+        lead, _ = await replica_a.join("ns:doc")
+        remote = asyncio.create_task(replica_b.join("ns:doc"))
+        await asyncio.sleep(0.05)
+        await lead.finish(ANSWER)
+        return await remote
+
+    assert asyncio.run(scenario()) == (None, ANSWER)
+    assert replica_b.stats().remote_followers == 1
+    assert "singleflight:ns:doc:answer" in fake_redis.data
+
+
+def test_failed_remote_leader_hands_over_the_lock(fake_redis):
+    replica_a = SingleFlight(wait_seconds=5, poll_interval_ms=10, redis_client=fake_redis)
+    replica_b = SingleFlight(wait_seconds=5, poll_interval_ms=10, redis_client=fake_redis)
+
+    async def scenario():
+        lead, _ = await replica_a.join("ns:doc")
+        remote = asyncio.create_task(replica_b.join("ns:doc"))
+        await asyncio.sleep(0.05)
+        await lead.finish(None)
+        return await remote
+
+    lead, shared = asyncio.run(scenario())
+
+    assert lead is not None and shared is None
+    assert fake_redis.data["singleflight:ns:doc"] == lead.redis_token
+
+
+def test_redis_errors_fall_back_to_local_single_flight(fake_redis):
+    fake_redis.fail = True
+    flights = SingleFlight(wait_seconds=5, redis_client=fake_redis)
+
+    async def scenario():
+        lead, _ = await flights.join("ns:doc")
+        follower = asyncio.create_task(flights.join("ns:doc"))
+        await asyncio.sleep(0)
+        await lead.finish(ANSWER)
+        return lead, await follower
+
+    lead, follower = asyncio.run(scenario())
+
+    assert lead is not None and follower == (None, ANSWER)
+    assert flights.stats().redis_errors == 1
@@ -86,3 +86,263 @@ def test_stats_service_rejects_reversed_date_range(isolated_stats_db):
 
     with pytest.raises(stats_service.InvalidDateRange):
         stats_service.org_stats(from_date=date(2026, 4, 15), to_date=date(2026, 4, 1))
+
+
+def _seed_org(slug, departments):
+    from app.db.models.department import Department
+    from app.db.models.org import Organization
+    from app.db.session import get_session
+
+    with get_session() as session:
+        org = Organization(name=slug.title(), slug=slug)
+        session.add(org)
+        session.flush()
+        for dept in departments:
+            session.add(Department(org_id=org.id, name=dept.title(), slug=dept, cache_namespace=f"{slug}__{dept}"))
+        session.commit()
+
+
+def _reports(stats_service):
+    ranges = [
+        (None, None),
+        (date(2026, 4, 1), date(2026, 4, 2)),
+        (date(2026, 4, 2), None),
+        (None, date(2026, 4, 2)),
+    ]
+    reports = []
+    for from_date, to_date in ranges:
+        reports.append(stats_service.org_stats(from_date=from_date, to_date=to_date).model_dump())
+        reports.append(stats_service.org_stats(from_date, to_date, accessible_org_slugs={"acme"}).model_dump())
+        reports.append(stats_service.department_stats("acme", from_date, to_date).model_dump())
+        reports.append(stats_service.stage_stats(from_date, to_date).model_dump())
+    return reports
+
+
+@pytest.mark.no_model
+def test_rollups_plus_raw_tail_match_raw_queries(isolated_org_db, isolated_stats_db):
+    from app.services import stats_rollup, stats_service
+
+    _seed_org("acme", ["eng", "support"])
+    _seed_requests(
+        isolated_stats_db,
+        [
+            ("2026-03-31T23:59:59+00:00", "acme", "eng", 97, 1, "easy", "cache", "r0"),
+            ("2026-04-01T00:00:00+00:00", "acme", "eng", 100, 1, "easy", "cache", "r1"),
+            ("2026-04-01T00:30:10+00:00", "acme", "eng", 333, 0, "hard", "gemini", "r2"),
+            ("2026-04-01T13:05:00.250000+00:00", "acme", "support", 71, 0, None, None, "r3"),
+            ("2026-04-01T23:59:59.999999+00:00", "beta", "default", 200, 1, "easy", "cache", "r4"),
+            ("2026-04-02T00:00:00+00:00", "acme", "support", 211, 0, "easy", "qwen", "r5"),
+        ],
+    )
+    raw_before = _reports(stats_service)
+
+    con = sqlite3.connect(isolated_stats_db)
+    stats_rollup.compact(con)
+    assert _reports(stats_service) == raw_before
+
+    # Tail rows, one of them late for an already folded hour.
+    _seed_requests(
+        isolated_stats_db,
+        [
+            ("2026-04-01T00:45:00+00:00", "acme", "eng", 19, 1, "hard", "cache", "r6"),
+            ("2026-04-03T08:00:00+00:00", "acme", "eng", 55, 0, "hard", "gemini", "r7"),
+        ],
+    )
+    assert stats_rollup.watermark(con) == 6
+    combined = _reports(stats_service)
+    stats_rollup.compact(con)
+    folded = _reports(stats_service)
+    assert con.execute("SELECT SUM(requests) FROM request_rollup_minute").fetchone() == (8,)
+
+    con.execute("DROP TABLE rollup_state")
+    con.commit()
+    con.close()
+    raw_after = _reports(stats_service)
+
+    assert combined == raw_after
+    assert folded == raw_after
+    assert raw_after != raw_before
+
+
+@pytest.mark.no_model
+def test_fold_between_watermark_and_query_is_not_double_counted(isolated_org_db, isolated_stats_db, monkeypatch):
+    from app.services import stats_rollup, stats_service
+
+    _seed_org("acme", ["eng"])
+    rows = [("2026-04-01T00:00:00+00:00", "acme", "eng", 100, 1, "easy", "cache", f"r{i}") for i in range(5)]
+    _seed_requests(isolated_stats_db, rows[:2])
+    con = sqlite3.connect(isolated_stats_db)
+    con.execute("PRAGMA journal_mode=WAL")
+    stats_rollup.compact(con)
+    _seed_requests(isolated_stats_db, rows[2:])
+    watermark = stats_rollup.watermark
+
+    def watermark_then_flush(reader):
+        last_id = watermark(reader)
+        stats_rollup.compact(con)  # a logger flush in another connection
+        return last_id
+
+    monkeypatch.setattr(stats_rollup, "watermark", watermark_then_flush)
+    total = stats_service.org_stats().total
+    con.close()
+
+    assert total.requests == 5
+
+
+@pytest.mark.no_model
+def test_request_logger_flush_folds_rows_into_rollups(isolated_stats_db):
+    import asyncio
+
+    from app.services.request_logger import RequestLogger
+
+    rl = RequestLogger(flush_interval_ms=60_000)
+
+    async def run():
+        await rl.init()
+        await rl.log("acme", "eng", 100, True, "easy", "cache")
+        await rl.log("acme", "eng", 300, False, "hard", "gemini")
+        await rl.log("acme", "eng", 50, True, None, "cache")
+        await rl.flush()
+        await rl.close()
+
+    asyncio.run(run())
+
+    con = sqlite3.connect(isolated_stats_db)
+    rows = con.execute(
+        "SELECT model_used, requests, hits, latency_sum, easy, hard FROM request_rollup_hour ORDER BY model_used"
+    ).fetchall()
+    last_id = con.execute("SELECT last_id FROM rollup_state").fetchone()
+    con.close()
+
+    assert rows == [("cache", 2, 2, 150, 1, 0), ("gemini", 1, 0, 300, 0, 1)]
+    assert last_id == (3,)
+
+
+@pytest.mark.no_model
+def test_latency_percentiles_by_hit_miss_and_route(isolated_org_db, isolated_stats_db):
+    from app.services import stats_rollup, stats_service
+
+    _seed_org("acme", ["eng"])
+    _seed_requests(isolated_stats_db, [])
+    con = sqlite3.connect(isolated_stats_db)
+    stats_rollup.compact(con)
+    rows = [("2026-04-01T10:00:00+00:00", "acme", "eng", ms, 1, None, None, f"h{ms}", "cache") for ms in range(1, 11)]
+    rows += [("2026-04-01T10:00:00+00:00", "acme", "eng", 40, 0, "easy", "qwen", "l1", "local")]
+    rows += [("2026-04-01T11:00:00+00:00", "acme", "eng", 50, 0, "hard", "gemini", "e1", "external")]
+    con.executemany(
+        "INSERT INTO requests (ts, org, department, latency_ms, cache_hit, difficulty, model_used, response_id, route) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    con.commit()
+    stats_rollup.compact(con)
+    # A tail row not folded yet still counts.
+    con.execute(
+        "INSERT INTO requests (ts, org, department, latency_ms, cache_hit, difficulty, model_used, response_id, route) "
+        "VALUES ('2026-04-01T12:00:00+00:00', 'acme', 'eng', 60, 0, 'hard', 'gemini', 'e2', 'external')"
+    )
+    con.commit()
+    con.close()
+
+    total = stats_service.department_stats("acme").total
+
+    assert total.hit_latency.model_dump() == {
+        "requests": 10, "p50_ms": 5.0, "p90_ms": 9.0, "p95_ms": 10.0, "p99_ms": 10.0,
+    }
+    assert (total.miss_latency.requests, total.miss_latency.p50_ms, total.miss_latency.p99_ms) == (3, 50.0, 60.0)
+    assert sorted(total.latency_by_route) == ["cache", "external", "local"]
+    assert total.latency_by_route["external"].p50_ms == 50.0
+    assert total.latency_by_route["local"].p99_ms == 40.0
+
+
+@pytest.mark.no_model
+def test_stage_stats_from_logged_trace_steps(isolated_stats_db):
+    import asyncio
+
+    from app.services import stats_service
+    from app.services.request_logger import RequestLogger
+
+    rl = RequestLogger(flush_interval_ms=60_000)
+
+    async def run():
+        await rl.init()
+        for ms in range(1, 5):
+            await rl.log("acme", "eng", 50, True, None, None, route="cache", stages={"cache": ms, "adjust": 10 * ms})
+        await rl.log("acme", "eng", 900, False, "easy", "qwen", route="local", stages={"generate": 800, "bogus": 1})
+        await rl.close()
+
+    asyncio.run(run())
+    con = sqlite3.connect(isolated_stats_db)
+    # Written without the logger, so not folded into the rollups yet.
+    con.execute(
+        "INSERT INTO requests (ts, org, department, latency_ms, cache_hit, route, cache_ms) "
+        "VALUES ('2026-04-01T10:00:00+00:00', 'beta', 'ops', 70, 1, 'cache', 7)"
+    )
+    con.commit()
+
+    report = stats_service.stage_stats()
+    scoped = stats_service.stage_stats(accessible_org_slugs={"beta"})
+    con.execute("DROP TABLE rollup_state")
+    con.commit()
+    con.close()
+
+    assert [(item.org, item.route, item.stage, item.requests) for item in report.items] == [
+        ("acme", "cache", "cache", 4),
+        ("acme", "cache", "adjust", 4),
+        ("acme", "local", "generate", 1),
+        ("beta", "cache", "cache", 1),
+    ]
+    adjust = report.items[1]
+    assert (adjust.p50_ms, adjust.p99_ms) == (20.0, 40.0)
+    assert [item.org for item in scoped.items] == ["beta"]
+    assert stats_service.stage_stats() == report
+
+
+@pytest.mark.no_model
+def test_token_usage_and_savings_by_model(isolated_org_db, isolated_stats_db, monkeypatch):
+    import asyncio
+
+    import app.config as config
+    from app.services import stats_service
+    from app.services.request_logger import RequestLogger
+    from app.services.token_usage import TokenUsage
+
+    monkeypatch.setattr(config, "MODEL_PRICES", {"gemini-2.5-flash": (1.0, 2.0)})
+    _seed_org("acme", ["eng"])
+    generation = TokenUsage(100, 400)
+    rl = RequestLogger(flush_interval_ms=60_000)
+
+    async def run():
+        await rl.init()
+        await rl.log("acme", "eng", 900, False, "hard", "gemini-2.5-flash", route="external", usage=generation)
+        saved = {"saved": generation, "saved_model": "gemini-2.5-flash"}
+        await rl.log("acme", "eng", 50, True, None, None, route="cache", **saved)
+        await rl.log("acme", "eng", 60, False, None, "coalesced", route="coalesced", **saved)
+        # A hit on an entry stored before token accounting.
+        await rl.log("acme", "eng", 40, True, None, None, route="cache")
+        await rl.close()
+
+    asyncio.run(run())
+    con = sqlite3.connect(isolated_stats_db)
+    # Written without the logger, so not folded into the rollups yet.
+    con.execute(
+        "INSERT INTO requests (ts, org, department, latency_ms, cache_hit, route, saved_prompt_tokens, "
+        "saved_completion_tokens, saved_model) "
+        "VALUES ('2026-04-01T10:00:00+00:00', 'acme', 'eng', 5, 1, 'cache', 100, 400, 'gemini-2.5-flash')"
+    )
+    con.commit()
+
+    total = stats_service.department_stats("acme").total
+    folded = _reports(stats_service)
+    con.execute("DROP TABLE rollup_state")
+    con.commit()
+    con.close()
+
+    assert (total.prompt_tokens, total.completion_tokens) == (100, 400)
+    assert total.tokens_saved == 1500
+    # The legacy hit falls back to the per-hit estimate.
+    assert total.est_tokens_saved == 1500 + 150
+    assert total.cost_saved_usd == pytest.approx(3 * (100 * 1.0 + 400 * 2.0) / 1_000_000)
+    savings = total.savings_by_model["gemini-2.5-flash"]
+    assert (savings.requests, savings.prompt_tokens, savings.completion_tokens) == (3, 300, 1200)
+    assert _reports(stats_service) == folded
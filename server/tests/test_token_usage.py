@@ -0,0 +1,30 @@
+import pytest
+
+import app.config as config
+from app.services.token_usage import TokenUsage, UsageMeter, cost_usd
+
+pytestmark = pytest.mark.no_model
+
+
+def test_meter_sums_usage_per_role():
+    meter = UsageMeter()
+    meter.add("adjust", TokenUsage(10, 2))
+    meter.add("adjust", TokenUsage(5, 1))
+    meter.add("generate", TokenUsage(30, 90))
+
+    assert meter.get("adjust") == TokenUsage(15, 3)
+    assert meter.get("generate").total_tokens == 120
+    assert meter.get("enrich") is None
+
+
+def test_cost_uses_per_million_prompt_and_completion_prices(monkeypatch):
+    monkeypatch.setattr(config, "MODEL_PRICES", {"gpt-4o-mini": (0.15, 0.60)})
+
+    assert cost_usd("gpt-4o-mini", 1_000_000, 500_000) == pytest.approx(0.45)
+    assert cost_usd("gemma-4-e4b", 1_000_000, 1_000_000) == 0.0
+
+
+def test_price_map_parses_prompt_and_completion_prices(monkeypatch):
+    monkeypatch.setenv("DEJAQ_MODEL_PRICES", "gemini-2.5-flash=0.30:2.50, flat=1,broken=x:1")
+
+    assert config._get_price_map("DEJAQ_MODEL_PRICES") == {"gemini-2.5-flash": (0.30, 2.50), "flat": (1.0, 1.0)}